@@ -1,18 +1,37 @@
 import os
-import random
 import sys
-import threading
 import subprocess
+import time
+
+# Com argumentos na linha de comando, roda a versão sem interface (ver
+# shuffletune_cli.py) antes de importar o Kivy, que é lento para carregar,
+# precisa de uma janela e também tentaria interpretar esses argumentos.
+if __name__ == '__main__' and len(sys.argv) > 1:
+    from shuffletune_cli import main
+    sys.exit(main())
+
+from shuffletune_core import (
+    DEFAULT_EXTENSIONS, LINK_MODES, NAME_SANITIZER, SHUFFLE_MODES, FileTable, FileView, JournalWorker,
+    PlaylistWorker, ProgressCounter, RenameJournal, RenamePattern, RenameWorker, ScanWorker, SearchIndex,
+    format_duration, get_cache_dir, plan_changes, same_folder, shuffle_view,
+)
+from shuffletune_duplicates import DuplicateFinder
+from shuffletune_metrics import RunMetrics
+from shuffletune_tags import TagStore, TagWorker
+from shuffletune_watch import create_watcher
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.datamodel import RecycleDataModelBehavior
+from kivy.uix.recyclelayout import RecycleLayout
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
 from kivy.uix.button import Button
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.filechooser import FileChooserListView
-from kivy.properties import StringProperty, ListProperty, BooleanProperty, NumericProperty
+from kivy.properties import StringProperty, ListProperty, BooleanProperty, NumericProperty, ObjectProperty
 from kivy.clock import Clock
+from kivy.event import EventDispatcher
 from kivy.lang import Builder
 from kivy.core.window import Window
 
@@ -104,12 +123,13 @@ KV_STRING = """
             radius: [dp(5)]
 
 # MELHORIA: Widget para itens da lista de arquivos no RecycleView.
+# Todas as linhas têm a mesma altura (ver FileListLayout).
 <FileListItem>:
     halign: 'left'
-    valign: 'top'
-    text_size: self.width, None
-    size_hint_y: None
-    height: self.texture_size[1] + dp(10) # Ajusta a altura baseada no conteúdo
+    valign: 'middle'
+    text_size: self.width, self.height
+    shorten: True
+    shorten_from: 'right'
 
 # Layout Principal
 BoxLayout:
@@ -157,7 +177,7 @@ BoxLayout:
         GridLayout:
             cols: 2
             size_hint_y: None
-            height: dp(120)
+            height: dp(240)
             spacing: dp(5)
             DarkCheckBox:
                 id: chk_include_subfolders
@@ -177,6 +197,24 @@ BoxLayout:
                 on_active: app.sanitize_names_active = self.active
             DarkLabel:
                 text: app.ui_sanitize_names_label
+            DarkCheckBox:
+                id: chk_keep_originals
+                active: app.keep_originals_active
+                on_active: app.keep_originals_active = self.active
+            DarkLabel:
+                text: app.ui_keep_originals_label
+            DarkCheckBox:
+                id: chk_preserve_metadata
+                active: app.preserve_metadata_active
+                on_active: app.preserve_metadata_active = self.active
+            DarkLabel:
+                text: app.ui_preserve_metadata_label
+            DarkCheckBox:
+                id: chk_skip_duplicates
+                active: app.skip_duplicates_active
+                on_active: app.skip_duplicates_active = self.active
+            DarkLabel:
+                text: app.ui_skip_duplicates_label
 
         Widget:
             size_hint_y: None
@@ -194,7 +232,7 @@ BoxLayout:
         DarkTextInput:
             id: txt_format
             text: "{index} - {name}"
-            on_text: app.update_preview()
+            on_text: app.on_format_changed()
             disabled: chk_add_prefix.active
         
         BoxLayout:
@@ -204,10 +242,42 @@ BoxLayout:
             DarkCheckBox:
                 id: chk_add_prefix
                 active: True
-                on_active: app.update_preview()
+                on_active: app.on_format_changed()
             DarkLabel:
                 text: app.ui_add_prefix_label
 
+        BoxLayout:
+            size_hint_y: None
+            height: dp(40)
+            spacing: dp(5)
+            DarkLabel:
+                text: app.ui_shuffle_mode_label
+                size_hint_x: 0.3
+            Spinner:
+                id: spn_shuffle_mode
+                size_hint_x: 0.4
+                values: app.ui_shuffle_modes
+                text: app.ui_shuffle_modes[app.SHUFFLE_MODE_NAMES.index(app.shuffle_mode)] if app.ui_shuffle_modes else ''
+                on_text: app.select_shuffle_mode(self.text)
+            DarkTextInput:
+                id: txt_shuffle_seed
+                size_hint_x: 0.3
+                hint_text: app.ui_shuffle_seed_hint
+
+        BoxLayout:
+            size_hint_y: None
+            height: dp(40)
+            spacing: dp(5)
+            DarkLabel:
+                text: app.ui_output_mode_label
+                size_hint_x: 0.3
+            Spinner:
+                id: spn_output_mode
+                size_hint_x: 0.7
+                values: app.ui_output_modes
+                text: app.ui_output_modes[app.OUTPUT_MODE_NAMES.index(app.output_mode)] if app.ui_output_modes else ''
+                on_text: app.select_output_mode(self.text)
+
         Widget:
             size_hint_y: None
             height: dp(15)
@@ -224,6 +294,10 @@ BoxLayout:
                 id: btn_rename
                 text: app.ui_rename_button
                 on_release: app.confirm_rename()
+            GlassButton:
+                id: btn_undo
+                text: app.ui_undo_button
+                on_release: app.confirm_undo()
             WarningButton:
                 id: btn_cancel
                 text: app.ui_cancel_button
@@ -284,16 +358,13 @@ BoxLayout:
             hint_text: app.ui_search_hint
             on_text: app.on_search_text_changed(self.text)
         
-        RecycleView:
+        FileListView:
             id: file_list_rv
             viewclass: 'FileListItem'
             data: app.recycle_view_data
-            RecycleBoxLayout:
-                default_size: None, dp(30)
-                default_size_hint: 1, None
+            FileListLayout:
                 size_hint_y: None
-                height: self.minimum_height
-                orientation: 'vertical'
+                row_height: dp(30)
                 spacing: dp(2)
         
         DarkLabel:
@@ -307,77 +378,145 @@ BoxLayout:
 class FileListItem(Label):
     pass
 
-# Worker para renomear arquivos em uma thread separada
-class RenameWorker(threading.Thread):
-    def __init__(self, files, folder, pattern, add_number_prefix, app_instance, output_folder=None, sanitize_names=False):
-        super().__init__()
-        self.files = files
-        self.folder = folder
-        self.pattern = pattern
-        self.add_number_prefix = add_number_prefix
-        self.app_instance = app_instance
-        self.output_folder = output_folder if output_folder else folder
-        self.sanitize_names = sanitize_names
-        self._is_running = True
-
-    def _sanitize_filename(self, filename):
-        if not self.sanitize_names:
-            return filename
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        filename = ' '.join(filename.split())
-        return filename.strip()
-
-    def run(self):
-        try:
-            total_files = len(self.files)
-            for i, file_relative_path in enumerate(self.files):
-                if not self._is_running:
-                    break
-
-                original_full_path = os.path.join(self.folder, file_relative_path)
-                file_name_only = os.path.basename(file_relative_path)
-
-                index = str(i + 1).zfill(len(str(total_files)))
-                name, ext = os.path.splitext(file_name_only)
-                
-                name = self._sanitize_filename(name)
-
-                if self.add_number_prefix:
-                    new_name_base = f"{index} - {name}"
-                else:
-                    new_name_base = self.pattern.replace("{index}", index).replace("{name}", name)
-                
-                new_name_with_ext = new_name_base + ext
-                relative_dir = os.path.dirname(file_relative_path)
-                
-                output_dir = os.path.join(self.output_folder, relative_dir)
-                os.makedirs(output_dir, exist_ok=True)
-
-                new_full_path = os.path.join(output_dir, new_name_with_ext)
-
-                counter = 1
-                while os.path.exists(new_full_path) and original_full_path.lower() != new_full_path.lower():
-                    new_name_collision = f"{new_name_base} ({counter}){ext}"
-                    new_full_path = os.path.join(output_dir, new_name_collision)
-                    counter += 1
-                
-                if original_full_path.lower() != new_full_path.lower():
-                    os.rename(original_full_path, new_full_path)
-                
-                Clock.schedule_once(lambda dt, cur=i + 1, n_name=os.path.basename(new_full_path):
-                                    self.app_instance.on_rename_progress(cur, n_name))
-
-            final_message = "Operação concluída com sucesso" if self._is_running else "Operação cancelada"
-            Clock.schedule_once(lambda dt, success=self._is_running, msg=final_message:
-                                self.app_instance.on_rename_finished(success, msg))
-        except Exception as e:
-            Clock.schedule_once(lambda dt, msg=f"Erro: {str(e)}":
-                                self.app_instance.on_rename_finished(False, msg))
-
-    def stop(self):
-        self._is_running = False
+# Linhas da lista de arquivos, criadas sob demanda: só as linhas visíveis
+# chegam a virar dicionários, em vez de uma lista com um dict por arquivo.
+class FileListRows:
+    def __init__(self, records=(), empty_text=""):
+        self.records = records
+        self.empty_text = empty_text
+
+    def __len__(self):
+        return len(self.records) or 1
+
+    def __getitem__(self, index):
+        if not self.records:
+            return {'text': self.empty_text}
+        return {'text': self.records.file_name(index)}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+# Modelo de dados do RecycleView que aceita qualquer sequência (FileListRows)
+# sem copiá-la para uma ListProperty.
+class FileListDataModel(RecycleDataModelBehavior, EventDispatcher):
+    data = ObjectProperty(FileListRows(), rebind=False)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fbind('data', self._on_data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def _on_data(self, instance, value):
+        self.dispatch('on_data_changed')
+
+class FileListView(RecycleView):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('data_model', FileListDataModel())
+        super().__init__(**kwargs)
+
+# Opções de layout de cada linha, calculadas na hora a partir do índice.
+class _FileListRowOpts:
+    def __init__(self, layout, count):
+        self.layout = layout
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        layout = self.layout
+        return {'size': [layout.row_width, layout.row_height], 'size_hint': [None, None],
+                'size_hint_min': [None, None], 'size_hint_max': [None, None],
+                'pos': [layout.x, layout.row_y(index)], 'pos_hint': {},
+                'viewclass': layout.viewclass, 'width_none': False, 'height_none': False}
+
+# Layout virtualizado para a lista de arquivos. Como todas as linhas têm a
+# mesma altura, a posição de cada linha e as linhas visíveis são calculadas
+# aritmeticamente, sem percorrer os dados: atualizar ou rolar a lista custa o
+# mesmo com 100 ou 500 mil arquivos.
+class FileListLayout(RecycleLayout):
+    row_height = NumericProperty(30)
+    spacing = NumericProperty(0)
+    _row_count = 0
+    _laid_out_width = None
+
+    def attach_recycleview(self, rv):
+        super().attach_recycleview(rv)
+        if rv:
+            self.fbind('width', rv.refresh_from_layout)
+            self.fbind('row_height', rv.refresh_from_data)
+            self.fbind('spacing', rv.refresh_from_data)
+
+    def detach_recycleview(self):
+        rv = self.recycleview
+        if rv:
+            self.funbind('width', rv.refresh_from_layout)
+            self.funbind('row_height', rv.refresh_from_data)
+            self.funbind('spacing', rv.refresh_from_data)
+        super().detach_recycleview()
+
+    @property
+    def row_width(self):
+        return self.width
+
+    def row_y(self, index):
+        return self.top - (index + 1) * self.row_height - index * self.spacing
+
+    def compute_sizes_from_data(self, data, flags):
+        self.clear_layout()
+        self._row_count = len(data)
+        self.view_opts = _FileListRowOpts(self, self._row_count)
+
+    def compute_layout(self, data, flags):
+        self._size_needs_update = False
+        n = self._row_count
+        self.height = n * self.row_height + max(0, n - 1) * self.spacing
+        if self._laid_out_width != self.width:
+            # A largura mudou: as linhas visíveis precisam ser posicionadas de novo.
+            self._laid_out_width = self.width
+            self.clear_layout()
+
+    def get_view_index_at(self, pos):
+        if not self._row_count:
+            return 0
+        index = int((self.top - pos[1]) // (self.row_height + self.spacing))
+        return min(max(index, 0), self._row_count - 1)
+
+    def compute_visible_views(self, data, viewport):
+        if not self._row_count:
+            return []
+        x, y, w, h = viewport
+        first = self.get_view_index_at((x, y + h))
+        last = self.get_view_index_at((x, y))
+        return list(range(first, last + 1))
+
+# Os workers do núcleo chamam o listener a partir das suas próprias threads;
+# este adaptador repassa cada chamada para a thread principal através do Clock.
+class MainThreadListener:
+    def __init__(self, target, metrics=None):
+        self.target = target
+        # Com metrics, mede a espera na fila do Clock e o tempo de cada callback.
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+        metrics = self.metrics
+        if metrics is None:
+            return lambda *args: Clock.schedule_once(lambda dt: method(*args))
+
+        def call(*args):
+            queued = time.perf_counter()
+
+            def dispatch(dt):
+                start = time.perf_counter()
+                metrics.observe('ui.queue', start - queued)
+                method(*args)
+                metrics.observe(f'ui.{name}', time.perf_counter() - start)
+            Clock.schedule_once(dispatch)
+        return call
 
 # Classe principal da Aplicação
 class ShuffleTuneApp(App):
@@ -387,16 +526,46 @@ class ShuffleTuneApp(App):
     output_folder_path = StringProperty("")
     status_text = StringProperty("")
     preview_text = StringProperty("")
-    mp3_files = ListProperty([])
-    filtered_files = ListProperty([])
+    # Arquivos selecionados (pelas extensões) e filtrados (pela busca), como
+    # visões sobre a tabela do último escaneamento.
+    mp3_files = FileView()
+    filtered_files = FileView()
     progress_value = NumericProperty(0)
     progress_max = NumericProperty(100)
     include_subfolders_active = BooleanProperty(False)
     open_output_folder_after_rename = BooleanProperty(False)
     sanitize_names_active = BooleanProperty(False)
+    keep_originals_active = BooleanProperty(False)
+    preserve_metadata_active = BooleanProperty(True)
+    skip_duplicates_active = BooleanProperty(False)
     supported_extensions_text = StringProperty("mp3, wav, flac, ogg, m4a")
-    supported_extensions = ListProperty(['.mp3', '.wav', '.flac', '.ogg', '.m4a'])
+    supported_extensions = frozenset(DEFAULT_EXTENSIONS)
+    file_table = None
+    # O observador acrescentou ou alterou linhas desde o último sort().
+    table_unsorted = False
+    # Modo de embaralhamento escolhido e o último embaralhamento aplicado
+    # ({'mode': ..., 'seed': ...}), para poder reproduzi-lo.
+    shuffle_mode = StringProperty('random')
+    SHUFFLE_MODE_NAMES = list(SHUFFLE_MODES)
+    last_shuffle = None
+    # O que o botão Renomear produz: renomear os arquivos, uma "fazenda" de
+    # links numerados no destino ou só uma playlist com a ordem atual.
+    output_mode = StringProperty('rename')
+    OUTPUT_MODE_NAMES = ['rename', 'hardlink', 'symlink', 'm3u8', 'json']
+    PLAYLIST_NAME = "shuffletune"
+    search_index = None
+    _search_trigger = None
+    _folder_trigger = None
     rename_worker = None
+    rename_progress = None
+    _progress_event = None
+    rename_threads = NumericProperty(4)
+    scan_worker = None
+    tag_worker = None
+    # Se as tags dos arquivos da lista atual já foram lidas.
+    tags_loaded = False
+    # Observa a pasta de origem depois do escaneamento (shuffletune_watch).
+    watcher = None
     
     # --- Propriedades de UI para Internacionalização ---
     ui_source_folder_label = StringProperty()
@@ -407,12 +576,16 @@ class ShuffleTuneApp(App):
     ui_include_subfolders_label = StringProperty()
     ui_open_folder_label = StringProperty()
     ui_sanitize_names_label = StringProperty()
+    ui_keep_originals_label = StringProperty()
+    ui_preserve_metadata_label = StringProperty()
+    ui_skip_duplicates_label = StringProperty()
     ui_extensions_label = StringProperty()
     ui_format_label = StringProperty()
     ui_add_prefix_label = StringProperty()
     ui_shuffle_button = StringProperty()
     ui_rename_button = StringProperty()
     ui_cancel_button = StringProperty()
+    ui_undo_button = StringProperty()
     ui_clear_button = StringProperty()
     ui_help_button = StringProperty()
     ui_about_button = StringProperty()
@@ -425,25 +598,48 @@ class ShuffleTuneApp(App):
     ui_ready_status = StringProperty()
     ui_files_found_status = StringProperty()
     ui_no_files_found = StringProperty()
-    ui_and_more_files_status = StringProperty()
     ui_original_to_new_name = StringProperty()
     ui_no_files_to_shuffle = StringProperty()
     ui_shuffled_successfully = StringProperty()
+    ui_shuffle_mode_label = StringProperty()
+    ui_shuffle_modes = ListProperty()
+    ui_shuffle_seed_hint = StringProperty()
+    ui_shuffle_seed_status = StringProperty()
+    ui_tags_loading = StringProperty()
+    ui_output_mode_label = StringProperty()
+    ui_output_modes = ListProperty()
     ui_select_folder_first = StringProperty()
     ui_no_files_to_rename = StringProperty()
     ui_pattern_error = StringProperty()
+    ui_link_output_error = StringProperty()
     ui_confirm_rename_title = StringProperty()
     ui_confirm_rename_message = StringProperty()
     ui_select_folder_title = StringProperty()
     ui_starting_rename = StringProperty()
     ui_renaming_status = StringProperty()
+    ui_copying_status = StringProperty()
+    ui_speed_status = StringProperty()
     ui_op_completed = StringProperty()
     ui_op_failed = StringProperty()
     ui_dest_folder_not_found = StringProperty()
     ui_cancelling_op = StringProperty()
+    ui_scanning_status = StringProperty()
+    ui_scan_in_progress = StringProperty()
+    ui_resume_title = StringProperty()
+    ui_resume_message = StringProperty()
+    ui_confirm_undo_title = StringProperty()
+    ui_confirm_undo_message = StringProperty()
+    ui_nothing_to_undo = StringProperty()
     
+    # Taxa de atualização da barra de progresso durante a renomeação.
+    PROGRESS_FPS = 15
+    # Espera após a última tecla antes de aplicar a busca (segundos).
+    SEARCH_DEBOUNCE = 0.15
+    # Espera após a última tecla no campo da pasta antes de escanear.
+    FOLDER_DEBOUNCE = 0.5
+
     # --- Propriedade de Dados para RecycleView ---
-    recycle_view_data = ListProperty()
+    recycle_view_data = ObjectProperty(FileListRows(), rebind=False)
 
     def build(self):
         Window.clearcolor = (0.17, 0.24, 0.31, 1)
@@ -451,64 +647,231 @@ class ShuffleTuneApp(App):
 
     def on_start(self):
         self.set_language(self.language)
-        self.bind(folder_path=self.on_folder_or_subfolder_changed,
+        self.bind(folder_path=self.on_folder_path_changed,
                   include_subfolders_active=self.on_folder_or_subfolder_changed)
         self.update_preview()
+
+    def on_stop(self):
+        self.cancel_scan()
         
+    def on_folder_path_changed(self, *args):
+        # Chamado a cada tecla: o escaneamento atual para na hora, mas o novo
+        # só começa quando a digitação parar (cada tecla reinicia a espera).
+        self.cancel_scan()
+        if self._folder_trigger is None:
+            self._folder_trigger = Clock.create_trigger(self.on_folder_or_subfolder_changed, self.FOLDER_DEBOUNCE)
+        self._folder_trigger.cancel()
+        self._folder_trigger()
+
     def on_folder_or_subfolder_changed(self, *args):
+        if self._folder_trigger is not None:
+            self._folder_trigger.cancel()
+        # Cancela qualquer escaneamento em andamento antes de iniciar um novo.
+        self.cancel_scan()
+        self.file_table = None
+        self.search_index = None
+        self.last_shuffle = None
+        self.mp3_files = FileView()
+        self.filtered_files = FileView()
         folder = self.folder_path
         if not (folder and os.path.isdir(folder)):
-            self.mp3_files = []
-            self.filtered_files = []
             if hasattr(self, 'ui_ready_status'): # Garante que a UI foi inicializada
                 self.status_text = self.ui_ready_status
                 self.update_file_list_display()
                 self.update_preview()
             return
 
-        temp_files = []
-        try:
-            if self.include_subfolders_active:
-                for root, _, files in os.walk(folder):
-                    for f in files:
-                        if os.path.splitext(f)[1].lower() in self.supported_extensions:
-                            temp_files.append(os.path.relpath(os.path.join(root, f), folder))
-            else:
-                for f in os.listdir(folder):
-                    full_path = os.path.join(folder, f)
-                    if os.path.isfile(full_path) and os.path.splitext(f)[1].lower() in self.supported_extensions:
-                        temp_files.append(f)
-            
-            self.mp3_files = sorted(temp_files)
-            self.on_search_text_changed(self.root.ids.txt_search_files.text if self.root else "")
-            self.status_text = self.ui_files_found_status.format(count=len(self.mp3_files))
+        self.status_text = self.ui_scanning_status.format(count=0)
+        self.update_file_list_display()
+        self.update_preview()
+        # O escaneamento guarda todas as extensões; o filtro é aplicado em memória.
+        self.file_table = FileTable()
+        self.mp3_files = FileView(self.file_table)
+        self.filtered_files = FileView(self.file_table)
+        metrics = RunMetrics('scan')
+        self.scan_worker = ScanWorker(folder, self.include_subfolders_active, MainThreadListener(self, metrics),
+                                      metrics=metrics)
+        self.scan_worker.start()
+
+    def cancel_scan(self):
+        if self.scan_worker:
+            self.scan_worker.stop()
+            self.scan_worker = None
+        if self.tag_worker:
+            self.tag_worker.stop()
+            self.tag_worker = None
+        self.stop_watching()
+
+    def is_scanning(self):
+        return self.scan_worker is not None and self.scan_worker.is_alive()
+
+    def on_scan_batch(self, worker, batch):
+        # Ignora lotes de escaneamentos que já foram cancelados.
+        if worker is not self.scan_worker:
+            return
+        table = self.file_table
+        wanted = table.ext_matcher(self.supported_extensions)
+        ext_ids = table.ext_ids
+        rows = [i for i in table.extend(batch) if ext_ids[i] in wanted]
+        self.mp3_files.extend(rows)
+        search_term = self.root.ids.txt_search_files.text.lower() if self.root else ""
+        if search_term:
+            rows = [i for i in rows if search_term in table.file_name(i).lower()]
+        self.filtered_files.extend(rows)
+        self.status_text = self.ui_scanning_status.format(count=len(self.mp3_files))
+        self.update_file_list_display()
+        if len(self.filtered_files) == len(rows):
             self.update_preview()
-        except OSError as e:
-            self.show_message("Erro de Permissão", f"Não foi possível acessar a pasta:\n{e}", 'error')
-            self.mp3_files = []
-            self.filtered_files = []
+
+    def on_scan_finished(self, worker):
+        if worker is not self.scan_worker:
+            return
+        self.scan_worker = None
+        self.file_table.sort()
+        self.table_unsorted = False
+        self.mp3_files = self.file_table.select(self.supported_extensions)
+        self.rebuild_search_index()
+        self.apply_search(self.root.ids.txt_search_files.text if self.root else "")
+        self.status_text = self.ui_files_found_status.format(count=len(self.mp3_files))
+        self.update_preview()
+        self.start_tag_loading()
+        self.start_watching()
+        # No próximo quadro, para incluir o tempo deste callback.
+        Clock.schedule_once(lambda dt: self.save_run_report(worker.metrics))
+
+    def tags_needed(self):
+        # Como na linha de comando: tags só quando o formato ou o embaralhamento usam.
+        if self.shuffle_mode == 'artist':
+            return True
+        try:
+            return self.build_rename_pattern().uses_tags
+        except ValueError:
+            return False
+
+    def start_tag_loading(self):
+        # Lê as tags (ou as busca no cache) em segundo plano, para que os campos
+        # de tags do formato e o modo "artista" já as encontrem prontas.
+        # Chamado quando a lista muda; sem uso de tags, só marca que faltam.
+        if self.tag_worker:
+            self.tag_worker.stop()
+            self.tag_worker = None
+        self.tags_loaded = False
+        if not self.tags_needed():
+            return
+        self.tag_worker = TagWorker(self.tag_store(), self.mp3_files.copy(), MainThreadListener(self))
+        self.tag_worker.start()
+
+    def tag_store(self):
+        if self.file_table.tags is None:
+            self.file_table.tags = TagStore(self.folder_path)
+        return self.file_table.tags
+
+    def on_tags_loaded(self, worker, store):
+        if worker is not self.tag_worker:
+            return
+        self.tag_worker = None
+        self.tags_loaded = True
+        self.update_preview()
+
+    def ensure_tags(self):
+        # O formato ou o modo de embaralhamento passou a usar tags.
+        if (self.file_table is not None and not self.is_scanning() and not self.tags_loaded
+                and self.tag_worker is None and self.tags_needed()):
+            self.start_tag_loading()
+
+    def on_format_changed(self, *args):
+        self.ensure_tags()
+        self.update_preview()
+
+    def start_watching(self):
+        self.stop_watching()
+        self.watcher = create_watcher(self.folder_path, self.include_subfolders_active, MainThreadListener(self))
+        self.watcher.start()
+
+    def stop_watching(self):
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+
+    def on_fs_changes(self, watcher, changes):
+        # Arquivos criados, apagados ou movidos na pasta de origem desde o
+        # escaneamento: atualiza a tabela, as visões e o índice de busca.
+        if watcher is not self.watcher or self.file_table is None:
+            return
+        if any(change[0] == 'rescan' for change in changes):
+            self.on_folder_or_subfolder_changed()
+            return
+        self.apply_table_changes(changes)
+        self.status_text = self.ui_files_found_status.format(count=len(self.mp3_files))
+
+    def apply_table_changes(self, changes):
+        table = self.file_table
+        added, changed, removed = table.apply_changes(changes)
+        if added or changed:
+            self.table_unsorted = True
+        wanted = table.ext_matcher(self.supported_extensions)
+        ext_ids = table.ext_ids
+        if changed:
+            # Um arquivo renomeado pode ter mudado de extensão.
+            listed = set(self.mp3_files.indices)
+            removed |= {i for i in changed if i in listed and ext_ids[i] not in wanted}
+            added += [i for i in changed if i not in listed and ext_ids[i] in wanted]
+        # Os arquivos novos entram no fim da lista, como durante o escaneamento.
+        self.mp3_files.discard(removed)
+        self.mp3_files.extend(i for i in added if ext_ids[i] in wanted)
+        self.search_index.update(added + list(changed | removed))
+        self.apply_search(self.root.ids.txt_search_files.text if self.root else "")
+
+    def on_scan_error(self, worker, error):
+        if worker is not self.scan_worker:
+            return
+        self.scan_worker = None
+        self.file_table = None
+        self.search_index = None
+        self.show_message("Erro de Permissão", f"Não foi possível acessar a pasta:\n{error}", 'error')
+        self.mp3_files = FileView()
+        self.filtered_files = FileView()
+        self.update_file_list_display()
+        self.update_preview()
 
     def on_extensions_text_changed(self, value):
         ext_list = [f".{ext.strip().lower()}" for ext in value.split(',') if ext.strip()]
-        self.supported_extensions = ext_list if ext_list else ['.mp3']
-        self.on_folder_or_subfolder_changed()
+        self.supported_extensions = frozenset(ext_list if ext_list else ['.mp3'])
+        if self.file_table is None:
+            return
+        self.mp3_files = self.file_table.select(self.supported_extensions)
+        self.last_shuffle = None
+        self.apply_search(self.root.ids.txt_search_files.text if self.root else "")
+        if self.is_scanning():
+            self.status_text = self.ui_scanning_status.format(count=len(self.mp3_files))
+        else:
+            self.status_text = self.ui_files_found_status.format(count=len(self.mp3_files))
+            self.start_tag_loading()
+        self.update_preview()
 
     def on_search_text_changed(self, value):
-        search_term = value.lower()
-        if search_term:
-            self.filtered_files = [f for f in self.mp3_files if search_term in os.path.basename(f).lower()]
+        # Chamado a cada tecla: agrupa as teclas e aplica a busca uma vez só.
+        if self._search_trigger is None:
+            self._search_trigger = Clock.create_trigger(
+                lambda dt: self.apply_search(self.root.ids.txt_search_files.text), self.SEARCH_DEBOUNCE)
+        self._search_trigger()
+
+    def rebuild_search_index(self):
+        self.search_index = SearchIndex(self.file_table)
+
+    def apply_search(self, value):
+        if self.search_index is None:
+            # Escaneamento em andamento: ainda não há índice.
+            search_term = value.lower()
+            file_name = self.file_table.file_name if self.file_table else None
+            self.filtered_files = self.mp3_files.where(lambda i: search_term in file_name(i).lower())
         else:
-            self.filtered_files = list(self.mp3_files)
+            self.filtered_files = self.search_index.filter(self.mp3_files, value)
         self.update_file_list_display()
+        self.update_preview()
 
     def update_file_list_display(self):
-        if not self.filtered_files:
-            self.recycle_view_data = [{'text': self.ui_no_files_found}]
-        else:
-            display_limit = 100
-            self.recycle_view_data = [{'text': os.path.basename(f)} for f in self.filtered_files[:display_limit]]
-            if len(self.filtered_files) > display_limit:
-                 self.recycle_view_data.append({'text': f"\n... {self.ui_and_more_files_status}"})
+        self.recycle_view_data = FileListRows(self.filtered_files, self.ui_no_files_found)
 
     def update_preview(self, *args):
         if not self.root: return
@@ -516,25 +879,25 @@ class ShuffleTuneApp(App):
             self.preview_text = self.ui_original_to_new_name
             return
 
-        sample_file_name_only = os.path.basename(self.filtered_files[0])
-        name, ext = os.path.splitext(sample_file_name_only)
-        
-        if self.sanitize_names_active:
-            name = self._sanitize_filename_preview(name)
+        sample = self.filtered_files[0]
+        try:
+            # Mesmo código da renomeação; o número usa a largura da lista completa.
+            pattern = self.build_rename_pattern()
+            new_name = next(pattern.names(self.filtered_files[:1], total=len(self.mp3_files))) + sample.ext
+        except ValueError as e:
+            self.preview_text = f"{sample.file_name} -> {e}"
+            return
+        self.preview_text = f"{sample.file_name} -> {new_name}"
 
+    def build_rename_pattern(self):
         if self.root.ids.chk_add_prefix.active:
-            new_name = f"001 - {name}{ext}"
+            pattern = RenamePattern.PREFIX_PATTERN
         else:
             pattern = self.root.ids.txt_format.text
-            new_name = pattern.replace("{index}", "001").replace("{name}", name) + ext
-
-        self.preview_text = f"{sample_file_name_only} -> {new_name}"
-
-    def _sanitize_filename_preview(self, filename):
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        return ' '.join(filename.split()).strip()
+        tags = self.file_table.tags if self.file_table else None
+        return RenamePattern(pattern, sanitize=NAME_SANITIZER if self.sanitize_names_active else None,
+                             tag_reader=tags.get if tags is not None else None,
+                             root_name=os.path.basename(os.path.normpath(self.folder_path)))
 
     def browse_folder(self, folder_type):
         if sys.platform == 'android':
@@ -572,27 +935,82 @@ class ShuffleTuneApp(App):
         popup.open()
         
     def shuffle_files(self, *args):
+        if self.is_scanning():
+            self.show_message("Erro", self.ui_scan_in_progress, 'error')
+            return
         if not self.mp3_files:
             self.show_message("Erro", self.ui_no_files_to_shuffle, 'error')
             return
-        random.shuffle(self.mp3_files)
-        self.on_search_text_changed(self.root.ids.txt_search_files.text)
+        if self.shuffle_mode == 'artist' and not self.tags_loaded:
+            self.ensure_tags()
+            self.show_message("Erro", self.ui_tags_loading, 'error')
+            return
+        seed_text = self.root.ids.txt_shuffle_seed.text.strip()
+        if not seed_text:
+            seed = None
+        elif seed_text.isdigit():
+            seed = int(seed_text)
+        else:
+            seed = seed_text
+        # Parte sempre da lista em ordem de caminho, não do embaralhamento
+        # anterior, para que a mesma semente reproduza a mesma ordem. Só é
+        # preciso ordenar de novo se o observador acrescentou ou renomeou
+        # arquivos; o sort() só reordena os índices (a busca continua valendo).
+        if self.table_unsorted:
+            self.file_table.sort()
+            self.table_unsorted = False
+        base = self.file_table.select(self.supported_extensions)
+        self.mp3_files, seed = shuffle_view(base, self.shuffle_mode, seed)
+        self.last_shuffle = {'mode': self.shuffle_mode, 'seed': seed}
+        self.apply_search(self.root.ids.txt_search_files.text)
         self.update_preview()
-        self.show_message("Sucesso", self.ui_shuffled_successfully, 'info')
+        status = self.ui_shuffle_seed_status.format(mode=self.shuffle_mode, seed=seed)
+        self.status_text = status
+        self.show_message("Sucesso", f"{self.ui_shuffled_successfully}\n{status}", 'info')
+
+    def select_shuffle_mode(self, label):
+        if label in self.ui_shuffle_modes:
+            self.shuffle_mode = self.SHUFFLE_MODE_NAMES[self.ui_shuffle_modes.index(label)]
+            self.ensure_tags()
+
+    def select_output_mode(self, label):
+        if label in self.ui_output_modes:
+            self.output_mode = self.OUTPUT_MODE_NAMES[self.ui_output_modes.index(label)]
 
     def confirm_rename(self, *args):
         if not self.folder_path or not os.path.isdir(self.folder_path):
             self.show_message("Erro", self.ui_select_folder_first, 'error')
             return
+        if self.is_scanning():
+            self.show_message("Erro", self.ui_scan_in_progress, 'error')
+            return
         if not self.mp3_files:
             self.show_message("Erro", self.ui_no_files_to_rename, 'error')
             return
-        if not self.root.ids.chk_add_prefix.active:
-            pattern = self.root.ids.txt_format.text
-            if "{index}" not in pattern and "{name}" not in pattern:
-                self.show_message("Erro", self.ui_pattern_error, 'error')
-                return
+        if self.output_mode in ('m3u8', 'json'):
+            # A playlist não mexe em nenhum arquivo: dispensa a confirmação.
+            self._start_playlist_worker()
+            return
+        if self.output_mode in LINK_MODES and (
+                not self.output_folder_path or same_folder(self.output_folder_path, self.folder_path)):
+            self.show_message("Erro", self.ui_link_output_error, 'error')
+            return
+        try:
+            pattern_ok = self.build_rename_pattern().is_unique
+        except ValueError:
+            pattern_ok = False
+        if not pattern_ok:
+            self.show_message("Erro", self.ui_pattern_error, 'error')
+            return
+        if RenameJournal.is_incomplete(self.folder_path):
+            # Uma operação anterior foi interrompida: oferece retomá-la antes de começar outra.
+            self.show_confirmation(self.ui_resume_title, self.ui_resume_message,
+                                   on_yes=lambda: self._start_journal_worker(undo=False),
+                                   on_no=self._confirm_new_rename)
+            return
+        self._confirm_new_rename()
 
+    def _confirm_new_rename(self):
         content = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
         content.add_widget(Label(text=self.ui_confirm_rename_message, text_size=(Window.width * 0.7, None), halign='center'))
         btn_layout = BoxLayout(orientation='horizontal', spacing=dp(10), size_hint_y=None, height=dp(40))
@@ -612,19 +1030,87 @@ class ShuffleTuneApp(App):
         self.progress_max = len(self.mp3_files)
         self.progress_value = 0
         self.status_text = self.ui_starting_rename
+        self.start_progress_updates()
+        # As mudanças da própria renomeação vêm do plano, não do observador.
+        if self.watcher:
+            self.watcher.suspend()
+        metrics = RunMetrics('rename')
         self.rename_worker = RenameWorker(
             self.mp3_files, self.folder_path, self.root.ids.txt_format.text,
-            self.root.ids.chk_add_prefix.active, self,
+            self.root.ids.chk_add_prefix.active, MainThreadListener(self, metrics),
             output_folder=self.output_folder_path if self.output_folder_path else None,
-            sanitize_names=self.sanitize_names_active)
+            sanitize_names=self.sanitize_names_active,
+            max_workers=self.rename_threads,
+            keep_originals=self.keep_originals_active,
+            preserve_metadata=self.preserve_metadata_active,
+            progress=self.rename_progress,
+            shuffle=self.last_shuffle,
+            tags=self.tag_store() if self.file_table else None,
+            duplicates=DuplicateFinder(self.folder_path) if self.skip_duplicates_active else None,
+            metrics=metrics,
+            link=self.output_mode if self.output_mode in LINK_MODES else None)
         self.rename_worker.start()
 
-    def on_rename_progress(self, current, new_name):
-        self.progress_value = current
-        self.status_text = self.ui_renaming_status.format(new_name=new_name, current=current, total=self.progress_max)
+    def _start_playlist_worker(self):
+        self.toggle_ui_elements(True)
+        self.progress_value = 0
+        self.rename_progress = None
+        self.status_text = self.ui_starting_rename
+        output_folder = self.output_folder_path if self.output_folder_path else self.folder_path
+        path = os.path.join(output_folder, f"{self.PLAYLIST_NAME}.{self.output_mode}")
+        self.rename_worker = PlaylistWorker(
+            self.mp3_files, self.folder_path, path, MainThreadListener(self),
+            duplicates=DuplicateFinder(self.folder_path) if self.skip_duplicates_active else None)
+        self.rename_worker.start()
+
+    def confirm_undo(self, *args):
+        if not self.folder_path or not RenameJournal.exists(self.folder_path):
+            self.show_message("Erro", self.ui_nothing_to_undo, 'error')
+            return
+        self.show_confirmation(self.ui_confirm_undo_title, self.ui_confirm_undo_message,
+                               on_yes=lambda: self._start_journal_worker(undo=True))
+
+    def _start_journal_worker(self, undo):
+        self.cancel_scan()
+        self.toggle_ui_elements(True)
+        self.progress_value = 0
+        self.status_text = self.ui_starting_rename
+        self.start_progress_updates()
+        self.rename_worker = JournalWorker(self.folder_path, MainThreadListener(self), undo=undo,
+                                           preserve_metadata=self.preserve_metadata_active,
+                                           progress=self.rename_progress)
+        self.rename_worker.start()
+
+    def start_progress_updates(self):
+        self.rename_progress = ProgressCounter()
+        self._progress_event = Clock.schedule_interval(self.update_progress_display, 1.0 / self.PROGRESS_FPS)
+
+    def stop_progress_updates(self):
+        if self._progress_event is not None:
+            self._progress_event.cancel()
+            self._progress_event = None
+        if self.rename_progress is not None:
+            self.update_progress_display()
+
+    def update_progress_display(self, *args):
+        progress = self.rename_progress.snapshot()
+        if not progress['new_name']:
+            return
+        self.progress_max = max(progress['total'], 1)
+        self.progress_value = progress['current']
+        if progress['mb_per_s'] > 0:
+            status = self.ui_copying_status.format(rate=progress['mb_per_s'], **progress)
+        else:
+            status = self.ui_renaming_status.format(**progress)
+        self.status_text = status + self.ui_speed_status.format(
+            files_per_s=progress['files_per_s'], eta=format_duration(progress['eta']))
         
     def on_rename_finished(self, success, message):
+        self.stop_progress_updates()
         self.toggle_ui_elements(False)
+        metrics = getattr(self.rename_worker, 'metrics', None)
+        if metrics is not None:
+            Clock.schedule_once(lambda dt: self.save_run_report(metrics))
         if success:
             self.status_text = self.ui_op_completed
             self.show_message("Sucesso", message, 'info')
@@ -633,7 +1119,37 @@ class ShuffleTuneApp(App):
         else:
             self.status_text = self.ui_op_failed
             self.show_message("Erro", message, 'error')
-        self.on_folder_or_subfolder_changed()
+        if isinstance(self.rename_worker, PlaylistWorker):
+            # Nenhum arquivo da lista mudou (a playlist nova chega pelo observador).
+            return
+        plan = getattr(self.rename_worker, 'executed_plan', None)
+        if plan is None or self.file_table is None or self.watcher is None:
+            # Desfazer, operação cancelada ou com erro: escaneia de novo.
+            self.on_folder_or_subfolder_changed()
+            return
+        # Atualiza a lista a partir do plano executado, sem escanear a pasta.
+        worker = self.rename_worker
+        self.file_table.apply_changes(plan_changes(plan, self.folder_path, worker.files.indices,
+                                                   worker.keep_originals))
+        self.file_table.sort()
+        self.table_unsorted = False
+        self.mp3_files = self.file_table.select(self.supported_extensions)
+        self.last_shuffle = None
+        self.rebuild_search_index()
+        self.apply_search(self.root.ids.txt_search_files.text if self.root else "")
+        self.status_text = self.ui_files_found_status.format(count=len(self.mp3_files))
+        self.start_tag_loading()
+        self.watcher.resume()
+
+    def save_run_report(self, metrics):
+        # Relatório da última execução de cada tipo (last-scan.json,
+        # last-rename.json) na pasta de cache, para investigar lentidões.
+        try:
+            reports_dir = os.path.join(get_cache_dir(), 'reports')
+            os.makedirs(reports_dir, exist_ok=True)
+            metrics.write_json(os.path.join(reports_dir, f"last-{metrics.name}.json"))
+        except OSError:
+            pass
 
     def open_folder_in_explorer(self, path):
         if not os.path.isdir(path):
@@ -662,6 +1178,10 @@ class ShuffleTuneApp(App):
         self.include_subfolders_active = False
         self.open_output_folder_after_rename = False
         self.sanitize_names_active = False
+        self.keep_originals_active = False
+        self.preserve_metadata_active = True
+        self.skip_duplicates_active = False
+        self.output_mode = 'rename'
         self.supported_extensions_text = "mp3, wav, flac, ogg, m4a"
         self.root.ids.txt_search_files.text = ""
         self.progress_value = 0
@@ -685,12 +1205,16 @@ class ShuffleTuneApp(App):
             self.ui_include_subfolders_label = "Incluir Subpastas"
             self.ui_open_folder_label = "Abrir pasta de destino ao concluir"
             self.ui_sanitize_names_label = "Limpar nomes (remover caracteres inválidos)"
+            self.ui_keep_originals_label = "Copiar para o destino (manter originais)"
+            self.ui_preserve_metadata_label = "Preservar data e permissões ao copiar"
+            self.ui_skip_duplicates_label = "Ignorar duplicatas (conteúdo idêntico)"
             self.ui_extensions_label = "Extensões (separadas por vírgula):"
             self.ui_format_label = "Formato da Renomeação:"
             self.ui_add_prefix_label = "Adicionar prefixo numérico sequencial"
             self.ui_shuffle_button = "Embaralhar"
             self.ui_rename_button = "Renomear"
             self.ui_cancel_button = "Cancelar"
+            self.ui_undo_button = "Desfazer"
             self.ui_clear_button = "Limpar"
             self.ui_help_button = "Ajuda"
             self.ui_about_button = "Sobre"
@@ -704,22 +1228,39 @@ class ShuffleTuneApp(App):
             # CORREÇÃO: Removido um par de chaves extra.
             self.ui_files_found_status = "{count} arquivos encontrados"
             self.ui_no_files_found = "Nenhum arquivo encontrado ou filtrado."
-            self.ui_and_more_files_status = "e mais..."
             self.ui_original_to_new_name = "Original -> Novo Nome"
             self.ui_no_files_to_shuffle = "Nenhum arquivo encontrado para embaralhar."
             self.ui_shuffled_successfully = "Arquivos embaralhados com sucesso!"
+            self.ui_shuffle_mode_label = "Embaralhamento:"
+            self.ui_shuffle_modes = ["Aleatório", "Espalhar pastas", "Equilibrar pastas", "Espalhar artistas"]
+            self.ui_shuffle_seed_hint = "Semente"
+            self.ui_shuffle_seed_status = "Modo: {mode}, semente: {seed}"
+            self.ui_tags_loading = "Aguarde a leitura das tags dos arquivos."
+            self.ui_output_mode_label = "Saída:"
+            self.ui_output_modes = ["Renomear arquivos", "Links físicos no destino", "Links simbólicos no destino",
+                                    "Playlist M3U8", "Playlist JSON"]
             self.ui_select_folder_first = "Por favor, selecione uma pasta de origem primeiro."
             self.ui_no_files_to_rename = "Nenhum arquivo encontrado para renomear."
-            self.ui_pattern_error = "O padrão deve conter '{index}' ou '{name}'."
+            self.ui_pattern_error = "O padrão deve conter '{index}', '{folder_index}' ou '{name}', e apenas campos conhecidos."
+            self.ui_link_output_error = "Para criar links, escolha uma pasta de destino diferente da pasta de origem."
             self.ui_confirm_rename_title = "Confirmar Renomeação"
             self.ui_confirm_rename_message = "Tem certeza?\\nEsta operação modifica os arquivos permanentemente."
             self.ui_select_folder_title = "Selecionar Pasta"
             self.ui_starting_rename = "Iniciando renomeação..."
             self.ui_renaming_status = "Renomeando: {new_name} ({current}/{total})"
+            self.ui_copying_status = "Copiando: {new_name} ({current}/{total}) - {rate:.1f} MB/s"
+            self.ui_speed_status = " - {files_per_s:.0f} arquivos/s, restam {eta}"
             self.ui_op_completed = "Operação concluída com sucesso."
             self.ui_op_failed = "Operação falhou ou foi cancelada."
             self.ui_dest_folder_not_found = "Pasta de destino não encontrada."
             self.ui_cancelling_op = "Cancelando operação..."
+            self.ui_scanning_status = "Escaneando pasta... {count} arquivos encontrados"
+            self.ui_scan_in_progress = "Aguarde o fim do escaneamento da pasta."
+            self.ui_resume_title = "Operação Interrompida"
+            self.ui_resume_message = "A última operação nesta pasta não terminou.\\nDeseja retomá-la agora?"
+            self.ui_confirm_undo_title = "Desfazer Operação"
+            self.ui_confirm_undo_message = "Restaurar os nomes originais da última operação nesta pasta?"
+            self.ui_nothing_to_undo = "Nenhuma operação para desfazer nesta pasta."
         else: # English
             self.title = "ShuffleTune - File Renamer"
             self.ui_source_folder_label = "Source Folder:"
@@ -730,12 +1271,16 @@ class ShuffleTuneApp(App):
             self.ui_include_subfolders_label = "Include Subfolders"
             self.ui_open_folder_label = "Open output folder when done"
             self.ui_sanitize_names_label = "Sanitize names (remove invalid chars)"
+            self.ui_keep_originals_label = "Copy to output (keep originals)"
+            self.ui_preserve_metadata_label = "Preserve dates and permissions when copying"
+            self.ui_skip_duplicates_label = "Skip duplicates (identical content)"
             self.ui_extensions_label = "Extensions (comma-separated):"
             self.ui_format_label = "Renaming Pattern:"
             self.ui_add_prefix_label = "Add sequential number prefix"
             self.ui_shuffle_button = "Shuffle"
             self.ui_rename_button = "Rename"
             self.ui_cancel_button = "Cancel"
+            self.ui_undo_button = "Undo"
             self.ui_clear_button = "Clear"
             self.ui_help_button = "Help"
             self.ui_about_button = "About"
@@ -748,22 +1293,39 @@ class ShuffleTuneApp(App):
             self.ui_ready_status = "Ready"
             self.ui_files_found_status = "Found {count} files"
             self.ui_no_files_found = "No files found or filtered."
-            self.ui_and_more_files_status = "and more..."
             self.ui_original_to_new_name = "Original -> New Name"
             self.ui_no_files_to_shuffle = "No files found to shuffle."
             self.ui_shuffled_successfully = "Files shuffled successfully!"
+            self.ui_shuffle_mode_label = "Shuffle:"
+            self.ui_shuffle_modes = ["Random", "Spread folders", "Balance folders", "Spread artists"]
+            self.ui_shuffle_seed_hint = "Seed"
+            self.ui_shuffle_seed_status = "Mode: {mode}, seed: {seed}"
+            self.ui_tags_loading = "Please wait while the file tags are read."
+            self.ui_output_mode_label = "Output:"
+            self.ui_output_modes = ["Rename files", "Hard links in output", "Symbolic links in output",
+                                    "M3U8 playlist", "JSON playlist"]
             self.ui_select_folder_first = "Please select a source folder first."
             self.ui_no_files_to_rename = "No files found to rename."
-            self.ui_pattern_error = "Pattern must contain '{index}' or '{name}'."
+            self.ui_pattern_error = "Pattern must contain '{index}', '{folder_index}' or '{name}', and only known fields."
+            self.ui_link_output_error = "To create links, choose an output folder different from the source folder."
             self.ui_confirm_rename_title = "Confirm Rename"
             self.ui_confirm_rename_message = "Are you sure?\\nThis operation permanently modifies your files."
             self.ui_select_folder_title = "Select Folder"
             self.ui_starting_rename = "Starting renaming..."
             self.ui_renaming_status = "Renaming: {new_name} ({current}/{total})"
+            self.ui_copying_status = "Copying: {new_name} ({current}/{total}) - {rate:.1f} MB/s"
+            self.ui_speed_status = " - {files_per_s:.0f} files/s, {eta} left"
             self.ui_op_completed = "Operation completed successfully."
             self.ui_op_failed = "Operation failed or was cancelled."
             self.ui_dest_folder_not_found = "Destination folder not found."
             self.ui_cancelling_op = "Cancelling operation..."
+            self.ui_scanning_status = "Scanning folder... {count} files found"
+            self.ui_scan_in_progress = "Please wait for the folder scan to finish."
+            self.ui_resume_title = "Interrupted Operation"
+            self.ui_resume_message = "The last operation in this folder did not finish.\\nDo you want to resume it now?"
+            self.ui_confirm_undo_title = "Undo Operation"
+            self.ui_confirm_undo_message = "Restore the original names from the last operation in this folder?"
+            self.ui_nothing_to_undo = "No operation to undo in this folder."
         
         self.on_folder_or_subfolder_changed()
 
@@ -777,6 +1339,26 @@ class ShuffleTuneApp(App):
         close_button.bind(on_release=popup.dismiss)
         popup.open()
 
+    def show_confirmation(self, title, message, on_yes, on_no=None):
+        content = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
+        content.add_widget(Label(text=message, text_size=(Window.width * 0.7, None), halign='center'))
+        btn_layout = BoxLayout(orientation='horizontal', spacing=dp(10), size_hint_y=None, height=dp(40))
+        btn_yes = Button(text=self.ui_yes_button)
+        btn_no = Button(text=self.ui_no_button)
+        btn_layout.add_widget(btn_yes)
+        btn_layout.add_widget(btn_no)
+        content.add_widget(btn_layout)
+        popup = Popup(title=title, content=content, size_hint=(0.8, 0.5), auto_dismiss=False)
+
+        def answer(callback):
+            popup.dismiss()
+            if callback:
+                callback()
+
+        btn_yes.bind(on_release=lambda x: answer(on_yes))
+        btn_no.bind(on_release=lambda x: answer(on_no))
+        popup.open()
+
     def show_help_popup(self, *args):
         help_text_pt = (
             "1. [b]Pasta de Origem:[/b] Selecione a pasta com seus arquivos.\\n"
@@ -784,10 +1366,15 @@ class ShuffleTuneApp(App):
             "3. [b]Incluir Subpastas:[/b] Processa arquivos em todas as subpastas.\\n"
             "4. [b]Abrir Pasta de Destino:[/b] Abre a pasta de destino no final.\\n"
             "5. [b]Limpar Nomes:[/b] Remove caracteres inválidos como / ? * < > dos nomes.\\n"
-            "6. [b]Extensões:[/b] Defina os tipos de arquivo a processar (ex: mp3, wav).\\n"
-            "7. [b]Formato:[/b] Use {index} para número e {name} para o nome original.\\n"
-            "8. [b]Embaralhar:[/b] Aleatoriza a ordem dos arquivos antes de renomear.\\n"
-            "9. [b]Renomear:[/b] Inicia a operação."
+            "6. [b]Copiar para o Destino:[/b] Copia os arquivos renomeados e mantém os originais.\\n"
+            "7. [b]Preservar Data e Permissões:[/b] Mantém a data de modificação dos arquivos copiados.\\n"
+            "8. [b]Ignorar Duplicatas:[/b] Deixa de fora arquivos com o mesmo conteúdo de outro, mesmo com nomes diferentes (fica o primeiro).\\n"
+            "9. [b]Extensões:[/b] Defina os tipos de arquivo a processar (ex: mp3, wav).\\n"
+            "10. [b]Formato:[/b] Use {index} para número e {name} para o nome original. Também: {index:04}, {folder_index}, {parent}, {ext}, {size}, {mtime:%Y} e tags como {artist}, {album}, {title} e {track}.\\n"
+            "11. [b]Embaralhar:[/b] Aleatoriza a ordem dos arquivos antes de renomear. 'Espalhar pastas' evita duas faixas seguidas da mesma pasta e 'Equilibrar pastas' dá a mesma chance a cada pasta. 'Espalhar artistas' faz o mesmo usando o artista das tags. Informe uma semente para repetir um embaralhamento.\\n"
+            "12. [b]Saída:[/b] 'Renomear arquivos' renomeia ou move os arquivos. Os modos de links criam na pasta de destino (que deve ser outra) links numerados para os originais, que não saem do lugar, e os de playlist só gravam a ordem atual em shuffletune.m3u8 ou shuffletune.json, sem mexer em nenhum arquivo.\\n"
+            "13. [b]Renomear:[/b] Inicia a operação.\\n"
+            "14. [b]Desfazer:[/b] Restaura os nomes originais da última operação na pasta."
         )
         help_text_en = (
             "1. [b]Source Folder:[/b] Select the folder with your files.\\n"
@@ -795,10 +1382,15 @@ class ShuffleTuneApp(App):
             "3. [b]Include Subfolders:[/b] Process files in all subfolders.\\n"
             "4. [b]Open Output Folder:[/b] Opens the destination folder when complete.\\n"
             "5. [b]Sanitize Names:[/b] Removes invalid characters like / ? * < > from names.\\n"
-            "6. [b]Extensions:[/b] Define file types to process (e.g., mp3, wav).\\n"
-            "7. [b]Pattern:[/b] Use {index} for a number and {name} for the original name.\\n"
-            "8. [b]Shuffle:[/b] Randomizes the file order before renaming.\\n"
-            "9. [b]Rename:[/b] Starts the operation."
+            "6. [b]Copy to Output:[/b] Copies the renamed files and keeps the originals.\\n"
+            "7. [b]Preserve Dates and Permissions:[/b] Keeps the modification date of copied files.\\n"
+            "8. [b]Skip Duplicates:[/b] Leaves out files with the same content as another, even under different names (the first one is kept).\\n"
+            "9. [b]Extensions:[/b] Define file types to process (e.g., mp3, wav).\\n"
+            "10. [b]Pattern:[/b] Use {index} for a number and {name} for the original name. Also: {index:04}, {folder_index}, {parent}, {ext}, {size}, {mtime:%Y} and tags such as {artist}, {album}, {title} and {track}.\\n"
+            "11. [b]Shuffle:[/b] Randomizes the file order before renaming. 'Spread folders' avoids two tracks in a row from the same folder and 'Balance folders' gives every folder the same chance. 'Spread artists' does the same using the artist tag. Enter a seed to repeat a shuffle.\\n"
+            "12. [b]Output:[/b] 'Rename files' renames or moves the files. The link modes create numbered links to the originals in the output folder (which must be a different folder), leaving the originals in place, and the playlist modes only write the current order to shuffletune.m3u8 or shuffletune.json without touching any file.\\n"
+            "13. [b]Rename:[/b] Starts the operation.\\n"
+            "14. [b]Undo:[/b] Restores the original names from the last operation in the folder."
         )
         
         content = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
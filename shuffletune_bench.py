@@ -0,0 +1,289 @@
+# Benchmarks do ShuffleTune: gera uma biblioteca sintética (tamanho,
+# profundidade e mistura de extensões configuráveis, com semente fixa) e mede
+# as mesmas etapas que a interface executa: escaneamento (frio e com o índice
+# em cache), busca, embaralhamento, pré-visualização, planejamento e a
+# renomeação completa. O resultado sai em JSON; com --baseline, as medianas
+# são comparadas com um resultado anterior e o código de saída indica se
+# alguma etapa ficou mais lenta que a tolerância ou passou de BUDGETS_US.
+#
+#   python shuffletune_bench.py --files 100k -o atual.json
+#   python shuffletune_bench.py --files 100k --baseline atual.json --tolerance 0.15
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from shuffletune_core import (
+    DEFAULT_EXTENSIONS, NAME_SANITIZER, SHUFFLE_MODES, FileTable, RenamePattern, RenameWorker, ScanWorker,
+    SearchIndex, load_files, shuffle_view,
+)
+
+RESULT_VERSION = 1
+
+# Limites absolutos em µs por arquivo, valendo mesmo sem --baseline. O plano é
+# todo em memória e precisa continuar bem mais barato que um exists() por arquivo.
+BUDGETS_US = {'plan': 15.0}
+
+WORDS = ('Amor', 'Noite', 'Canção', 'Blue', 'Night', 'Fire', 'Rio', 'São', 'Paulo', 'Björk', 'Live',
+         'Remix', 'Acústico', 'Sol', 'Mar', 'Dream', 'Rock', 'Samba', 'Jazz', 'Café')
+
+def parse_count(text):
+    # Aceita 10000, 10k ou 1M.
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+def parse_mix(text):
+    # "mp3=70,flac=20,jpg=10" -> ([".mp3", ".flac", ".jpg"], [70, 20, 10])
+    exts, weights = [], []
+    for item in text.split(','):
+        ext, _, weight = item.partition('=')
+        exts.append('.' + ext.strip().lstrip('.'))
+        weights.append(float(weight) if weight else 1.0)
+    return exts, weights
+
+def default_root():
+    # tmpfs quando existir, para medir o código e não o disco.
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Cria a árvore sintética: `depth` níveis de `fanout` subpastas, com os
+# arquivos sorteados entre as pastas do último nível (como álbuns).
+def generate_library(folder, files, depth=2, fanout=8, mix=(('.mp3',), (1.0,)), file_size=0, seed=0):
+    rng = random.Random(seed)
+    leaves = ['']
+    for level in range(depth):
+        leaves = [os.path.join(parent, f"{rng.choice(WORDS)} {level}-{i:02}")
+                  for parent in leaves for i in range(fanout)]
+    for leaf in leaves:
+        os.makedirs(os.path.join(folder, leaf), exist_ok=True)
+    exts, weights = mix
+    content = b'\0' * file_size
+    for n, ext in enumerate(rng.choices(exts, weights, k=files)):
+        name = f"{rng.choice(WORDS)} - {rng.choice(WORDS)} {rng.choice(WORDS)} {n:07}{ext}"
+        with open(os.path.join(folder, rng.choice(leaves), name), 'wb') as f:
+            f.write(content)
+    # Pastas recém-modificadas são sempre listadas de novo (ScanIndex.MTIME_GRACE_NS):
+    # a biblioteca "envelhece" uma hora para que o escaneamento com índice seja medido.
+    old = time.time() - 3600
+    for root, _, _ in os.walk(folder, topdown=False):
+        os.utime(root, (old, old))
+    return len(leaves)
+
+# Reproduz o que a interface faz com os lotes do ScanWorker (on_scan_batch) e
+# no fim do escaneamento (on_scan_finished), na própria thread do worker.
+class _ScanListener:
+    def __init__(self, extensions):
+        self.extensions = frozenset(extensions)
+        self.table = FileTable()
+        self.rows = 0
+        self.files = None
+        self.search_index = None
+
+    def on_scan_batch(self, worker, batch):
+        table = self.table
+        wanted = table.ext_matcher(self.extensions)
+        ext_ids = table.ext_ids
+        self.rows += sum(1 for i in table.extend(batch) if ext_ids[i] in wanted)
+
+    def on_scan_finished(self, worker):
+        self.table.sort()
+        self.files = self.table.select(self.extensions)
+        self.search_index = SearchIndex(self.table)
+
+    def on_scan_error(self, worker, error):
+        raise error
+
+class _RenameListener:
+    def __init__(self):
+        self.success = False
+        self.message = ""
+
+    def on_rename_finished(self, success, message):
+        self.success = success
+        self.message = message
+
+def scan(folder, include_subfolders):
+    listener = _ScanListener(DEFAULT_EXTENSIONS)
+    worker = ScanWorker(folder, include_subfolders, listener)
+    worker.run()
+    return listener
+
+def timed(function, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+def summarize(samples, **extra):
+    return {'median': statistics.median(samples), 'best': min(samples), 'samples': samples, **extra}
+
+def run_benchmarks(folder, cache_dir, include_subfolders, repeat, seed, log):
+    results = {}
+
+    def record(name, samples, **extra):
+        results[name] = summarize(samples, **extra)
+        log(f"{name:<24} {results[name]['median'] * 1000:10.1f} ms")
+
+    def cold_scan():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return scan(folder, include_subfolders)
+
+    samples, listener = timed(cold_scan, repeat)
+    files = listener.files
+    record('scan_cold', samples, files=len(files))
+    samples, _ = timed(lambda: scan(folder, include_subfolders), repeat)
+    record('scan_warm', samples)
+
+    samples, _ = timed(lambda: SearchIndex(listener.table), repeat)
+    record('search_index', samples)
+    # Busca como digitada: cada tecla refina o termo anterior. Cada rodada
+    # começa com um índice novo, sem os resultados em cache.
+    samples = []
+    for _ in range(repeat):
+        search_index = SearchIndex(listener.table)
+        start = time.perf_counter()
+        for term in ('s', 'sa', 'sam', 'samb', 'samba', 'samba 00'):
+            search_index.filter(files, term)
+        samples.append(time.perf_counter() - start)
+    record('search_typing', samples)
+
+    for mode in SHUFFLE_MODES:
+        samples, _ = timed(lambda: shuffle_view(files, mode, seed), repeat)
+        record(f'shuffle_{mode}', samples)
+
+    # A pré-visualização é recalculada a cada tecla no campo de formato.
+    def preview():
+        for _ in range(100):
+            pattern = RenamePattern("{index} - {name}", sanitize=NAME_SANITIZER)
+            next(pattern.names(files[:1], total=len(files)))
+    samples, _ = timed(preview, repeat)
+    record('preview_x100', samples)
+
+    def worker(view, pattern):
+        return RenameWorker(view, folder, pattern, False, _RenameListener(), sanitize_names=True, max_workers=4)
+
+    samples, plan = timed(lambda: worker(files, "{index} - {name}").build_plan(), repeat)
+    record('plan', samples, operations=len(plan))
+
+    # Cada rodada renomeia a árvore inteira para uma ordem nova; o
+    # reescaneamento entre as rodadas não entra na medida.
+    samples = []
+    for round_number in range(repeat):
+        view, _ = shuffle_view(load_files(folder, include_subfolders), 'random', seed + round_number)
+        rename = worker(view, "{index} {parent}")
+        start = time.perf_counter()
+        rename.run()
+        samples.append(time.perf_counter() - start)
+        if not rename.listener.success:
+            raise RuntimeError(rename.listener.message)
+    record('rename', samples)
+    return results
+
+def check_budgets(results, log):
+    # Retorna as etapas que passaram do limite por arquivo (BUDGETS_US).
+    over = []
+    for name, budget in BUDGETS_US.items():
+        result = results.get(name)
+        if not result or not result.get('operations'):
+            continue
+        per_file = result['median'] / result['operations'] * 1e6
+        flag = "  << acima do limite" if per_file > budget else ""
+        log(f"{name:<24} {per_file:10.2f} µs/arquivo (limite {budget:.1f}){flag}")
+        if flag:
+            over.append(name)
+    return over
+
+def compare(results, baseline, tolerance, log):
+    # Retorna as etapas cuja mediana piorou mais que a tolerância.
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current['median'] / previous['median'] if previous['median'] else 1.0
+        flag = "  << mais lento" if ratio > 1 + tolerance else ""
+        log(f"{name:<24} {previous['median'] * 1000:10.1f} -> {current['median'] * 1000:10.1f} ms"
+            f"  ({ratio:.2f}x){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='shuffletune_bench', description="Benchmarks do ShuffleTune.")
+    parser.add_argument('--files', default='10k', help="arquivos na biblioteca sintética (ex.: 10k, 1M)")
+    parser.add_argument('--depth', type=int, default=2, help="níveis de subpastas (0: tudo na raiz)")
+    parser.add_argument('--fanout', type=int, default=8, help="subpastas em cada nível")
+    parser.add_argument('--mix', default='mp3=70,flac=15,m4a=10,jpg=5', help="extensões e pesos")
+    parser.add_argument('--file-size', type=int, default=0, help="bytes em cada arquivo")
+    parser.add_argument('--root', default=default_root(), help="onde criar a biblioteca (padrão: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="rodadas de cada medida")
+    parser.add_argument('--seed', type=int, default=0, help="semente da biblioteca e dos embaralhamentos")
+    parser.add_argument('-o', '--output', default='-', help="arquivo JSON com os resultados ('-': saída padrão)")
+    parser.add_argument('--baseline', help="resultado anterior para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="piora aceita na mediana antes de falhar (padrão: %(default)s)")
+    parser.add_argument('--keep', action='store_true', help="não apagar a biblioteca no final")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log = lambda text: print(text, file=sys.stderr)
+    files = parse_count(args.files)
+    work = tempfile.mkdtemp(prefix='shuffletune-bench-', dir=args.root)
+    folder = os.path.join(work, 'library')
+    cache_dir = os.path.join(work, 'cache')
+    # Os índices e caches do benchmark não se misturam com os do usuário.
+    os.environ['XDG_CACHE_HOME'] = os.environ['LOCALAPPDATA'] = cache_dir
+    try:
+        log(f"Gerando {files} arquivos em {folder}...")
+        start = time.perf_counter()
+        folders = generate_library(folder, files, args.depth, args.fanout, parse_mix(args.mix),
+                                   args.file_size, args.seed)
+        log(f"{'generate':<24} {(time.perf_counter() - start) * 1000:10.1f} ms")
+        results = run_benchmarks(folder, cache_dir, args.depth > 0, args.repeat, args.seed, log)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        'version': RESULT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'files': files, 'folders': folders, 'depth': args.depth, 'fanout': args.fanout,
+                   'mix': args.mix, 'file_size': args.file_size, 'repeat': args.repeat,
+                   'seed': args.seed, 'root': args.root},
+        'results': results,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    over = check_budgets(results, log)
+    if over:
+        log(f"Etapas acima do limite: {', '.join(over)}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params', {}).get('files') != files:
+            log("Aviso: o resultado anterior foi medido com outro número de arquivos.")
+        regressions = compare(results, baseline.get('results', {}), args.tolerance, log)
+        if regressions:
+            log(f"Etapas mais lentas: {', '.join(regressions)}")
+            return 1
+    return 1 if over else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+# Linha de comando do ShuffleTune: escaneia, embaralha e renomeia sem abrir a
+# interface gráfica (e sem importar o Kivy), para uso em scripts e no cron.
+#
+#   python shuffletune_cli.py ~/Musicas -r --shuffle spread --seed 42
+#   python ShuffleTune.py ~/Musicas --undo
+#   python shuffletune_cli.py ~/Musicas -r --shuffle random --playlist ~/Musicas/aleatorio.m3u8
+import argparse
+import os
+import sys
+
+from shuffletune_core import (
+    DEFAULT_EXTENSIONS, LINK_MODES, NAME_SANITIZER, PLAN_FORMATS, PLAYLIST_FORMATS, SHUFFLE_MODES, JournalWorker,
+    NameSanitizer, PlaylistWorker, ProgressCounter, RenameJournal, RenamePattern, RenameWorker, check_plan,
+    format_duration, load_files, plan_format, read_plan, same_folder, shuffle_view,
+)
+from shuffletune_metrics import PROFILE_MODES, RunMetrics
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='shuffletune',
+        description="Renomeia em lote (e opcionalmente embaralha) os arquivos de uma pasta.")
+    parser.add_argument('folder', help="pasta de origem")
+    parser.add_argument('-o', '--output', help="pasta de destino (padrão: a própria pasta de origem)")
+    parser.add_argument('-r', '--subfolders', action='store_true', help="incluir subpastas")
+    parser.add_argument('-e', '--extensions', default=", ".join(ext[1:] for ext in DEFAULT_EXTENSIONS),
+                        help="extensões separadas por vírgula (padrão: %(default)s)")
+    parser.add_argument('-p', '--pattern',
+                        help="formato com campos como {index}, {index:04}, {name}, {parent}, {ext}, "
+                             "{mtime:%%Y}, {size}, {folder_index}, {artist}; sem ele, usa o prefixo '001 - nome'")
+    parser.add_argument('--shuffle', choices=list(SHUFFLE_MODES), help="embaralhar antes de renomear")
+    parser.add_argument('--seed', help="semente do embaralhamento, para reproduzi-lo")
+    parser.add_argument('--sanitize', action='store_true',
+                        help="remover caracteres inválidos e nomes reservados do Windows, normalizar (NFC) "
+                             "e limitar o tamanho dos nomes")
+    parser.add_argument('--ascii', action='store_true', help="transliterar os nomes para ASCII (implica --sanitize)")
+    parser.add_argument('--max-length', type=int, default=NAME_SANITIZER.max_length,
+                        help="tamanho máximo dos nomes limpos, sem a extensão (padrão: %(default)s; 0 para sem limite)")
+    parser.add_argument('--copy', action='store_true', help="copiar para o destino mantendo os originais")
+    parser.add_argument('--link', choices=LINK_MODES,
+                        help="criar no destino links numerados para os originais, sem mover nem copiar nada "
+                             "(exige --output com outra pasta)")
+    parser.add_argument('--no-preserve-metadata', dest='preserve_metadata', action='store_false',
+                        help="não preservar data e permissões ao copiar")
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help="deixar de fora arquivos com conteúdo idêntico a outro (fica o primeiro)")
+    parser.add_argument('-j', '--threads', type=int, default=4, help="pastas processadas em paralelo")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--resume', action='store_true', help="retomar a última operação interrompida")
+    action.add_argument('--undo', action='store_true', help="desfazer a última operação na pasta")
+    action.add_argument('--find-duplicates', action='store_true',
+                        help="só listar os grupos de arquivos com conteúdo idêntico")
+    action.add_argument('--dry-run', metavar='PLANO',
+                        help="só gravar o plano (origem -> destino) neste arquivo, sem renomear; '-' para a saída padrão")
+    action.add_argument('--apply', metavar='PLANO',
+                        help="executar um plano gravado com --dry-run (pode ter sido editado; "
+                             "os destinos devem ficar na pasta de destino, -o)")
+    action.add_argument('--playlist', metavar='ARQUIVO',
+                        help="só gravar a ordem (embaralhada ou não) numa playlist M3U, M3U8 ou JSON, sem renomear")
+    parser.add_argument('--plan-format', choices=PLAN_FORMATS,
+                        help="formato do plano (padrão: pela extensão do arquivo; csv para '-')")
+    parser.add_argument('--playlist-format', choices=PLAYLIST_FORMATS,
+                        help="formato da playlist (padrão: pela extensão do arquivo)")
+    parser.add_argument('--absolute', action='store_true',
+                        help="caminhos absolutos na playlist (padrão: relativos à pasta da playlist)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="não mostrar o progresso")
+    parser.add_argument('--report', metavar='ARQUIVO',
+                        help="gravar um relatório JSON com o tempo de cada etapa, contadores e latências")
+    parser.add_argument('--prometheus', metavar='ARQUIVO',
+                        help="gravar as mesmas medidas no formato de texto do Prometheus")
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="incluir no relatório um perfil de CPU (cProfile) ou de memória (tracemalloc)")
+    parser.add_argument('--profile-output', metavar='ARQUIVO',
+                        help="com --profile cpu, gravar também as estatísticas completas do pstats")
+    return parser
+
+def parse_extensions(text):
+    exts = [f".{ext.strip().lower().lstrip('.')}" for ext in text.split(',') if ext.strip()]
+    return frozenset(exts if exts else ['.mp3'])
+
+def build_sanitizer(args):
+    if not (args.sanitize or args.ascii):
+        return None
+    return NameSanitizer(max_length=args.max_length or None, ascii_only=args.ascii)
+
+def parse_seed(text):
+    if text is None:
+        return None
+    return int(text) if text.isdigit() else text
+
+# Recebe o resultado dos workers (na thread do worker).
+class _Listener:
+    def __init__(self):
+        self.success = False
+        self.message = ""
+
+    def on_rename_finished(self, success, message):
+        self.success = success
+        self.message = message
+
+def run_worker(worker, listener, progress, quiet=False):
+    show_progress = not quiet and sys.stderr.isatty()
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.5)
+            if show_progress:
+                snap = progress.snapshot()
+                sys.stderr.write(f"\r{snap['current']}/{snap['total']}  {snap['files_per_s']:.0f} arq/s"
+                                 f"  ETA {format_duration(snap['eta'])}\033[K")
+                sys.stderr.flush()
+    except KeyboardInterrupt:
+        worker.stop()
+        worker.join()
+    if show_progress:
+        sys.stderr.write("\n")
+    print(listener.message)
+    return 0 if listener.success else 1
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    folder = os.path.abspath(args.folder)
+    if not os.path.isdir(folder):
+        print(f"Erro: pasta não encontrada: {folder}", file=sys.stderr)
+        return 2
+    listener = _Listener()
+    progress = ProgressCounter()
+
+    if args.resume or args.undo:
+        if not RenameJournal.exists(folder):
+            print("Erro: nenhuma operação registrada nesta pasta.", file=sys.stderr)
+            return 1
+        worker = JournalWorker(folder, listener, undo=args.undo,
+                               preserve_metadata=args.preserve_metadata, progress=progress)
+        return run_worker(worker, listener, progress, args.quiet)
+
+    metrics = RunMetrics('apply' if args.apply else 'dry-run' if args.dry_run else
+                         'playlist' if args.playlist else 'rename',
+                         profile=args.profile, profile_path=args.profile_output)
+    try:
+        if args.apply:
+            return apply_plan(args, folder, listener, progress, metrics)
+        return rename(args, folder, listener, progress, metrics)
+    finally:
+        write_reports(args, metrics)
+
+def write_reports(args, metrics):
+    try:
+        if args.report:
+            metrics.write_json(args.report)
+        if args.prometheus:
+            metrics.write_prometheus(args.prometheus)
+    except OSError as e:
+        print(f"Erro ao gravar o relatório: {e}", file=sys.stderr)
+
+def rename(args, folder, listener, progress, metrics):
+    pattern = None
+    if args.pattern is not None:
+        try:
+            pattern = RenamePattern(args.pattern)
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 2
+        if not pattern.is_unique:
+            print("Erro: o formato deve conter {index}, {folder_index} ou {name}.", file=sys.stderr)
+            return 2
+    if args.link and not (args.find_duplicates or args.playlist) and (
+            not args.output or same_folder(args.output, folder)):
+        print("Erro: com --link, use --output com uma pasta diferente da de origem.", file=sys.stderr)
+        return 2
+    if RenameJournal.is_incomplete(folder) and not (args.dry_run or args.find_duplicates or args.playlist):
+        print("Erro: a última operação nesta pasta não terminou; use --resume ou --undo.", file=sys.stderr)
+        return 1
+
+    try:
+        files = load_files(folder, args.subfolders, parse_extensions(args.extensions), metrics)
+    except OSError as e:
+        print(f"Erro: não foi possível acessar a pasta: {e}", file=sys.stderr)
+        return 1
+    if not files:
+        print("Nenhum arquivo encontrado.")
+        return 0
+    if args.find_duplicates:
+        return find_duplicates(files, folder)
+
+    # Tags só são lidas quando o formato ou o embaralhamento usam (e ficam em
+    # cache). Os módulos de tags e de duplicatas só são importados quando
+    # usados, para manter rápido o início da CLI.
+    tags = None
+    if args.shuffle == 'artist' or (pattern is not None and pattern.uses_tags):
+        from shuffletune_tags import TagStore
+        tags = files.table.tags = TagStore(folder)
+        if not args.quiet:
+            print("Lendo tags...", file=sys.stderr)
+        tags.load(files)
+
+    shuffle = None
+    if args.shuffle:
+        files, seed = shuffle_view(files, args.shuffle, parse_seed(args.seed))
+        shuffle = {'mode': args.shuffle, 'seed': seed}
+        print(f"Modo: {args.shuffle}, semente: {seed}", file=sys.stderr)
+
+    duplicates = None
+    if args.skip_duplicates:
+        from shuffletune_duplicates import DuplicateFinder
+        duplicates = DuplicateFinder(folder)
+
+    if args.playlist:
+        worker = PlaylistWorker(files, folder, args.playlist, listener, fmt=args.playlist_format,
+                                relative=not args.absolute,
+                                duplicates=duplicates,
+                                metrics=metrics)
+        return run_worker(worker, listener, progress, args.quiet)
+
+    worker = RenameWorker(
+        files, folder, args.pattern or "", args.pattern is None, listener,
+        output_folder=os.path.abspath(args.output) if args.output else None,
+        sanitize_names=build_sanitizer(args),
+        max_workers=args.threads,
+        keep_originals=args.copy,
+        link=args.link,
+        preserve_metadata=args.preserve_metadata,
+        progress=progress,
+        shuffle=shuffle,
+        tags=tags,
+        duplicates=duplicates,
+        metrics=metrics)
+    if args.dry_run:
+        return export_plan(worker, args.dry_run, args.plan_format)
+    return run_worker(worker, listener, progress, args.quiet)
+
+def find_duplicates(files, folder):
+    from shuffletune_duplicates import DuplicateFinder
+    groups = DuplicateFinder(folder).find(files)
+    for group in groups:
+        for position in group:
+            print(os.path.join(folder, files[position].rel_path))
+        print()
+    extra = sum(len(group) - 1 for group in groups)
+    print(f"{len(groups)} grupos de duplicatas, {extra} arquivos a mais", file=sys.stderr)
+    return 0
+
+def export_plan(worker, path, fmt=None):
+    if path == '-':
+        count = worker.export_plan(sys.stdout, fmt or 'csv')
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            count = worker.export_plan(f, fmt or plan_format(path))
+    print(f"Plano com {count} operações gravado em {path}", file=sys.stderr)
+    return 0
+
+def apply_plan(args, folder, listener, progress, metrics):
+    if RenameJournal.is_incomplete(folder):
+        print("Erro: a última operação nesta pasta não terminou; use --resume ou --undo.", file=sys.stderr)
+        return 1
+    try:
+        with open(args.apply, encoding='utf-8', newline='') as f:
+            ops = list(read_plan(f, args.plan_format or plan_format(args.apply)))
+        check_plan(ops, release_sources=not (args.copy or args.link),
+                   output_folder=os.path.abspath(args.output) if args.output else folder)
+        if args.link and any(not op.is_noop and same_folder(os.path.dirname(op.src), os.path.dirname(op.dst))
+                             for op in ops):
+            raise ValueError("com --link, os destinos devem ficar fora das pastas de origem")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Erro no plano: {e}", file=sys.stderr)
+        return 1
+    worker = RenameWorker(
+        None, folder, "", False, listener,
+        keep_originals=args.copy,
+        link=args.link,
+        preserve_metadata=args.preserve_metadata,
+        max_workers=args.threads,
+        progress=progress,
+        plan=ops,
+        metrics=metrics)
+    return run_worker(worker, listener, progress, args.quiet)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1995 @@
+# Núcleo do ShuffleTune: escaneamento, embaralhamento, planejamento e execução
+# das renomeações, sem nenhuma dependência do Kivy. É usado pela interface
+# gráfica (ShuffleTune.py), pela linha de comando (shuffletune_cli.py) e pode
+# ser importado diretamente por outros scripts.
+import bisect
+import csv
+import errno
+import hashlib
+import json
+import math
+import marshal
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing, nullcontext
+from itertools import islice
+
+from shuffletune_metrics import RunMetrics
+
+DEFAULT_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+
+# Registro compacto de um arquivo encontrado no escaneamento. Guarda os
+# metadados que o os.scandir já obteve (tamanho, data de modificação e inode)
+# para que a renomeação e a pré-visualização não precisem de novos stat().
+class FileRecord:
+    __slots__ = ('rel_dir', 'stem', 'ext', 'size', 'mtime', 'inode')
+
+    def __init__(self, rel_dir, stem, ext, size=0, mtime=0.0, inode=0):
+        self.rel_dir = rel_dir
+        self.stem = stem
+        self.ext = ext
+        self.size = size
+        self.mtime = mtime
+        self.inode = inode
+
+    @property
+    def file_name(self):
+        return self.stem + self.ext
+
+    @property
+    def rel_path(self):
+        return os.path.join(self.rel_dir, self.file_name) if self.rel_dir else self.file_name
+
+    def __repr__(self):
+        return f"FileRecord({self.rel_path!r}, size={self.size})"
+
+# Motor de escaneamento baseado em os.scandir. Reaproveita o tipo de cada
+# DirEntry (sem os.path.isfile) e gera uma lista de FileRecord por pasta.
+# Erros de acesso em subpastas são ignorados, como no os.walk.
+# Com extensions=None todos os arquivos são incluídos.
+def scan_folder(folder, include_subfolders, extensions=None, is_running=lambda: True, metrics=None):
+    pending = [('', folder)]
+    while pending and is_running():
+        rel_dir, path = pending.pop()
+        records = []
+        start = time.perf_counter()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if include_subfolders:
+                            pending.append((os.path.join(rel_dir, entry.name) if rel_dir else entry.name, entry.path))
+                        continue
+                    stem, ext = os.path.splitext(entry.name)
+                    if (extensions is not None and ext.lower() not in extensions) or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    records.append(FileRecord(rel_dir, stem, ext, st.st_size, st.st_mtime, entry.inode()))
+        except OSError:
+            if not rel_dir:
+                raise
+            continue
+        if metrics is not None:
+            metrics.observe('scandir', time.perf_counter() - start)
+            metrics.count('syscall.scandir')
+            metrics.count('syscall.stat', len(records))
+        yield records
+
+# Pasta de cache do usuário, onde ficam os índices de escaneamento.
+def get_cache_dir():
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'shuffletune')
+
+# Índice persistente (SQLite) de uma pasta de origem. Cada pasta guarda seu
+# mtime, suas subpastas e todos os seus arquivos, de modo que um novo
+# escaneamento só lista novamente as pastas cujo mtime mudou. Editar um arquivo
+# no lugar não muda a pasta: com verify_files=True, os arquivos das demais
+# pastas também recebem um stat (quem precisa de dados frescos, como as tags e
+# as duplicatas, já confere por conta própria). O índice guarda
+# arquivos de qualquer extensão, então trocar as extensões ou a opção de
+# subpastas não exige percorrer o disco de novo.
+class ScanIndex:
+    SCHEMA_VERSION = 1
+    # Índices guardados na pasta de cache (um por pasta de origem); ao salvar,
+    # os usados há mais tempo além desse número são apagados.
+    MAX_INDEXES = 20
+    # Pastas modificadas há menos tempo que isso não têm o mtime confiável
+    # (resolução do sistema de arquivos) e são listadas de novo na próxima vez.
+    MTIME_GRACE_NS = 2_000_000_000
+
+    def __init__(self, folder, db_path=None):
+        self.folder = os.path.abspath(folder)
+        if db_path is None:
+            key = hashlib.sha1(self.folder.encode('utf-8', 'surrogateescape')).hexdigest()[:20]
+            db_path = os.path.join(get_cache_dir(), f"scan-{key}.sqlite")
+        self.db_path = db_path
+        self._dirs = None
+        self._dirty = {}
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        if conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS dirs")
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        conn.execute("CREATE TABLE IF NOT EXISTS dirs ("
+                     "rel TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, "
+                     "subdirs BLOB NOT NULL, files BLOB NOT NULL)")
+        return conn
+
+    def load(self):
+        # Sem índice ainda: o arquivo só é criado quando um escaneamento é salvo.
+        if not os.path.exists(self.db_path):
+            self._dirs = {}
+            self._dirty = {}
+            return
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT rel, mtime_ns, subdirs, files FROM dirs").fetchall()
+        try:
+            self._dirs = {rel: (mtime_ns, marshal.loads(subdirs), marshal.loads(files))
+                          for rel, mtime_ns, subdirs, files in rows}
+        except (ValueError, EOFError, TypeError):
+            # Índice corrompido: recomeça do zero.
+            self._dirs = {}
+        self._dirty = {}
+
+    @staticmethod
+    def _list_dir(path):
+        subdirs = []
+        files = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.name, st.st_size, st.st_mtime, entry.inode()))
+                except OSError:
+                    continue
+        return subdirs, files
+
+    @staticmethod
+    def _refresh_files(path, files, extensions):
+        # O mtime da pasta só muda quando entram ou saem nomes: um arquivo
+        # editado no lugar precisa de um stat próprio (só os das extensões pedidas).
+        refreshed = []
+        changed = False
+        stats = 0
+        for item in files:
+            name = item[0]
+            if extensions is None or os.path.splitext(name)[1].lower() in extensions:
+                st = os.stat(os.path.join(path, name))
+                stats += 1
+                if (st.st_size, st.st_mtime) != item[1:3]:
+                    item = (name, st.st_size, st.st_mtime, item[3])
+                    changed = True
+            refreshed.append(item)
+        return refreshed, changed, stats
+
+    def scan(self, include_subfolders, extensions=None, is_running=lambda: True, metrics=None,
+             verify_files=False):
+        if self._dirs is None:
+            self.load()
+        stale_after = time.time_ns() - self.MTIME_GRACE_NS
+        pending = ['']
+        while pending and is_running():
+            rel_dir = pending.pop()
+            path = os.path.join(self.folder, rel_dir) if rel_dir else self.folder
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+                cached = self._dirs.get(rel_dir)
+                refreshed = None
+                if cached is not None and cached[0] == mtime_ns:
+                    if not verify_files:
+                        refreshed, changed, stats = cached[2], False, 0
+                    else:
+                        try:
+                            refreshed, changed, stats = self._refresh_files(path, cached[2], extensions)
+                        except OSError:
+                            # Algum arquivo sumiu sem mudar o mtime da pasta: lista de novo.
+                            pass
+                if refreshed is not None:
+                    subdirs, files = cached[1], refreshed
+                    if changed:
+                        self._dirs[rel_dir] = self._dirty[rel_dir] = (mtime_ns, subdirs, files)
+                    if metrics is not None:
+                        metrics.count('syscall.stat', stats + 1)
+                        metrics.count('scan.dirs_cached')
+                else:
+                    start = time.perf_counter()
+                    subdirs, files = self._list_dir(path)
+                    if metrics is not None:
+                        metrics.observe('scandir', time.perf_counter() - start)
+                        metrics.count('syscall.stat', len(files) + 1)
+                        metrics.count('syscall.scandir')
+                        metrics.count('scan.dirs_listed')
+                    if mtime_ns >= stale_after:
+                        mtime_ns = -1
+                    self._dirs[rel_dir] = self._dirty[rel_dir] = (mtime_ns, subdirs, files)
+            except OSError:
+                if not rel_dir:
+                    raise
+                continue
+            if include_subfolders:
+                pending.extend(os.path.join(rel_dir, d) if rel_dir else d for d in subdirs)
+            records = []
+            for name, size, mtime, inode in files:
+                stem, ext = os.path.splitext(name)
+                if extensions is None or ext.lower() in extensions:
+                    records.append(FileRecord(rel_dir, stem, ext, size, mtime, inode))
+            yield records
+
+    def save(self):
+        if self._dirs is None:
+            return
+        # Remove pastas que não são mais alcançáveis a partir da raiz.
+        reachable = set()
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            cached = self._dirs.get(rel_dir)
+            if cached is None:
+                continue
+            reachable.add(rel_dir)
+            pending.extend(os.path.join(rel_dir, d) if rel_dir else d for d in cached[1])
+        removed = [rel_dir for rel_dir in self._dirs if rel_dir not in reachable]
+        if not self._dirty and not removed:
+            self._prune()
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("DELETE FROM dirs WHERE rel = ?", ((rel_dir,) for rel_dir in removed))
+            conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                             ((rel_dir, mtime_ns, marshal.dumps(subdirs), marshal.dumps(files))
+                              for rel_dir, (mtime_ns, subdirs, files) in self._dirty.items()
+                              if rel_dir in reachable))
+        for rel_dir in removed:
+            del self._dirs[rel_dir]
+        self._dirty = {}
+        self._prune()
+
+    def _prune(self):
+        # O mtime do arquivo marca o último uso do índice.
+        try:
+            os.utime(self.db_path)
+            with os.scandir(os.path.dirname(self.db_path)) as it:
+                indexes = [(entry.stat().st_mtime, entry.path) for entry in it
+                           if entry.name.startswith('scan-') and entry.name.endswith('.sqlite')]
+        except OSError:
+            return
+        indexes.sort(reverse=True)
+        for _, path in indexes[self.MAX_INDEXES:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# Tabela colunar com os arquivos escaneados. Em vez de um FileRecord por
+# arquivo, cada coluna é um array compacto; as pastas e as extensões são
+# guardadas uma única vez e referenciadas por número. Os FileRecord só são
+# criados quando alguém pede uma linha (renomeação, pré-visualização).
+# A tabela guarda todas as extensões: filtros, buscas e embaralhamentos são
+# apenas arrays de índices sobre ela (ver FileView).
+class FileTable:
+    def __init__(self):
+        self.dirs = []
+        self._dir_ids = {}
+        self.exts = []
+        self._ext_ids = {}
+        self.dir_ids = array('I')
+        self.stems = []
+        self.ext_ids = array('I')
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.inodes = array('Q')
+        self.order = None
+        # Tags dos arquivos (TagStore do shuffletune_tags), quando carregadas.
+        self.tags = None
+        # Linhas de arquivos que deixaram de existir (ver apply_changes). As
+        # linhas nunca são reaproveitadas, então as FileView continuam válidas.
+        self.removed = set()
+        self._dir_rows = None
+
+    def _intern(self, values, ids, value):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(values)
+            values.append(value)
+        return value_id
+
+    def extend(self, records):
+        # Retorna o intervalo de linhas adicionadas.
+        start = len(self.stems)
+        for record in records:
+            self.dir_ids.append(self._intern(self.dirs, self._dir_ids, record.rel_dir))
+            self.stems.append(record.stem)
+            self.ext_ids.append(self._intern(self.exts, self._ext_ids, record.ext))
+            self.sizes.append(record.size)
+            self.mtimes.append(record.mtime)
+            self.inodes.append(record.inode)
+        self.order = None
+        self._dir_rows = None
+        return range(start, len(self.stems))
+
+    def _rows_in_dir(self, dir_id):
+        # Linhas de cada pasta, montadas na primeira consulta. Podem conter
+        # linhas removidas ou movidas para outra pasta: quem consulta confere.
+        if self._dir_rows is None:
+            self._dir_rows = {}
+            for i, row_dir in enumerate(self.dir_ids):
+                rows = self._dir_rows.get(row_dir)
+                if rows is None:
+                    rows = self._dir_rows[row_dir] = array('I')
+                rows.append(i)
+        return self._dir_rows.get(dir_id, ())
+
+    def row_of(self, rel_path):
+        # Linha do arquivo com esse caminho relativo, ou None.
+        rel_dir, name = os.path.split(rel_path)
+        stem, ext = os.path.splitext(name)
+        dir_id = self._dir_ids.get(rel_dir)
+        ext_id = self._ext_ids.get(ext)
+        if dir_id is None or ext_id is None:
+            return None
+        stems, ext_ids, dir_ids, removed = self.stems, self.ext_ids, self.dir_ids, self.removed
+        for i in self._rows_in_dir(dir_id):
+            if stems[i] == stem and ext_ids[i] == ext_id and dir_ids[i] == dir_id and i not in removed:
+                return i
+        return None
+
+    def _append(self, record):
+        # Uma linha nova no fim, sem descartar a ordem nem as linhas por pasta.
+        order, dir_rows = self.order, self._dir_rows
+        row = self.extend((record,))[0]
+        self.order, self._dir_rows = order, dir_rows
+        if order is not None:
+            order.append(row)
+        if dir_rows is not None:
+            dir_rows.setdefault(self.dir_ids[row], array('I')).append(row)
+        return row
+
+    def _place(self, i, record):
+        dir_id = self._intern(self.dirs, self._dir_ids, record.rel_dir)
+        if self._dir_rows is not None and dir_id != self.dir_ids[i]:
+            self._dir_rows.setdefault(dir_id, array('I')).append(i)
+        self.dir_ids[i] = dir_id
+        self.stems[i] = record.stem
+        self.ext_ids[i] = self._intern(self.exts, self._ext_ids, record.ext)
+        self.sizes[i] = record.size
+        self.mtimes[i] = record.mtime
+        self.inodes[i] = record.inode
+
+    def apply_changes(self, changes):
+        # Aplica mudanças vindas do observador da pasta (shuffletune_watch) ou
+        # de um plano executado, sem escanear o disco. Cada mudança é uma tupla:
+        #   ('add', record)                 arquivo novo ou alterado
+        #   ('remove', rel_path)            arquivo apagado
+        #   ('move', old_rel_path, record)  arquivo renomeado ou movido
+        #   ('remove_dir', rel_dir)         pasta apagada (com tudo dentro)
+        # Em 'remove' e 'move', a origem também pode ser o número da linha.
+        # Retorna (linhas novas, linhas alteradas, linhas removidas).
+        added, changed, removed = [], set(), set()
+        for change in changes:
+            kind = change[0]
+            if kind == 'remove_dir':
+                prefix = os.path.join(change[1], '')
+                gone = {dir_id for dir_id, rel_dir in enumerate(self.dirs)
+                        if rel_dir == change[1] or rel_dir.startswith(prefix)}
+                removed.update(i for i, dir_id in enumerate(self.dir_ids)
+                               if dir_id in gone and i not in self.removed)
+                self.removed.update(removed)
+                continue
+            # A origem pode ser o caminho relativo ou já o número da linha.
+            source = change[1].rel_path if kind == 'add' else change[1]
+            row = source if isinstance(source, int) else self.row_of(source)
+            if kind == 'remove':
+                if row is not None:
+                    self.removed.add(row)
+                    removed.add(row)
+                continue
+            record = change[-1]
+            if row is None and kind == 'move' and not isinstance(source, int):
+                # A origem não estava na tabela: pode já ter o nome de destino.
+                row = self.row_of(record.rel_path)
+            if row is None:
+                added.append(self._append(record))
+            else:
+                self._place(row, record)
+                changed.add(row)
+        changed.difference_update(removed)
+        return added, changed, removed
+
+    def __len__(self):
+        return len(self.stems)
+
+    def __getitem__(self, i):
+        return FileRecord(self.dirs[self.dir_ids[i]], self.stems[i], self.exts[self.ext_ids[i]],
+                          self.sizes[i], self.mtimes[i], self.inodes[i])
+
+    def file_name(self, i):
+        return self.stems[i] + self.exts[self.ext_ids[i]]
+
+    def rel_path(self, i):
+        rel_dir = self.dirs[self.dir_ids[i]]
+        return os.path.join(rel_dir, self.file_name(i)) if rel_dir else self.file_name(i)
+
+    def ext_matcher(self, extensions):
+        # Conjunto dos ids de extensão aceitos (a comparação ignora maiúsculas).
+        return {ext_id for ext_id, ext in enumerate(self.exts) if ext.lower() in extensions}
+
+    def sort(self):
+        rows = range(len(self.stems))
+        if self.removed:
+            rows = [i for i in rows if i not in self.removed]
+        self.order = array('I', sorted(rows, key=self.rel_path))
+
+    def select(self, extensions):
+        # Linhas com as extensões pedidas, na ordem dos caminhos (após sort()).
+        wanted = self.ext_matcher(extensions)
+        ext_ids = self.ext_ids
+        rows = self.order if self.order is not None else range(len(self.stems))
+        if self.removed:
+            removed = self.removed
+            return FileView(self, array('I', (i for i in rows if ext_ids[i] in wanted and i not in removed)))
+        return FileView(self, array('I', (i for i in rows if ext_ids[i] in wanted)))
+
+# Visão ordenada de parte de uma FileTable: só um array de índices. Filtrar,
+# buscar ou embaralhar cria ou altera esse array, sem copiar strings.
+class FileView:
+    def __init__(self, table=None, indices=None):
+        self.table = table
+        self.indices = indices if indices is not None else array('I')
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return FileView(self.table, self.indices[position])
+        return self.table[self.indices[position]]
+
+    def __iter__(self):
+        table = self.table
+        for i in self.indices:
+            yield table[i]
+
+    def file_name(self, position):
+        return self.table.file_name(self.indices[position])
+
+    def extend(self, rows):
+        self.indices.extend(rows)
+
+    def copy(self):
+        return FileView(self.table, array('I', self.indices))
+
+    def discard(self, rows):
+        # Tira da visão (no próprio array) as linhas do conjunto `rows`.
+        if rows:
+            self.indices[:] = array('I', (i for i in self.indices if i not in rows))
+
+    def where(self, predicate):
+        # Nova visão com as linhas (índices da tabela) aceitas pelo predicado.
+        return FileView(self.table, array('I', filter(predicate, self.indices)))
+
+# Estratégias de embaralhamento. Cada uma recebe o array de índices (da
+# tabela) a embaralhar, a FileTable e um random.Random já semeado, e devolve um
+# novo array com a ordem. Para adicionar um modo, basta registrá-lo em
+# SHUFFLE_MODES. O trabalho por arquivo é uma passada simples; a ordenação
+# final fica com o sorted() em C, então todas são O(n log n) no pior caso.
+def shuffle_random(indices, table, rng):
+    order = array('I', indices)
+    rng.shuffle(order)
+    return order
+
+# Espalha as pastas (álbuns/artistas): os arquivos de cada pasta são
+# distribuídos em intervalos regulares ao longo da lista, com um deslocamento
+# e uma variação aleatórios, e por fim os vizinhos da mesma pasta que ainda
+# restarem são separados sempre que possível.
+def shuffle_spread(indices, table, rng):
+    return _spread(indices, table.dir_ids, rng)
+
+# Como shuffle_spread, mas agrupando pelo artista das tags (os arquivos sem
+# artista conhecido ficam agrupados pela pasta).
+def shuffle_spread_artists(indices, table, rng):
+    tags = table.tags
+    dir_ids = table.dir_ids
+    group_ids = {}
+    keys = {}
+    for i in indices:
+        values = tags.get_path(table.rel_path(i)) if tags is not None else None
+        artist = values.get('artist') if values else None
+        key = artist.casefold() if artist else dir_ids[i]
+        group_ids[i] = keys.setdefault(key, len(keys))
+    return _spread(indices, group_ids, rng)
+
+def _spread(indices, group_ids, rng):
+    # group_ids[i] é o grupo da linha i da tabela.
+    n = len(indices)
+    groups = {}
+    for i in indices:
+        group = groups.get(group_ids[i])
+        if group is None:
+            groups[group_ids[i]] = group = []
+        group.append(i)
+    items = []
+    keys = []
+    for group in groups.values():
+        rng.shuffle(group)
+        step = n / len(group)
+        start = rng.random() * step
+        keys.extend(start + (j + rng.uniform(-0.2, 0.2)) * step for j in range(len(group)))
+        items.extend(group)
+    order = array('I', [items[k] for k in sorted(range(n), key=keys.__getitem__)])
+    _separate_neighbours(order, group_ids)
+    return order
+
+def _separate_neighbours(order, group_ids, window=64):
+    # Troca cada arquivo que repete o grupo (pasta ou artista) do anterior por
+    # um dos próximos que não crie uma nova repetição. Impossível quando um
+    # grupo tem mais da metade dos arquivos; nesse caso as repetições ficam.
+    n = len(order)
+    for i in range(1, n):
+        group = group_ids[order[i]]
+        previous = group_ids[order[i - 1]]
+        if group != previous:
+            continue
+        for j in range(i + 1, min(n, i + window)):
+            if group_ids[order[j]] == previous:
+                continue
+            if j - 1 != i and group_ids[order[j - 1]] == group:
+                continue
+            if j + 1 < n and group_ids[order[j + 1]] == group:
+                continue
+            order[i], order[j] = order[j], order[i]
+            break
+
+# Embaralhamento ponderado (Efraimidis-Spirakis): cada arquivo recebe a chave
+# log(u) / peso e a ordem é a das chaves, da maior para a menor. Sem pesos
+# explícitos, cada pasta recebe o mesmo peso total, para que álbuns grandes
+# não dominem o começo da lista.
+def shuffle_weighted(indices, table, rng, weight=None):
+    if weight is None:
+        dir_ids = table.dir_ids
+        counts = {}
+        for i in indices:
+            counts[dir_ids[i]] = counts.get(dir_ids[i], 0) + 1
+        weight = lambda i: 1.0 / counts[dir_ids[i]]
+    log = math.log
+    keys = [log(1.0 - rng.random()) / weight(i) for i in indices]
+    return array('I', [indices[k] for k in sorted(range(len(keys)), key=keys.__getitem__, reverse=True)])
+
+SHUFFLE_MODES = {
+    'random': shuffle_random,
+    'spread': shuffle_spread,
+    'weighted': shuffle_weighted,
+    'artist': shuffle_spread_artists,
+}
+
+def new_shuffle_seed():
+    return int.from_bytes(os.urandom(4), 'big')
+
+# Embaralha uma FileView com o modo e a semente dados. A mesma semente, o
+# mesmo modo e a mesma lista de entrada reproduzem sempre a mesma ordem.
+def shuffle_view(view, mode='random', seed=None):
+    if seed is None:
+        seed = new_shuffle_seed()
+    order = SHUFFLE_MODES[mode](view.indices, view.table, random.Random(seed))
+    return FileView(view.table, order), seed
+
+# Índice de busca por nome, construído uma vez por escaneamento sobre todas as
+# linhas da FileTable, então trocar as extensões ou embaralhar não exige
+# reconstruí-lo. Os nomes em
+# minúsculas ficam concatenados em um único texto (separados por '\0', que não
+# pode aparecer em nomes de arquivo), então cada busca é um str.find em C sobre
+# esse texto, sem alocar uma string por arquivo. Os resultados recentes ficam
+# em cache: quando o termo novo contém um termo já buscado (o usuário continua
+# digitando), a busca só refina o resultado anterior.
+# Linhas alteradas depois da construção (update) ficam numa lista à parte,
+# conferida nome a nome, até serem tantas que compense refazer o texto.
+# Forma usada na busca: acentos compostos (NFC), como o texto digitado, e
+# casefold, que também iguala 'ß' a 'ss'.
+def search_key(text):
+    if not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    return text.casefold()
+
+class SearchIndex:
+    CACHE_SIZE = 16
+
+    def __init__(self, table):
+        self.table = table
+        removed = table.removed
+        self._names = [search_key(table.file_name(i)) if i not in removed else ''
+                       for i in range(len(table))]
+        self._build_corpus()
+        self._cache = {}
+
+    def _build_corpus(self):
+        self._corpus = '\0'.join(self._names)
+        self._offsets = array('Q')
+        offset = 0
+        for name in self._names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+        self._offsets.append(offset)
+        self._stale = set()
+
+    def update(self, rows):
+        # Linhas novas, renomeadas ou removidas da tabela.
+        table = self.table
+        names = self._names
+        removed = table.removed
+        for i in rows:
+            name = search_key(table.file_name(i)) if i not in removed else ''
+            if i < len(names):
+                names[i] = name
+            else:
+                names.extend([''] * (i - len(names)))
+                names.append(name)
+            self._stale.add(i)
+        self._cache.clear()
+        if len(self._stale) > max(4096, len(names) // 20):
+            self._build_corpus()
+
+    def _scan(self, term):
+        corpus = self._corpus
+        offsets = self._offsets
+        names = self._names
+        stale = self._stale
+        # Para termos muito comuns, percorrer a lista de nomes é mais barato
+        # do que localizar cada ocorrência no texto.
+        limit = max(1024, len(names) // 20)
+        hits = []
+        pos = corpus.find(term)
+        while pos != -1:
+            if len(hits) > limit:
+                return [i for i, name in enumerate(names) if term in name]
+            i = bisect.bisect_right(offsets, pos) - 1
+            hits.append(i)
+            pos = corpus.find(term, offsets[i + 1])
+        if stale:
+            hits = [i for i in hits if i not in stale]
+            hits.extend(i for i in stale if term in names[i])
+            hits.sort()
+        return hits
+
+    def search(self, term):
+        term = search_key(term)
+        if not term:
+            return range(len(self.table))
+        hits = self._cache.get(term)
+        if hits is not None:
+            return hits
+        # Refina o maior resultado em cache cujo termo está contido no novo termo.
+        base = max((t for t in self._cache if t in term), key=len, default=None)
+        if base is not None:
+            names = self._names
+            hits = [i for i in self._cache[base] if term in names[i]]
+        else:
+            hits = self._scan(term)
+        if len(self._cache) >= self.CACHE_SIZE:
+            del self._cache[next(iter(self._cache))]
+        self._cache[term] = hits
+        return hits
+
+    def filter(self, view, term):
+        # Mantém a ordem da visão (que pode estar embaralhada).
+        if not term:
+            return view.copy()
+        mask = bytearray(len(self.table))
+        for i in self.search(term):
+            mask[i] = 1
+        return view.where(mask.__getitem__)
+
+# Abre o escaneamento de uma pasta: usa o índice persistente quando possível
+# e, sem ele, escaneia o disco inteiro. Retorna (índice ou None, gerador de
+# listas de FileRecord); o índice deve ser salvo ao final com save().
+def open_scan(folder, include_subfolders, extensions=None, is_running=lambda: True, metrics=None):
+    index = ScanIndex(folder)
+    try:
+        with metrics.phase('scan.index_load') if metrics is not None else nullcontext():
+            index.load()
+        return index, index.scan(include_subfolders, extensions, is_running, metrics)
+    except (OSError, sqlite3.Error):
+        return None, scan_folder(folder, include_subfolders, extensions, is_running, metrics)
+
+# Escaneia uma pasta de forma síncrona e retorna os arquivos com as extensões
+# pedidas, ordenados pelo caminho, como uma FileView.
+def load_files(folder, include_subfolders=False, extensions=DEFAULT_EXTENSIONS, metrics=None):
+    metrics = metrics if metrics is not None else RunMetrics('scan')
+    table = FileTable()
+    with metrics.profiling(), metrics.phase('scan.total'):
+        index, source = open_scan(folder, include_subfolders, metrics=metrics)
+        try:
+            with metrics.phase('scan.walk'):
+                for records in source:
+                    table.extend(records)
+        finally:
+            if index is not None:
+                try:
+                    with metrics.phase('scan.index_save'):
+                        index.save()
+                except (OSError, sqlite3.Error):
+                    pass
+        with metrics.phase('scan.sort'):
+            table.sort()
+        metrics.count('scan.files', len(table))
+        return table.select(frozenset(extensions))
+
+# Worker para escanear a pasta de origem em uma thread separada.
+# Os resultados são enviados em lotes ao listener (on_scan_batch,
+# on_scan_finished e on_scan_error, chamados na thread do worker) e o
+# escaneamento pode ser cancelado a qualquer momento com stop().
+class ScanWorker(threading.Thread):
+    def __init__(self, folder, include_subfolders, listener, extensions=None, batch_size=2000, metrics=None):
+        super().__init__(daemon=True)
+        self.folder = folder
+        self.include_subfolders = include_subfolders
+        self.listener = listener
+        self.extensions = set(extensions) if extensions is not None else None
+        self.batch_size = batch_size
+        self.metrics = metrics if metrics is not None else RunMetrics('scan')
+        self._is_running = True
+
+    def _flush(self, batch):
+        if batch and self._is_running:
+            self.metrics.count('scan.files', len(batch))
+            with self.metrics.phase('scan.listener'):
+                self.listener.on_scan_batch(self, batch)
+
+    def run(self):
+        with self.metrics.profiling(), self.metrics.phase('scan.total'):
+            self._scan()
+
+    def _scan(self):
+        metrics = self.metrics
+        index, source = open_scan(self.folder, self.include_subfolders, self.extensions,
+                                  lambda: self._is_running, metrics)
+        batch = []
+        try:
+            # Inclui o tempo gasto no listener (scan.listener).
+            with metrics.phase('scan.walk'):
+                for records in source:
+                    batch.extend(records)
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch)
+                        batch = []
+            if not self._is_running:
+                return
+            self._flush(batch)
+            with metrics.phase('scan.listener'):
+                self.listener.on_scan_finished(self)
+        except OSError as e:
+            if self._is_running:
+                self.listener.on_scan_error(self, e)
+        finally:
+            # Um escaneamento cancelado (ou substituído por outro) não é salvo:
+            # pode ser de uma pasta digitada pela metade.
+            if index is not None and self._is_running:
+                try:
+                    with metrics.phase('scan.index_save'):
+                        index.save()
+                except (OSError, sqlite3.Error):
+                    pass
+
+    def stop(self):
+        self._is_running = False
+
+# Cópia rápida de arquivos: usa os caminhos do kernel (copy_file_range e
+# sendfile) sem passar os dados pelo Python e, se não estiverem disponíveis,
+# cai para shutil.copyfileobj. Nunca sobrescreve um destino existente.
+_KERNEL_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+def _kernel_copy(infd, outfd, size):
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < size:
+                n = os.copy_file_range(infd, outfd, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            if copied or e.errno not in _KERNEL_COPY_FALLBACK_ERRNOS:
+                raise
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            while copied < size:
+                n = os.sendfile(outfd, infd, copied, min(size - copied, 1 << 30))
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            if copied or e.errno not in _KERNEL_COPY_FALLBACK_ERRNOS:
+                raise
+    return None
+
+def copy_file(src, dst, preserve_metadata=True):
+    with open(src, 'rb') as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        with open(dst, 'xb') as fdst:
+            try:
+                copied = _kernel_copy(fsrc.fileno(), fdst.fileno(), size)
+                if copied is None:
+                    shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+                    copied = size
+            except BaseException:
+                # Não deixa um arquivo pela metade no destino.
+                fdst.close()
+                os.remove(dst)
+                raise
+    if preserve_metadata:
+        shutil.copystat(src, dst)
+    return copied
+
+# Move ou copia um arquivo. Entre sistemas de arquivos diferentes o os.rename
+# falha com EXDEV, então o arquivo é copiado e o original apagado.
+# Retorna o número de bytes copiados (0 quando foi só um rename).
+def transfer_file(src, dst, keep_original=False, preserve_metadata=True, cross_device=False):
+    if not keep_original and not cross_device:
+        try:
+            os.rename(src, dst)
+            return 0
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    copied = copy_file(src, dst, preserve_metadata)
+    if not keep_original:
+        os.remove(src)
+    return copied
+
+# Modos da "fazenda de links": em vez de mover ou copiar, o destino recebe um
+# link para o arquivo original, que fica onde está. Links físicos só funcionam
+# dentro do mesmo sistema de arquivos; os simbólicos apontam para o caminho
+# absoluto da origem.
+LINK_MODES = ('hardlink', 'symlink')
+
+def link_file(src, dst, mode='hardlink'):
+    if mode == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+    elif mode == 'hardlink':
+        os.link(src, dst)
+    else:
+        raise ValueError(f"Modo de link desconhecido: {mode}")
+
+# Os links exigem uma pasta de destino diferente da de origem: lá, cada link
+# seria mais um arquivo a escanear e renomear na próxima vez. A pasta de
+# destino pode ainda não existir.
+def same_folder(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return _name_key(os.path.abspath(a)) == _name_key(os.path.abspath(b))
+
+# Garante que as pastas existem antes de mover os arquivos, para que o laço de
+# cada arquivo não faça nenhuma chamada de pasta. Cada pasta distinta é
+# verificada uma vez; as que faltam (e as pastas-pai que também faltarem) são
+# criadas nível a nível, das mais rasas para as mais fundas, em paralelo
+# dentro de cada nível. Retorna quantas pastas foram criadas.
+def create_dirs(dirs, max_workers=1, metrics=None):
+    known = {}
+
+    def is_dir(path):
+        result = known.get(path)
+        if result is None:
+            result = known[path] = os.path.isdir(path)
+        return result
+
+    wanted = set(dirs)
+    pool = ThreadPoolExecutor(max_workers) if max_workers > 1 and len(wanted) > 1 else None
+    try:
+        run = pool.map if pool is not None else map
+        known.update(zip(wanted, run(os.path.isdir, wanted)))
+        missing = set()
+        for path in wanted:
+            while path not in missing and not is_dir(path):
+                missing.add(path)
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+        levels = {}
+        for path in missing:
+            levels.setdefault(path.count(os.sep), []).append(path)
+        for depth in sorted(levels):
+            list(run(_make_dir, levels[depth]))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if metrics is not None:
+        metrics.count('syscall.stat', len(known))
+        metrics.count('syscall.mkdir', len(missing))
+    return len(missing)
+
+def _make_dir(path):
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        # Criada por outro processo no meio do caminho, ou existe mas não é pasta.
+        if not os.path.isdir(path):
+            raise
+
+# Sistemas de arquivos que normalmente não diferenciam maiúsculas de minúsculas.
+CASE_INSENSITIVE_FS = sys.platform in ('win32', 'darwin')
+
+def _name_key(name):
+    return name.lower() if CASE_INSENSITIVE_FS else name
+
+# Limpeza de nomes compilada uma única vez. Os caracteres inválidos no
+# Windows e os de controle viram '_' e os espaços em branco viram ' ' numa
+# tabela de tradução precompilada; o resto são expressões regulares. batch()
+# junta todos os nomes num único texto separado por NUL (que nunca aparece num
+# nome de arquivo), então cada etapa é uma só chamada em C para o lote inteiro.
+# Como todos os caracteres da tabela são ASCII, ela é aplicada aos bytes UTF-8
+# do texto: str.translate perde o caminho rápido quando há acentos no texto.
+# Políticas:
+#   reserved_names  nomes reservados do Windows (CON, NUL, COM1...) ganham '_'
+#                   e pontos e espaços no final são removidos
+#   normalize       forma Unicode ('NFC' junta acentos decompostos, como os do macOS)
+#   max_length      tamanho máximo do nome, sem a extensão (None: sem limite)
+#   ascii_only      translitera para ASCII (ação -> acao, Straße -> Strasse)
+class NameSanitizer:
+    INVALID_CHARS = '<>:"/\\|?*'
+    RESERVED_NAMES = ('CON', 'PRN', 'AUX', 'NUL', 'COM[1-9]', 'LPT[1-9]')
+    # Letras que a decomposição NFKD não separa em ASCII + acento.
+    ASCII_FALLBACKS = str.maketrans({
+        'ß': 'ss', 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE', 'ø': 'o', 'Ø': 'O',
+        'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ð': 'd', 'Ð': 'D', 'þ': 'th', 'Þ': 'Th',
+        'ı': 'i', '‘': "'", '’': "'", '“': '"', '”': '"', '–': '-', '—': '-',
+    })
+    _SEP = '\x00'
+    _COMBINING_RE = re.compile(r'[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]+')
+    # Espaços em branco fora do ASCII (str.isspace() só vai até U+3000).
+    _UNICODE_SPACES_RE = re.compile('[%s]' % ''.join(chr(c) for c in range(128, 0x3001) if chr(c).isspace()))
+    _SPACES_RE = re.compile(' {2,}')
+    _TRAILING_RE = re.compile(r'[. ]+\x00')
+
+    def __init__(self, reserved_names=True, normalize='NFC', max_length=200, ascii_only=False):
+        self.reserved_names = reserved_names
+        self.normalize = normalize
+        self.max_length = max_length
+        self.ascii_only = ascii_only
+        table = bytearray(range(256))
+        for code in range(1, 32):
+            table[code] = ord(' ') if chr(code).isspace() else ord('_')
+        for char in self.INVALID_CHARS:
+            table[ord(char)] = ord('_')
+        self._table = bytes(table)
+        self._reserved_re = re.compile(r'\x00(%s)(?=[.\x00])' % '|'.join(self.RESERVED_NAMES), re.IGNORECASE)
+        self._length_re = re.compile(r'\x00([^\x00]{%d})[^\x00]+' % max_length) if max_length else None
+
+    def __call__(self, name):
+        return self.batch((name,))[0]
+
+    def batch(self, names):
+        names = list(names)
+        if not names:
+            return names
+        text = self._SEP.join(names)
+        if text.count(self._SEP) != len(names) - 1:
+            names = [name.replace(self._SEP, '_') for name in names]
+            text = self._SEP.join(names)
+        if self.ascii_only:
+            if not text.isascii():
+                text = unicodedata.normalize('NFKD', text.translate(self.ASCII_FALLBACKS))
+                text = self._COMBINING_RE.sub('', text).encode('ascii', 'replace').decode('ascii')
+        elif self.normalize and not unicodedata.is_normalized(self.normalize, text):
+            text = unicodedata.normalize(self.normalize, text)
+        text = text.encode('utf-8', 'surrogatepass').translate(self._table).decode('utf-8', 'surrogatepass')
+        if not text.isascii() and self._UNICODE_SPACES_RE.search(text):
+            text = self._UNICODE_SPACES_RE.sub(' ', text)
+        if '  ' in text:
+            text = self._SPACES_RE.sub(' ', text)
+        # Com um NUL em cada ponta, início e fim de nome são sempre vizinhos de um NUL.
+        text = f'\x00{text}\x00'.replace('\x00 ', '\x00').replace(' \x00', '\x00')
+        if self._length_re is not None and (self.ascii_only or max(map(len, names)) > self.max_length):
+            text = self._length_re.sub('\x00\\1', text).replace(' \x00', '\x00')
+        if self.reserved_names:
+            if '.\x00' in text:
+                text = self._TRAILING_RE.sub('\x00', text)
+            text = self._reserved_re.sub('\x00\\1_', text)
+        return text[1:-1].split(self._SEP)
+
+# Só troca os caracteres inválidos e os espaços repetidos (usado nos valores
+# de tags, que nunca podem criar subpastas no nome).
+sanitize_name = NameSanitizer(reserved_names=False, normalize=None, max_length=None)
+
+# Políticas da opção "Limpar nomes" da interface e do --sanitize.
+NAME_SANITIZER = NameSanitizer()
+
+# Campos de tags aceitos no formato; os valores vêm do tag_reader do
+# RenamePattern (uma função record -> dict) quando houver um.
+TAG_FIELDS = ('artist', 'album', 'title', 'track', 'year', 'genre')
+
+# Formato de renomeação compilado uma única vez. Cada campo vira uma função e
+# o texto fixo vira um modelo para str.format, então gerar um nome é só chamar
+# as funções e preencher o modelo, sem procurar os campos no texto de novo.
+# Campos aceitos (a parte depois de ':' é opcional):
+#   {index}, {index:04}       número sequencial (por padrão com zeros suficientes)
+#   {folder_index:02}         número sequencial dentro da pasta do arquivo
+#   {name}                    nome original, sem extensão
+#   {parent}                  nome da pasta do arquivo
+#   {ext}                     extensão, sem o ponto
+#   {size}, {size:,}          tamanho em bytes
+#   {mtime}, {mtime:%Y}       data de modificação (formato do strftime)
+#   {artist:Desconhecido}     campos de tags; depois de ':' vai o valor padrão
+# A pré-visualização e a renomeação usam o mesmo RenamePattern.
+class RenamePattern:
+    FIELD_RE = re.compile(r'\{(\w+)(?::([^{}]*))?\}')
+    PREFIX_PATTERN = "{index} - {name}"
+    # Campos que mudam de um arquivo para outro na mesma pasta.
+    UNIQUE_FIELDS = frozenset(['index', 'folder_index', 'name'])
+
+    def __init__(self, pattern, sanitize=None, tag_reader=None, root_name=""):
+        self.pattern = pattern
+        self.sanitize = sanitize
+        self.tag_reader = tag_reader
+        self.root_name = root_name
+        self.fields = []
+        template = []
+        getters = []
+        pos = 0
+        for match in self.FIELD_RE.finditer(pattern):
+            template.append(self._literal(pattern[pos:match.start()]))
+            template.append('{}')
+            getters.append(self._compile_field(match.group(1), match.group(2)))
+            self.fields.append(match.group(1))
+            pos = match.end()
+        template.append(self._literal(pattern[pos:]))
+        self._template = ''.join(template)
+        self._getters = tuple(getters)
+        self.uses_tags = any(field in TAG_FIELDS for field in self.fields)
+
+    @staticmethod
+    def _literal(text):
+        return text.replace('{', '{{').replace('}', '}}')
+
+    @property
+    def is_unique(self):
+        return not self.UNIQUE_FIELDS.isdisjoint(self.fields)
+
+    def _compile_field(self, field, spec):
+        # Cada função recebe (record, index, folder_index, width, tags).
+        if field == 'index':
+            if spec:
+                return lambda r, i, fi, w, t: format(i, spec)
+            return lambda r, i, fi, w, t: str(i).zfill(w)
+        if field == 'folder_index':
+            spec = spec or '02'
+            return lambda r, i, fi, w, t: format(fi, spec)
+        if field == 'name':
+            return lambda r, i, fi, w, t: r.stem
+        if field == 'parent':
+            root_name = self.root_name
+            return lambda r, i, fi, w, t: os.path.basename(r.rel_dir) if r.rel_dir else root_name
+        if field == 'ext':
+            return lambda r, i, fi, w, t: r.ext[1:]
+        if field == 'size':
+            spec = spec or ''
+            return lambda r, i, fi, w, t: format(r.size, spec)
+        if field == 'mtime':
+            spec = spec or '%Y-%m-%d'
+            return lambda r, i, fi, w, t: time.strftime(spec, time.localtime(r.mtime))
+        if field in TAG_FIELDS:
+            default = spec or ''
+            # Valores de tags nunca podem criar subpastas no nome.
+            return lambda r, i, fi, w, t: sanitize_name(str(t.get(field) or default)) if t else default
+        raise ValueError(f"Campo desconhecido no formato: {{{field}}}")
+
+    def names(self, files, total=None):
+        # Gera o nome-base (sem extensão) de cada arquivo, na ordem dada. A
+        # largura padrão de {index} vem do total de arquivos da operação.
+        # Com sanitize, os nomes prontos são limpos em lotes.
+        width = len(str(total if total is not None else len(files)))
+        names = self._raw_names(files, width)
+        if self.sanitize is not None:
+            names = self._sanitized(names)
+        return self._not_empty(names, width)
+
+    @staticmethod
+    def _not_empty(names, width):
+        # Um nome vazio (ou só de pontos, como '...' depois de limpo) viraria um
+        # arquivo oculto como '.mp3' ou sairia da pasta: usa o número do arquivo.
+        for i, name in enumerate(names, 1):
+            yield name if name.strip('. ') else str(i).zfill(width)
+
+    SANITIZE_BATCH = 8192
+
+    def _sanitized(self, names):
+        sanitize = self.sanitize
+        batch = getattr(sanitize, 'batch', None) or (lambda chunk: [sanitize(name) for name in chunk])
+        while True:
+            chunk = list(islice(names, self.SANITIZE_BATCH))
+            if not chunk:
+                return
+            yield from batch(chunk)
+
+    def _raw_names(self, files, width):
+        template = self._template.format
+        getters = self._getters
+        tag_reader = self.tag_reader if self.uses_tags else None
+        folder_counts = {}
+        for i, record in enumerate(files, 1):
+            folder_index = folder_counts[record.rel_dir] = folder_counts.get(record.rel_dir, 0) + 1
+            tags = tag_reader(record) if tag_reader is not None else None
+            yield template(*[get(record, i, folder_index, width, tags) for get in getters])
+
+# Operação planejada de renomeação: caminho de origem -> caminho de destino.
+class RenameOp:
+    __slots__ = ('record', 'src', 'dst')
+
+    def __init__(self, record, src, dst):
+        self.record = record
+        self.src = src
+        self.dst = dst
+
+    @property
+    def is_noop(self):
+        return self.src.lower() == self.dst.lower()
+
+    def __repr__(self):
+        return f"RenameOp({self.src!r} -> {self.dst!r})"
+
+# Planeja todas as renomeações em memória antes de qualquer I/O. Os nomes que
+# já existem em cada pasta de destino são lidos uma única vez e as colisões são
+# resolvidas com conjuntos de nomes por pasta. Ao renomear na própria pasta,
+# os nomes atuais dos arquivos que serão movidos contam como livres: trocas e
+# ciclos (A -> B, B -> A) são resolvidos pelo executor em duas fases, então o
+# resultado não depende da ordem de processamento.
+# As operações são geradas uma a uma (iter_renames), para que um plano grande
+# possa ser exportado sem ficar inteiro na memória; plan_renames monta a lista.
+# make_base_names(files) gera o nome-base de cada arquivo (ver RenamePattern.names).
+# Com metrics, conta as pastas listadas e os nomes que colidiram.
+def iter_renames(files, folder, output_folder, make_base_names, release_sources=True, metrics=None):
+    folder = os.path.abspath(folder)
+    output_folder = os.path.abspath(output_folder)
+    release_sources = release_sources and _name_key(folder) == _name_key(output_folder)
+    output_prefix = os.path.join(output_folder, '')
+    folder_prefix = os.path.join(folder, '')
+    sep, altsep = os.sep, os.altsep or os.sep
+    # Caminhos (com a barra final) de cada pasta relativa, na origem e no destino.
+    src_dirs, dst_dirs = {}, {}
+
+    def wanted():
+        # Cada caminho é montado com uma única concatenação; só os nomes com
+        # subpastas ('sub/{name}', '{mtime:%Y/%m}') passam por normpath, e as
+        # colisões deles são conferidas na pasta onde o arquivo vai parar.
+        for record, base in zip(files, make_base_names(files)):
+            rel_dir = record.rel_dir
+            target_dir = dst_dirs.get(rel_dir)
+            if target_dir is None:
+                target_dir = dst_dirs[rel_dir] = output_prefix + rel_dir + sep if rel_dir else output_prefix
+            if sep in base or altsep in base or base in ('.', '..'):
+                target = os.path.normpath(target_dir + base)
+                if not target.startswith(output_prefix):
+                    raise ValueError(f"Nome fora da pasta de destino: {base}")
+                target_dir, base = os.path.split(target)
+                target_dir = os.path.join(target_dir, '')
+            yield record, target_dir, base
+
+    def src_dir(rel_dir):
+        path = src_dirs.get(rel_dir)
+        if path is None:
+            path = src_dirs[rel_dir] = folder_prefix + rel_dir + sep if rel_dir else folder_prefix
+        return path
+
+    # Por pasta de destino: (nomes ocupados por outros arquivos, nomes já planejados).
+    taken = {}
+    def dir_names(output_dir):
+        entry = taken.get(output_dir)
+        if entry is None:
+            dir_key = _name_key(output_dir)
+            entry = taken.get(dir_key)
+            if entry is None:
+                start = time.perf_counter()
+                try:
+                    names = {_name_key(n) for n in os.listdir(output_dir)}
+                except FileNotFoundError:
+                    names = set()
+                if metrics is not None:
+                    metrics.observe('listdir', time.perf_counter() - start)
+                    metrics.count('syscall.listdir')
+                entry = taken[dir_key] = (names, set())
+            taken[output_dir] = entry
+        return entry
+
+    if release_sources:
+        # Os destinos (e os FileRecord de uma FileView) são calculados uma única
+        # vez e guardados para o segundo passo. Só libera o nome de quem
+        # continua na mesma pasta: a renomeação em duas fases tira do caminho
+        # apenas as origens do próprio grupo.
+        files = list(files)
+        targets = list(wanted())
+        for record, target_dir, base in targets:
+            if base.lower() == record.stem.lower():
+                continue
+            source_dir = src_dir(record.rel_dir)
+            if target_dir == source_dir or _name_key(target_dir) == _name_key(source_dir):
+                dir_names(target_dir)[0].discard(_name_key(record.stem + record.ext))
+
+    else:
+        targets = wanted()
+    for record, target_dir, base in targets:
+        names, planned = dir_names(target_dir)
+        ext = record.ext
+        src = src_dir(record.rel_dir) + record.stem + ext
+        candidate = base + ext
+        key = _name_key(candidate)
+        counter = 1
+        while key in planned or (key in names and src.lower() != (target_dir + candidate).lower()):
+            candidate = f"{base} ({counter}){ext}"
+            key = _name_key(candidate)
+            counter += 1
+        if counter > 1 and metrics is not None:
+            metrics.count('plan.collisions')
+            metrics.count('plan.collision_probes', counter - 1)
+        planned.add(key)
+        yield RenameOp(record, src, target_dir + candidate)
+
+def plan_renames(files, folder, output_folder, make_base_names, release_sources=True):
+    return list(iter_renames(files, folder, output_folder, make_base_names, release_sources))
+
+# Mudanças na tabela (ver FileTable.apply_changes) causadas por um plano já
+# executado, calculadas só a partir do plano, sem tocar no disco. `rows` são as
+# linhas da tabela na ordem do plano (os índices da FileView planejada).
+def plan_changes(plan, folder, rows, keep_originals=False):
+    prefix = os.path.join(os.path.abspath(folder), '')
+    changes = []
+    for row, op in zip(rows, plan):
+        if op.is_noop:
+            continue
+        if op.dst.startswith(prefix):
+            rel_dir, name = os.path.split(op.dst[len(prefix):])
+            stem, ext = os.path.splitext(name)
+            record = op.record
+            if keep_originals:
+                changes.append(('add', FileRecord(rel_dir, stem, ext, record.size, record.mtime)))
+            else:
+                changes.append(('move', row, FileRecord(rel_dir, stem, ext, record.size, record.mtime,
+                                                        record.inode)))
+        elif not keep_originals:
+            changes.append(('remove', row))
+    return changes
+
+# Arquivos de plano (simulação): uma linha por operação com os caminhos
+# completos de origem e destino, em CSV (colunas source,target) ou JSONL
+# ({"source": ..., "target": ...}). O formato vem da extensão do arquivo.
+PLAN_FORMATS = ('csv', 'jsonl')
+
+def plan_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return 'jsonl' if ext in ('jsonl', 'json', 'ndjson') else 'csv'
+
+def write_plan(ops, f, fmt='csv'):
+    # Escreve as operações à medida que são geradas; retorna quantas foram escritas.
+    count = 0
+    if fmt == 'jsonl':
+        for op in ops:
+            f.write(json.dumps({'source': op.src, 'target': op.dst}, ensure_ascii=False) + '\n')
+            count += 1
+        return count
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(('source', 'target'))
+    for op in ops:
+        writer.writerow((op.src, op.dst))
+        count += 1
+    return count
+
+def read_plan(f, fmt='csv'):
+    # Gera um RenameOp por linha. Linhas em branco são ignoradas; uma linha
+    # malformada vira ValueError com o número dela.
+    if fmt == 'jsonl':
+        def pairs():
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    yield line_number, row['source'], row['target']
+                except (ValueError, KeyError, TypeError):
+                    raise ValueError(f"Linha {line_number} do plano inválida") from None
+    else:
+        reader = csv.reader(f)
+        def pairs():
+            try:
+                header = next(reader, None)
+                if header is None:
+                    return
+                if [h.strip().lower() for h in header[:2]] != ['source', 'target']:
+                    raise ValueError("Cabeçalho inválido no plano (esperado: source,target)")
+                for row in reader:
+                    if row:
+                        yield reader.line_num, row[0], row[1] if len(row) > 1 else ''
+            except csv.Error as e:
+                raise ValueError(f"Linha {reader.line_num} do plano inválida: {e}") from None
+    for line_number, src, dst in pairs():
+        if not (isinstance(src, str) and isinstance(dst, str) and src and dst):
+            raise ValueError(f"Linha {line_number} do plano incompleta")
+        if '\0' in src or '\0' in dst:
+            raise ValueError(f"Linha {line_number} do plano inválida")
+        stem, ext = os.path.splitext(os.path.basename(src))
+        yield RenameOp(FileRecord('', stem, ext), src, dst)
+
+# Playlists: a ordem atual (por exemplo, embaralhada) gravada num arquivo, sem
+# renomear nada. M3U/M3U8 trazem uma linha #EXTINF por faixa; JSON é uma lista
+# de objetos {"path", "title", "size"}. Os dois M3U são gravados em UTF-8.
+# Com `base` (a pasta da playlist), os caminhos ficam relativos a ela, para
+# que a playlist continue valendo se a biblioteca mudar de lugar.
+PLAYLIST_FORMATS = ('m3u8', 'm3u', 'json')
+
+def playlist_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return ext if ext in PLAYLIST_FORMATS else 'm3u8'
+
+def write_playlist(files, folder, f, fmt='m3u8', base=None, is_running=lambda: True):
+    # Escreve as faixas à medida que são geradas; retorna quantas foram escritas.
+    folder = os.path.abspath(folder)
+    dir_paths = {}
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+
+    def dir_path_of(rel_dir):
+        # Um os.path.relpath por pasta, não por arquivo.
+        dir_path = os.path.join(folder, rel_dir) if rel_dir else folder
+        if base is not None:
+            try:
+                dir_path = os.path.relpath(dir_path, base)
+            except ValueError:
+                return dir_path  # Outra unidade no Windows: fica o caminho absoluto.
+        return '' if dir_path == '.' else dir_path
+
+    if isinstance(files, FileView):
+        # Direto das colunas da tabela, sem criar um FileRecord por faixa.
+        table = files.table
+        dirs, dir_ids, stems, exts, ext_ids, sizes = (table.dirs, table.dir_ids, table.stems, table.exts,
+                                                      table.ext_ids, table.sizes)
+        tracks = ((dirs[dir_ids[i]], stems[i], exts[ext_ids[i]], sizes[i]) for i in files.indices)
+    else:
+        tracks = ((r.rel_dir, r.stem, r.ext, r.size) for r in files)
+    count = 0
+
+    def entries():
+        nonlocal count
+        for rel_dir, stem, ext, size in tracks:
+            if not is_running():
+                return
+            dir_path = dir_paths.get(rel_dir)
+            if dir_path is None:
+                dir_path = dir_paths[rel_dir] = dir_path_of(rel_dir)
+            path = os.path.join(dir_path, stem + ext) if dir_path else stem + ext
+            if fmt == 'json':
+                separator = ',\n' if count else ''
+                yield f'{separator}  {{"path": {encode(path)}, "title": {encode(stem)}, "size": {size}}}'
+            else:
+                yield f"#EXTINF:-1,{stem}\n{path}\n"
+            count += 1
+
+    f.write('[\n' if fmt == 'json' else '#EXTM3U\n')
+    f.writelines(entries())
+    if fmt == 'json':
+        f.write('\n]\n')
+    return count
+
+# Confere um plano lido de um arquivo (que pode ter sido editado) antes de
+# executá-lo: as origens precisam existir e ser únicas, os destinos precisam
+# ser únicos e só podem ocupar um arquivo existente se ele for a origem de
+# outra operação com destino na mesma pasta (o executor em duas fases o tira
+# do caminho antes) e as origens forem movidas (release_sources).
+# Lança ValueError com o primeiro problema encontrado.
+# Confere um plano lido de um arquivo (que pode ter sido editado à mão) antes
+# de executá-lo. Com output_folder, todos os destinos devem ficar dentro dela.
+def check_plan(ops, release_sources=True, output_folder=None):
+    sources = {}
+    targets = set()
+    output_prefix = _name_key(os.path.join(os.path.abspath(output_folder), '')) if output_folder else None
+    for op in ops:
+        if not os.path.isabs(op.src) or not os.path.isabs(op.dst):
+            raise ValueError(f"Caminho relativo no plano: {op.src} -> {op.dst}")
+        if os.path.normpath(op.src) != op.src or os.path.normpath(op.dst) != op.dst:
+            # '..' (ou '.') no caminho esconderia para onde o arquivo vai de fato.
+            raise ValueError(f"Caminho não normalizado no plano: {op.src} -> {op.dst}")
+        if output_prefix is not None and not _name_key(op.dst).startswith(output_prefix):
+            raise ValueError(f"Destino fora da pasta de destino: {op.dst}")
+        src_key = _name_key(op.src)
+        if src_key in sources:
+            raise ValueError(f"Origem repetida no plano: {op.src}")
+        sources[src_key] = op
+        if op.is_noop:
+            continue
+        dst_key = _name_key(op.dst)
+        if dst_key in targets:
+            raise ValueError(f"Destino repetido no plano: {op.dst}")
+        targets.add(dst_key)
+    existing = {}
+    for op in sources.values():
+        if not os.path.lexists(op.src):
+            raise ValueError(f"Arquivo de origem não encontrado: {op.src}")
+        if op.is_noop:
+            continue
+        dst_dir = os.path.dirname(op.dst)
+        names = existing.get(dst_dir)
+        if names is None:
+            try:
+                names = existing[dst_dir] = {_name_key(n) for n in os.listdir(dst_dir)}
+            except FileNotFoundError:
+                names = existing[dst_dir] = set()
+        if _name_key(os.path.basename(op.dst)) not in names:
+            continue
+        other = sources.get(_name_key(op.dst)) if release_sources else None
+        if other is None or other.is_noop or \
+                _name_key(os.path.dirname(other.dst)) != _name_key(dst_dir):
+            raise ValueError(f"O destino já existe: {op.dst}")
+
+# Progresso compartilhado entre os workers e a UI. Os workers só atualizam os
+# contadores; a UI lê um retrato em intervalos fixos, sem receber um callback
+# para cada arquivo.
+class ProgressCounter:
+    def __init__(self, total=0):
+        self._lock = threading.Lock()
+        self.total = total
+        self.done = 0
+        self.bytes_copied = 0
+        self.last_name = ""
+        self.start_time = time.monotonic()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def advance(self, name, copied=0):
+        with self._lock:
+            self.done += 1
+            self.bytes_copied += copied
+            self.last_name = name
+
+    def snapshot(self):
+        with self._lock:
+            done, total, copied, name = self.done, self.total, self.bytes_copied, self.last_name
+        elapsed = time.monotonic() - self.start_time
+        files_per_s = done / elapsed if elapsed > 0 else 0.0
+        mb_per_s = copied / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+        eta = (total - done) / files_per_s if files_per_s > 0 else None
+        return {'current': done, 'total': total, 'new_name': name,
+                'files_per_s': files_per_s, 'mb_per_s': mb_per_s, 'eta': eta}
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+# Passo de execução gravado no diário: move (ou copia) src para dst. Passos
+# com final=True levam o arquivo ao nome definitivo; os demais são movimentos
+# para nomes temporários da renomeação em duas fases.
+class RenameStep:
+    __slots__ = ('seq', 'src', 'dst', 'copy', 'final')
+
+    def __init__(self, seq, src, dst, copy=False, final=True):
+        self.seq = seq
+        self.src = src
+        self.dst = dst
+        self.copy = copy
+        self.final = final
+
+    def looks_done(self):
+        # Usado para passos cuja conclusão ainda não chegou ao diário.
+        if self.copy:
+            return os.path.exists(self.dst)
+        return not os.path.lexists(self.src) and os.path.lexists(self.dst)
+
+# Estado de um diário lido do disco.
+class JournalState:
+    def __init__(self):
+        self.info = {}
+        self.steps = []
+        self.done = set()
+        self.undone = set()
+        self.finished = False
+
+    def pending_steps(self):
+        return [step for step in self.steps if step.seq not in self.done]
+
+    def undo_steps(self):
+        # Um passo sem registro só conta como feito se parece feito e se o
+        # passo que levou o arquivo até a origem dele (o nome temporário) também
+        # foi feito: antes da fase 1, o nome final ainda é de outro arquivo.
+        done = set()
+        made_by = {}
+        for step in self.steps:
+            source = made_by.get(step.src)
+            if step.seq in self.done or (step.looks_done() and (source is None or source in done)):
+                done.add(step.seq)
+            made_by[step.dst] = step.seq
+        return [step for step in reversed(self.steps) if step.seq in done and step.seq not in self.undone]
+
+# Diário de renomeações (append-only) guardado na pasta de origem. Antes de
+# qualquer I/O o plano completo é gravado e sincronizado com o disco; depois,
+# cada passo concluído é registrado em lotes, com um único fsync a cada
+# SYNC_EVERY passos. Após uma falha, os passos cuja conclusão não chegou ao
+# disco são reconhecidos pelo estado dos arquivos (RenameStep.looks_done).
+class RenameJournal:
+    FILE_NAME = '.shuffletune-journal'
+    SYNC_EVERY = 1000
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, self.FILE_NAME)
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+    @classmethod
+    def exists(cls, folder):
+        return os.path.isfile(os.path.join(folder, cls.FILE_NAME))
+
+    @classmethod
+    def is_incomplete(cls, folder):
+        # Uma execução que terminou (mesmo cancelada) grava ["E"] no final.
+        try:
+            with open(os.path.join(folder, cls.FILE_NAME), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 16))
+                return not f.read().endswith(b'["E"]\n')
+        except OSError:
+            return False
+
+    @classmethod
+    def load(cls, folder):
+        path = os.path.join(folder, cls.FILE_NAME)
+        state = JournalState()
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Última linha incompleta de uma execução interrompida.
+                        break
+                    kind = entry[0]
+                    if kind == 'B':
+                        state.info = entry[2] if len(entry) > 2 else {}
+                    elif kind == 'P':
+                        state.steps.append(RenameStep(entry[1], entry[2], entry[3], bool(entry[4]), bool(entry[5])))
+                    elif kind == 'D':
+                        state.done.add(entry[1])
+                    elif kind == 'U':
+                        state.undone.add(entry[1])
+                    elif kind == 'E':
+                        state.finished = True
+        except FileNotFoundError:
+            return None
+        return state
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def begin(self, steps, info=None):
+        self._file = open(self.path, 'w', encoding='utf-8', buffering=1024 * 1024)
+        self._write(['B', time.time(), info or {}])
+        for step in steps:
+            self._write(['P', step.seq, step.src, step.dst, int(step.copy), int(step.final)])
+        self._sync()
+
+    def reopen(self):
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=1024 * 1024)
+
+    def _mark(self, kind, seq):
+        with self._lock:
+            self._write([kind, seq])
+            self._unsynced += 1
+            if self._unsynced >= self.SYNC_EVERY:
+                self._sync()
+
+    def mark_done(self, seq):
+        self._mark('D', seq)
+
+    def mark_undone(self, seq):
+        self._mark('U', seq)
+
+    def close(self, finished=False):
+        if self._file is None:
+            return
+        with self._lock:
+            if finished:
+                self._write(['E'])
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        os.remove(self.path)
+
+# Worker para renomear arquivos em uma thread separada.
+# Primeiro todas as renomeações são planejadas em memória (plan_renames) e
+# depois executadas sem verificar a existência de cada destino no disco.
+# Cada pasta é executada em duas fases: arquivos cujo nome atual é o destino
+# de outro arquivo vão antes para um nome temporário, e só então todos seguem
+# para o nome final. Todos os passos ficam registrados no RenameJournal.
+# Com max_workers > 1, as pastas de destino são processadas em paralelo por
+# um pool de threads. Com link ('hardlink' ou 'symlink'), o destino recebe
+# links para os originais, que não saem do lugar (ver link_file).
+class RenameWorker(threading.Thread):
+    def __init__(self, files, folder, pattern, add_number_prefix, listener, output_folder=None,
+                 sanitize_names=False, max_workers=1, keep_originals=False, preserve_metadata=True,
+                 progress=None, shuffle=None, plan=None, tags=None, duplicates=None, metrics=None,
+                 link=None):
+        super().__init__()
+        # Os arquivos não são copiados: quem chama não deve alterá-los durante a execução.
+        self.files = files if files is not None else ()
+        # Plano pronto (por exemplo, lido de um arquivo); substitui o plano gerado.
+        self.plan = plan
+        self.folder = folder
+        self.pattern = pattern
+        self.add_number_prefix = add_number_prefix
+        self.listener = listener
+        self.output_folder = output_folder if output_folder else folder
+        self.sanitize_names = sanitize_names
+        self.max_workers = max(1, int(max_workers))
+        if link is not None and link not in LINK_MODES:
+            raise ValueError(f"Modo de link desconhecido: {link}")
+        if link is not None and plan is None and same_folder(self.output_folder, folder):
+            raise ValueError("Com links, a pasta de destino deve ser diferente da de origem.")
+        self.link = link
+        # Os links deixam os originais no lugar, como uma cópia.
+        self.keep_originals = keep_originals or link is not None
+        self.preserve_metadata = preserve_metadata
+        self._cross_device = False
+        self._is_running = True
+        self.progress = progress if progress is not None else ProgressCounter()
+        self.metrics = metrics if metrics is not None else RunMetrics('rename')
+        # Plano completo, guardado só quando a operação termina sem erros nem
+        # cancelamento (ver plan_changes).
+        self.executed_plan = None
+        self._temp_token = os.urandom(4).hex()
+        self.journal = None
+        # Modo e semente do embaralhamento que gerou a ordem, gravados no diário.
+        self.shuffle = shuffle
+        # TagStore usado pelos campos de tags do formato; as tags que faltarem
+        # são carregadas antes do planejamento.
+        self.tags = tags
+        # DuplicateFinder opcional: arquivos de conteúdo repetido saem da
+        # operação antes do planejamento (fica o primeiro de cada grupo).
+        self.duplicates = duplicates
+        # sanitize_names pode ser um NameSanitizer com outras políticas.
+        if sanitize_names and not isinstance(sanitize_names, NameSanitizer):
+            sanitize_names = NAME_SANITIZER
+        self.formatter = RenamePattern(RenamePattern.PREFIX_PATTERN if add_number_prefix else pattern,
+                                       sanitize=sanitize_names if sanitize_names else None,
+                                       root_name=os.path.basename(os.path.normpath(folder)))
+
+    def _prepare_tags(self):
+        if self.tags is not None and self.formatter.uses_tags:
+            with self.metrics.phase('plan.tags'):
+                self.tags.load(self.files, lambda: self._is_running)
+            self.formatter.tag_reader = self.tags.get
+
+    def _prepare_files(self):
+        if self.duplicates is not None:
+            with self.metrics.phase('plan.duplicates'):
+                self.files = self.duplicates.exclude(self.files, lambda: self._is_running)
+            self.metrics.count('plan.duplicates_skipped', self.duplicates.removed)
+        self._prepare_tags()
+
+    def iter_plan(self):
+        self._prepare_files()
+        return iter_renames(self.files, self.folder, self.output_folder, self.formatter.names,
+                            release_sources=not self.keep_originals, metrics=self.metrics)
+
+    def export_plan(self, f, fmt='csv'):
+        # Simulação: escreve o plano completo sem renomear nada.
+        with self.metrics.profiling(), self.metrics.phase('plan.export'):
+            return write_plan(self.iter_plan(), f, fmt)
+
+    def build_plan(self):
+        if self.plan is not None:
+            return self.plan
+        with self.metrics.phase('plan.build'):
+            return list(self.iter_plan())
+
+    def _build_steps(self, plan):
+        # Agrupa por pasta de destino (colisões só acontecem dentro da mesma
+        # pasta) e gera os passos das duas fases de cada grupo.
+        groups = {}
+        for op in plan:
+            if not op.is_noop:
+                groups.setdefault(_name_key(os.path.dirname(op.dst)), []).append(op)
+        seq = 0
+        group_steps = []
+        for ops in groups.values():
+            steps = []
+            # Fase 1: tira do caminho os arquivos que ocupam o destino de outro arquivo.
+            targets = {_name_key(op.dst) for op in ops}
+            sources = []
+            for op in ops:
+                src = op.src
+                if _name_key(src) in targets:
+                    temp_path = os.path.join(os.path.dirname(src),
+                                             f".shuffletune-{self._temp_token}-{seq}{op.record.ext}")
+                    steps.append(RenameStep(seq, src, temp_path, final=False))
+                    seq += 1
+                    src = temp_path
+                sources.append(src)
+            # Fase 2: todos seguem para o nome final.
+            for op, src in zip(ops, sources):
+                steps.append(RenameStep(seq, src, op.dst, copy=self.keep_originals))
+                seq += 1
+            group_steps.append(steps)
+        return group_steps
+
+    def _execute(self, step):
+        metrics = self.metrics
+        start = time.perf_counter()
+        if self.link is not None and step.final:
+            link_file(step.src, step.dst, self.link)
+            copied = 0
+        else:
+            copied = transfer_file(step.src, step.dst, keep_original=step.copy,
+                                   preserve_metadata=self.preserve_metadata,
+                                   cross_device=self._cross_device and step.final)
+        transferred = time.perf_counter()
+        if self.link is not None and step.final:
+            metrics.observe('link', transferred - start)
+            metrics.count('syscall.link')
+        elif copied or step.copy:
+            metrics.observe('copy', transferred - start)
+            metrics.count('files.copied')
+            metrics.count('bytes.copied', copied)
+        else:
+            metrics.observe('rename', transferred - start)
+            metrics.count('syscall.rename')
+        if self.journal is not None:
+            self.journal.mark_done(step.seq)
+            metrics.observe('journal.mark', time.perf_counter() - transferred)
+        return copied
+
+    def _process_group(self, steps):
+        # Um cancelamento (ou o erro de outra thread) antes do início deixa a
+        # pasta intacta. Depois de começar, a fase 1 vai até o fim: só então
+        # todos os destinos ocupados por outras origens estão livres. Na fase 2,
+        # os arquivos com nome temporário ainda seguem para o nome final; os
+        # demais ficam com o nome original, que não é destino de ninguém.
+        if not self._is_running:
+            return
+        staged = set()
+        for step in steps:
+            if step.final and not self._is_running and step.src not in staged:
+                continue
+            copied = self._execute(step)
+            if not step.final:
+                staged.add(step.dst)
+                continue
+            self.progress.advance(os.path.basename(step.dst), copied)
+
+    def _run_groups(self, group_steps):
+        if self.max_workers == 1 or len(group_steps) == 1:
+            for steps in group_steps:
+                self._process_group(steps)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._process_group, steps) for steps in group_steps]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                # Interrompe as outras threads antes de propagar o erro.
+                self._is_running = False
+                raise
+
+    def run(self):
+        with self.metrics.profiling(), self.metrics.phase('rename.total'):
+            success, message = self._rename()
+        with self.metrics.phase('rename.listener'):
+            self.listener.on_rename_finished(success, message)
+
+    def _rename(self):
+        metrics = self.metrics
+        try:
+            # Detecta uma única vez se o destino está em outro sistema de arquivos,
+            # evitando uma tentativa de rename que falharia para cada arquivo.
+            os.makedirs(self.output_folder, exist_ok=True)
+            self._cross_device = os.stat(self.folder).st_dev != os.stat(self.output_folder).st_dev
+            if self.link == 'hardlink' and self._cross_device:
+                return False, "Erro: links físicos exigem o destino no mesmo sistema de arquivos da origem"
+            plan = self.build_plan()
+            self.progress.set_total(len(plan))
+            with metrics.phase('rename.steps'):
+                group_steps = self._build_steps(plan)
+            # Arquivos que já têm o nome final contam direto no progresso.
+            noops = 0
+            for op in plan:
+                if op.is_noop:
+                    noops += 1
+                    self.progress.advance(os.path.basename(op.dst))
+            metrics.count('plan.operations', len(plan))
+            metrics.count('plan.unchanged', noops)
+
+            self.journal = RenameJournal(self.folder)
+            try:
+                with metrics.phase('journal.begin'):
+                    info = {'shuffle': self.shuffle} if self.shuffle else {}
+                    if self.link is not None:
+                        info['link'] = self.link
+                    self.journal.begin((step for steps in group_steps for step in steps), info)
+            except OSError:
+                # Pasta de origem somente leitura (por exemplo, ao copiar): segue sem diário.
+                self.journal = None
+
+            # As pastas de destino são criadas de uma vez (os nomes
+            # temporários ficam nas pastas de origem, que já existem).
+            with metrics.phase('rename.dirs'):
+                create_dirs({os.path.dirname(step.dst) for steps in group_steps for step in steps if step.final},
+                            self.max_workers, metrics)
+            with metrics.phase('rename.execute'):
+                self._run_groups(group_steps)
+            if self.journal is not None:
+                with metrics.phase('journal.close'):
+                    self.journal.close(finished=True)
+
+            if self._is_running:
+                self.executed_plan = plan
+            final_message = "Operação concluída com sucesso" if self._is_running else "Operação cancelada"
+            if self.duplicates is not None and self.duplicates.removed:
+                final_message += f" ({self.duplicates.removed} duplicatas ignoradas)"
+            return self._is_running, final_message
+        except Exception as e:
+            if self.journal is not None:
+                try:
+                    self.journal.close()
+                except OSError:
+                    pass
+            return False, f"Erro: {str(e)}"
+
+    def stop(self):
+        self._is_running = False
+
+# Worker que retoma (undo=False) ou desfaz (undo=True) a última operação
+# registrada no diário da pasta de origem.
+class JournalWorker(threading.Thread):
+    def __init__(self, folder, listener, undo=False, preserve_metadata=True, progress=None):
+        super().__init__()
+        self.folder = folder
+        self.listener = listener
+        self.undo = undo
+        self.preserve_metadata = preserve_metadata
+        self.progress = progress if progress is not None else ProgressCounter()
+        self._is_running = True
+        # Modo de link da operação registrada (ver RenameWorker), lido do diário.
+        self.link = None
+
+    def _undo_step(self, step):
+        if step.copy:
+            if os.path.lexists(step.dst):
+                os.remove(step.dst)
+            return
+        if os.path.lexists(step.src):
+            raise FileExistsError(errno.EEXIST, "Arquivo já existe", step.src)
+        transfer_file(step.dst, step.src, preserve_metadata=self.preserve_metadata)
+
+    def _redo_step(self, step):
+        if step.looks_done():
+            return
+        if self.link is not None and step.final:
+            link_file(step.src, step.dst, self.link)
+            return
+        transfer_file(step.src, step.dst, keep_original=step.copy, preserve_metadata=self.preserve_metadata)
+
+    def run(self):
+        journal = None
+        try:
+            state = RenameJournal.load(self.folder)
+            if state is None:
+                raise FileNotFoundError(errno.ENOENT, "Diário não encontrado", self.folder)
+            self.link = state.info.get('link')
+            steps = state.undo_steps() if self.undo else state.pending_steps()
+            self.progress.set_total(sum(1 for step in steps if step.final))
+
+            # As pastas para onde os arquivos voltam (ou seguem) são criadas antes.
+            create_dirs({os.path.dirname(step.src if self.undo else step.dst) for step in steps
+                         if not (self.undo and step.copy)})
+            journal = RenameJournal(self.folder)
+            journal.reopen()
+            for step in steps:
+                if not self._is_running:
+                    break
+                if self.undo:
+                    self._undo_step(step)
+                    journal.mark_undone(step.seq)
+                else:
+                    self._redo_step(step)
+                    journal.mark_done(step.seq)
+                if step.final:
+                    self.progress.advance(os.path.basename(step.src if self.undo else step.dst))
+
+            completed = self._is_running
+            if completed and self.undo:
+                journal.discard()
+            else:
+                journal.close(finished=completed)
+            final_message = "Operação concluída com sucesso" if completed else "Operação cancelada"
+            self.listener.on_rename_finished(completed, final_message)
+        except Exception as e:
+            if journal is not None:
+                try:
+                    journal.close()
+                except OSError:
+                    pass
+            self.listener.on_rename_finished(False, f"Erro: {str(e)}")
+
+    def stop(self):
+        self._is_running = False
+
+# Grava a ordem atual numa playlist (ver write_playlist) em vez de renomear:
+# nenhum arquivo é movido. A playlist é escrita num arquivo temporário ao lado
+# e só substitui a anterior quando está completa. Avisa o listener pelo mesmo
+# on_rename_finished dos outros workers.
+class PlaylistWorker(threading.Thread):
+    def __init__(self, files, folder, path, listener, fmt=None, relative=True, duplicates=None, metrics=None):
+        super().__init__()
+        self.files = files if files is not None else ()
+        self.folder = folder
+        self.path = os.path.abspath(path)
+        self.listener = listener
+        self.fmt = fmt or playlist_format(path)
+        # Caminhos relativos à pasta da playlist (ou absolutos).
+        self.relative = relative
+        self.duplicates = duplicates
+        self.metrics = metrics if metrics is not None else RunMetrics('playlist')
+        self._is_running = True
+
+    def _write(self):
+        files = self.files
+        if self.duplicates is not None:
+            with self.metrics.phase('plan.duplicates'):
+                files = self.duplicates.exclude(files, lambda: self._is_running)
+            self.metrics.count('plan.duplicates_skipped', self.duplicates.removed)
+        base = os.path.dirname(self.path) if self.relative else None
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with self.metrics.phase('playlist.write'):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(temp_path, 'w', encoding='utf-8', newline='\n', buffering=1024 * 1024) as f:
+                    count = write_playlist(files, self.folder, f, self.fmt, base, lambda: self._is_running)
+                if not self._is_running:
+                    os.remove(temp_path)
+                    return False, "Operação cancelada"
+                os.replace(temp_path, self.path)
+        except OSError as e:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False, f"Erro: {str(e)}"
+        self.metrics.count('playlist.entries', count)
+        message = f"Playlist com {count} faixas gravada em {self.path}"
+        if self.duplicates is not None and self.duplicates.removed:
+            message += f" ({self.duplicates.removed} duplicatas ignoradas)"
+        return True, message
+
+    def run(self):
+        with self.metrics.profiling(), self.metrics.phase('playlist.total'):
+            success, message = self._write()
+        self.listener.on_rename_finished(success, message)
+
+    def stop(self):
+        self._is_running = False
@@ -0,0 +1,196 @@
+# Detecção de arquivos duplicados (conteúdo idêntico com nomes diferentes).
+# São três etapas, cada uma só para os candidatos que sobraram da anterior:
+#   1. tamanho, já conhecido do escaneamento (nenhum I/O);
+#   2. hash parcial do início e do fim do arquivo;
+#   3. hash do arquivo inteiro.
+# Os hashes são calculados em paralelo (o hashlib libera o GIL durante o
+# cálculo) lendo os arquivos por mmap, e ficam em cache por (caminho, tamanho,
+# data de modificação), então uma nova verificação só lê arquivos alterados
+# (conferidos com um stat novo, não com os dados do escaneamento).
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from shuffletune_core import FileView, get_cache_dir
+
+# Bytes lidos do início e do fim no hash parcial. Arquivos de até duas vezes
+# isso são lidos inteiros, e o hash parcial já é o hash completo.
+PARTIAL_SIZE = 64 * 1024
+HASH_CHUNK = 8 * 1024 * 1024
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def partial_hash(path, size):
+    with open(path, 'rb') as f:
+        if size <= 2 * PARTIAL_SIZE:
+            return _digest(f.read())
+        head = f.read(PARTIAL_SIZE)
+        f.seek(-PARTIAL_SIZE, os.SEEK_END)
+        return _digest(head + f.read(PARTIAL_SIZE))
+
+def full_hash(path):
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= 2 * PARTIAL_SIZE:
+            return _digest(f.read())
+        digest = hashlib.blake2b(digest_size=16)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for offset in range(0, size, HASH_CHUNK):
+                digest.update(view[offset:offset + HASH_CHUNK])
+        return digest.digest()
+
+# Localiza grupos de arquivos idênticos dentro dos arquivos de uma pasta de
+# origem. find() e exclude() recebem os arquivos na ordem da operação (uma
+# FileView ou uma lista de FileRecord); em cada grupo, o primeiro arquivo
+# nessa ordem é o que fica.
+class DuplicateFinder:
+    SCHEMA_VERSION = 1
+
+    def __init__(self, folder, db_path=None, max_workers=None):
+        self.folder = os.path.abspath(folder)
+        self.db_path = db_path if db_path is not None else os.path.join(get_cache_dir(), 'hashes.sqlite')
+        self.max_workers = max_workers if max_workers else min(8, (os.cpu_count() or 1) + 2)
+        self.removed = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        if conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS hashes")
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        conn.execute("CREATE TABLE IF NOT EXISTS hashes ("
+                     "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, "
+                     "partial BLOB, full BLOB)")
+        return conn
+
+    def _load_cached(self, conn):
+        prefix = os.path.join(self.folder, '')
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = conn.execute("SELECT path, size, mtime, partial, full FROM hashes "
+                            "WHERE path >= ? AND path < ?", (prefix, upper))
+        return {path: [size, mtime, partial, full] for path, size, mtime, partial, full in rows}
+
+    def _hash_stage(self, pool, records, cached, kind, is_running):
+        # Calcula (ou pega do cache) o hash `kind` ('partial' ou 'full') de
+        # cada FileRecord e agrupa os registros por (tamanho, hash). Os jobs
+        # vão para o pool em lotes, para que um cancelamento não espere todos.
+        column = 2 if kind == 'partial' else 3
+        groups = {}
+        changed = []
+        batch_size = self.max_workers * 16
+        for start in range(0, len(records), batch_size):
+            if not is_running():
+                break
+            batch = []
+            for record in records[start:start + batch_size]:
+                path = os.path.join(self.folder, record.rel_path)
+                batch.append((record, path, cached.get(path)))
+            results = pool.map(lambda item: _stage_hash(kind, item[1], item[2]), batch)
+            for (record, path, entry), result in zip(batch, results):
+                if result is None:
+                    continue  # Arquivo ilegível: fica fora da comparação.
+                size, mtime, value, computed = result
+                if computed:
+                    if entry is None or entry[0] != size or entry[1] != mtime:
+                        entry = cached[path] = [size, mtime, None, None]
+                    entry[column] = value
+                    if kind == 'partial' and size <= 2 * PARTIAL_SIZE:
+                        entry[3] = value
+                    changed.append(path)
+                groups.setdefault((size, value), []).append(record)
+        return groups, changed
+
+    def find(self, files, is_running=lambda: True):
+        # Retorna os grupos de duplicatas como listas de posições em `files`.
+        with self._lock:
+            by_size = {}
+            for position, size in enumerate(_sizes(files)):
+                if size:
+                    by_size.setdefault(size, []).append(position)
+            candidates = [positions for positions in by_size.values() if len(positions) > 1]
+            if not candidates:
+                return []
+            positions_of = {}
+            records = []
+            for positions in candidates:
+                for position in positions:
+                    record = files[position]
+                    positions_of[id(record)] = position
+                    records.append(record)
+            try:
+                conn = self._connect()
+                cached = self._load_cached(conn)
+            except (OSError, sqlite3.Error):
+                conn, cached = None, {}
+            changed = []
+            try:
+                with ThreadPoolExecutor(self.max_workers) as pool:
+                    groups, paths = self._hash_stage(pool, records, cached, 'partial', is_running)
+                    changed += paths
+                    # Os registros continuam vivos em `records`, então id() segue único.
+                    same_partial = [r for group in _duplicate_groups(groups) for r in group]
+                    groups, paths = self._hash_stage(pool, same_partial, cached, 'full', is_running)
+                    changed += paths
+            finally:
+                if conn is not None:
+                    with closing(conn):
+                        self._save(conn, cached, changed)
+            result = [sorted(positions_of[id(r)] for r in group)
+                      for group in _duplicate_groups(groups)]
+            result.sort()
+            return result
+
+    def _save(self, conn, cached, paths):
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                                 ((path, *cached[path]) for path in set(paths)))
+        except sqlite3.Error:
+            pass
+
+    def exclude(self, files, is_running=lambda: True):
+        # Retorna os arquivos sem as duplicatas (mantém o primeiro de cada
+        # grupo) e guarda em self.removed quantos foram retirados.
+        duplicates = set()
+        for group in self.find(files, is_running):
+            duplicates.update(group[1:])
+        self.removed = len(duplicates)
+        if not duplicates:
+            return files
+        if isinstance(files, FileView):
+            indices = files.indices
+            return FileView(files.table, array('I', (indices[p] for p in range(len(indices))
+                                                     if p not in duplicates)))
+        return [record for p, record in enumerate(files) if p not in duplicates]
+
+def _sizes(files):
+    if isinstance(files, FileView):
+        sizes = files.table.sizes
+        return [sizes[i] for i in files.indices]
+    return [record.size for record in files]
+
+def _duplicate_groups(groups):
+    # Só as chaves (tamanho, hash) que apareceram em mais de um arquivo.
+    return [records for records in groups.values() if len(records) > 1]
+
+def _stage_hash(kind, path, entry):
+    # Roda no pool: faz um stat novo do arquivo e só reaproveita o hash do
+    # cache se o tamanho e a data ainda forem os guardados. O FileRecord pode
+    # ser de um escaneamento antigo. Retorna (tamanho, mtime, hash, calculado).
+    try:
+        st = os.stat(path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime:
+            value = entry[2 if kind == 'partial' else 3]
+            if value is not None:
+                return st.st_size, st.st_mtime, value, False
+        value = partial_hash(path, st.st_size) if kind == 'partial' else full_hash(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime, value, True
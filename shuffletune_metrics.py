@@ -0,0 +1,207 @@
+# Instrumentação dos workers: tempo por etapa, contadores (chamadas ao
+# sistema, arquivos) e histogramas de latência por operação, além de um
+# perfil opcional de CPU (cProfile) ou de memória (tracemalloc). Os workers
+# sempre registram as medidas; o relatório sai em JSON (report/write_json) ou
+# no formato de texto do Prometheus (write_prometheus), para o coletor de
+# arquivos de texto do node_exporter.
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Limites (em segundos) dos intervalos dos histogramas, de 10 µs a 10 s.
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_MODES = ('cpu', 'memory')
+PROFILE_TOP = 25
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Estimativa pelo limite superior do intervalo que contém o quantil.
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        cumulative = []
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            cumulative.append([bound, seen])
+        return {'count': self.count, 'sum': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99),
+                'max': self.max, 'buckets': cumulative}
+
+# Medidas de uma execução. Pode ser compartilhada entre threads (o pool da
+# renomeação) e entre etapas (a linha de comando usa a mesma para o
+# escaneamento e a renomeação). Os tempos das etapas são somados: etapas
+# aninhadas (como 'scan.total' e 'scan.walk') aparecem cada uma com o seu.
+class RunMetrics:
+    def __init__(self, name='run', profile=None, profile_path=None):
+        if profile not in (None,) + PROFILE_MODES:
+            raise ValueError(f"Perfil desconhecido: {profile}")
+        self.name = name
+        self.profile = profile
+        # Com profile='cpu', as estatísticas completas também são gravadas
+        # aqui (para o pstats ou o snakeviz).
+        self.profile_path = profile_path
+        self.started = time.time()
+        self.phases = {}
+        self.counters = {}
+        self.histograms = {}
+        self.memory = None
+        self._lock = threading.Lock()
+        self._profiler = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = _Histogram()
+            histogram.add(seconds)
+
+    @contextmanager
+    def profiling(self):
+        # O cProfile só acompanha a thread que entrou aqui (a do worker); as
+        # threads do pool aparecem apenas no tempo das etapas e nos
+        # histogramas. O tracemalloc vale para o processo inteiro. Os dois só
+        # são importados quando pedidos, para não pesar no início da CLI.
+        if self.profile == 'cpu':
+            import cProfile
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            try:
+                yield
+            finally:
+                self._profiler.disable()
+                if self.profile_path:
+                    self._profiler.dump_stats(self.profile_path)
+        elif self.profile == 'memory':
+            import tracemalloc
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            try:
+                yield
+            finally:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                if started:
+                    tracemalloc.stop()
+                top = [{'where': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+                       for stat in snapshot.statistics('lineno')[:PROFILE_TOP]]
+                peak = max(peak, self.memory['peak_bytes']) if self.memory else peak
+                self.memory = {'current_bytes': current, 'peak_bytes': peak, 'top': top}
+        else:
+            yield
+
+    def _cpu_profile(self):
+        if self._profiler is None:
+            return None
+        import pstats
+        stats = pstats.Stats(self._profiler).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        return [{'function': f"{func} ({os.path.basename(file)}:{line})", 'calls': calls,
+                 'tottime': tottime, 'cumtime': cumtime}
+                for (file, line, func), (_, calls, tottime, cumtime, _) in rows]
+
+    def report(self):
+        with self._lock:
+            phases = dict(self.phases)
+            counters = dict(self.counters)
+            histograms = {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+        report = {
+            'run': self.name,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'elapsed': time.time() - self.started,
+            'phases': phases,
+            'counters': counters,
+            'histograms': histograms,
+        }
+        if self.profile == 'cpu':
+            report['cpu_profile'] = self._cpu_profile()
+        if self.memory is not None:
+            report['memory'] = self.memory
+        return report
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.report(), indent=2, ensure_ascii=False) + '\n')
+
+    def write_prometheus(self, path, prefix='shuffletune'):
+        report = self.report()
+        run = _label(report['run'])
+        lines = [
+            f"# HELP {prefix}_run_timestamp_seconds Início da última execução.",
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f'{prefix}_run_timestamp_seconds{{run="{run}"}} {self.started:.3f}',
+            f"# HELP {prefix}_phase_seconds Tempo gasto em cada etapa.",
+            f"# TYPE {prefix}_phase_seconds gauge",
+        ]
+        lines += [f'{prefix}_phase_seconds{{run="{run}",phase="{_label(name)}"}} {seconds:.6f}'
+                  for name, seconds in sorted(report['phases'].items())]
+        lines += [f"# HELP {prefix}_events_total Chamadas ao sistema e itens processados.",
+                  f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{run="{run}",event="{_label(name)}"}} {value}'
+                  for name, value in sorted(report['counters'].items())]
+        lines += [f"# HELP {prefix}_operation_seconds Latência de cada operação.",
+                  f"# TYPE {prefix}_operation_seconds histogram"]
+        for name, histogram in sorted(report['histograms'].items()):
+            labels = f'run="{run}",operation="{_label(name)}"'
+            for bound, count in histogram['buckets']:
+                lines.append(f'{prefix}_operation_seconds_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'{prefix}_operation_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{prefix}_operation_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+            lines.append(f'{prefix}_operation_seconds_count{{{labels}}} {histogram["count"]}')
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _write_atomic(path, text):
+    # O coletor do node_exporter pode ler o arquivo a qualquer momento.
+    if path == '-':
+        print(text, end='')
+        return
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
@@ -0,0 +1,424 @@
+# Leitura de tags de áudio: ID3v1/ID3v2 (MP3), comentários Vorbis (FLAC, Ogg
+# Vorbis e Opus) e átomos MP4 (M4A). Cada leitor só lê os trechos de que
+# precisa, pulando com seek() o áudio, as capas e os demais blocos.
+# Os resultados ficam em cache (SQLite) por (caminho, tamanho, data de
+# modificação), e os arquivos que faltam no cache são lidos em paralelo por
+# um pool de processos.
+import io
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing, nullcontext
+
+from shuffletune_core import TAG_FIELDS, get_cache_dir
+
+_ID3_FRAMES = {
+    'TPE1': 'artist', 'TALB': 'album', 'TIT2': 'title', 'TRCK': 'track',
+    'TYER': 'year', 'TDRC': 'year', 'TCON': 'genre',
+    # ID3v2.2 usa identificadores de três letras.
+    'TP1': 'artist', 'TAL': 'album', 'TT2': 'title', 'TRK': 'track', 'TYE': 'year', 'TCO': 'genre',
+}
+_VORBIS_KEYS = {
+    'ARTIST': 'artist', 'ALBUM': 'album', 'TITLE': 'title', 'TRACKNUMBER': 'track',
+    'DATE': 'year', 'YEAR': 'year', 'GENRE': 'genre',
+}
+_MP4_ATOMS = {
+    b'\xa9ART': 'artist', b'\xa9alb': 'album', b'\xa9nam': 'title', b'trkn': 'track',
+    b'\xa9day': 'year', b'\xa9gen': 'genre',
+}
+# Limite de leitura para os cabeçalhos Ogg, que não têm como ser pulados.
+OGG_READ_LIMIT = 1024 * 1024
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def _decode_id3_text(data):
+    if not data:
+        return ''
+    encoding, body = data[0], data[1:]
+    if encoding == 0:
+        text = body.decode('latin-1')
+    elif encoding == 1:
+        text = body.decode('utf-16', 'replace')
+    elif encoding == 2:
+        text = body.decode('utf-16-be', 'replace')
+    elif encoding == 3:
+        text = body.decode('utf-8', 'replace')
+    else:
+        return ''
+    # Vários valores vêm separados por '\0'; fica só o primeiro.
+    return text.split('\0')[0].strip()
+
+def _read_id3v2_frames(f, start, end, major, tags):
+    header_len = 6 if major == 2 else 10
+    pos = start
+    while pos + header_len <= end and len(tags) < len(TAG_FIELDS):
+        f.seek(pos)
+        header = f.read(header_len)
+        if len(header) < header_len or header[0] == 0:
+            break  # Início do preenchimento (padding).
+        if major == 2:
+            frame_id, size, flags = header[:3], int.from_bytes(header[3:6], 'big'), 0
+        else:
+            frame_id = header[:4]
+            size = _syncsafe(header[4:8]) if major == 4 else int.from_bytes(header[4:8], 'big')
+            flags = int.from_bytes(header[8:10], 'big')
+        pos += header_len
+        field = _ID3_FRAMES.get(frame_id.decode('latin-1'))
+        if field and size and field not in tags:
+            # Quadros comprimidos ou criptografados são ignorados.
+            skip = flags & (0x000C if major == 4 else 0x00C0)
+            if not skip:
+                data = f.read(min(size, 4096))
+                if major == 4 and flags & 0x0001:
+                    data = data[4:]  # Indicador de tamanho dos dados.
+                value = _decode_id3_text(data)
+                if value:
+                    tags[field] = value
+        pos += size
+
+def _read_id3v2(f, tags):
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    major, flags = header[3], header[5]
+    end = 10 + _syncsafe(header[6:10])
+    if major not in (2, 3, 4):
+        return end
+    start = 10
+    if flags & 0x40 and major >= 3:
+        ext = f.read(4)
+        start += _syncsafe(ext) if major == 4 else int.from_bytes(ext, 'big') + 4
+    if flags & 0x80 and major < 4:
+        # Tag inteira com "unsynchronisation": desfaz em memória (é raro).
+        f.seek(start)
+        data = f.read(min(end - start, 1024 * 1024)).replace(b'\xff\x00', b'\xff')
+        _read_id3v2_frames(io.BytesIO(data), 0, len(data), major, tags)
+    else:
+        _read_id3v2_frames(f, start, end, major, tags)
+    return end
+
+def _read_id3v1(f, tags):
+    try:
+        f.seek(-128, os.SEEK_END)
+    except OSError:
+        return
+    data = f.read(128)
+    if data[:3] != b'TAG':
+        return
+
+    def text(raw):
+        return raw.split(b'\0')[0].decode('latin-1').strip()
+
+    for field, raw in (('title', data[3:33]), ('artist', data[33:63]),
+                       ('album', data[63:93]), ('year', data[93:97])):
+        value = text(raw)
+        if value and field not in tags:
+            tags[field] = value
+    # ID3v1.1: número da faixa no penúltimo byte do comentário.
+    if data[125] == 0 and data[126] and 'track' not in tags:
+        tags['track'] = str(data[126])
+
+def _parse_vorbis_comment(data, tags):
+    pos = 4 + int.from_bytes(data[0:4], 'little')
+    count = int.from_bytes(data[pos:pos + 4], 'little')
+    pos += 4
+    for _ in range(count):
+        if pos + 4 > len(data):
+            break
+        length = int.from_bytes(data[pos:pos + 4], 'little')
+        entry = data[pos + 4:pos + 4 + length]
+        pos += 4 + length
+        key, _, value = entry.partition(b'=')
+        field = _VORBIS_KEYS.get(key.decode('ascii', 'replace').upper())
+        if field and value and field not in tags:
+            tags[field] = value.decode('utf-8', 'replace').strip()
+
+def _read_flac(f, tags):
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            return
+        block_type, length = header[0] & 0x7F, int.from_bytes(header[1:4], 'big')
+        if block_type == 4:
+            _parse_vorbis_comment(f.read(length), tags)
+            return
+        if header[0] & 0x80:
+            return
+        f.seek(length, os.SEEK_CUR)
+
+def _read_ogg(f, tags):
+    # O comentário é o segundo pacote do fluxo, logo depois do cabeçalho.
+    packets = []
+    current = []
+    read = 0
+    while len(packets) < 2 and read < OGG_READ_LIMIT:
+        header = f.read(27)
+        if len(header) < 27 or header[:4] != b'OggS':
+            break
+        lacing = f.read(header[26])
+        body = f.read(sum(lacing))
+        read += 27 + len(lacing) + len(body)
+        pos = 0
+        for lace in lacing:
+            current.append(body[pos:pos + lace])
+            pos += lace
+            if lace < 255:
+                packets.append(b''.join(current))
+                current = []
+    if len(packets) < 2 and current:
+        packets.append(b''.join(current))
+    if len(packets) < 2:
+        return
+    packet = packets[1]
+    if packet.startswith(b'\x03vorbis'):
+        _parse_vorbis_comment(packet[7:], tags)
+    elif packet.startswith(b'OpusTags'):
+        _parse_vorbis_comment(packet[8:], tags)
+
+def _mp4_atoms(f, start, end):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, kind, header_len = int.from_bytes(header[:4], 'big'), header[4:8], 8
+        if size == 1:
+            size, header_len = int.from_bytes(f.read(8), 'big'), 16
+        elif size == 0:
+            size = end - pos
+        if size < header_len:
+            return
+        yield kind, pos + header_len, pos + size
+        pos += size
+
+def _find_atom(f, kind, start, end):
+    for atom_kind, atom_start, atom_end in _mp4_atoms(f, start, end):
+        if atom_kind == kind:
+            return atom_start, atom_end
+    return None
+
+def _read_mp4(f, tags, size):
+    box = (0, size)
+    for kind in (b'moov', b'udta', b'meta'):
+        box = _find_atom(f, kind, *box)
+        if box is None:
+            return
+    start, end = box
+    # 'meta' normalmente tem 4 bytes de versão/flags antes dos átomos filhos.
+    f.seek(start)
+    if f.read(8)[4:8] != b'hdlr':
+        start += 4
+    box = _find_atom(f, b'ilst', start, end)
+    if box is None:
+        return
+    for kind, item_start, item_end in list(_mp4_atoms(f, *box)):
+        field = _MP4_ATOMS.get(kind)
+        if field is None or field in tags:
+            continue
+        data = _find_atom(f, b'data', item_start, item_end)
+        if data is None:
+            continue
+        f.seek(data[0])
+        payload = f.read(min(data[1] - data[0], 4096))
+        value = payload[8:]
+        if kind == b'trkn':
+            if len(value) >= 4 and int.from_bytes(value[2:4], 'big'):
+                tags[field] = str(int.from_bytes(value[2:4], 'big'))
+        elif int.from_bytes(payload[1:4], 'big') == 1:  # Texto UTF-8.
+            text = value.decode('utf-8', 'replace').strip()
+            if text:
+                tags[field] = text
+
+def _normalize(tags):
+    track = tags.get('track')
+    if track:
+        track = track.split('/')[0].strip()
+        tags['track'] = track.lstrip('0') or track
+    year = tags.get('year')
+    if year and year[:4].isdigit():
+        tags['year'] = year[:4]
+    genre = tags.get('genre')
+    if genre and genre.startswith('(') and ')' in genre:
+        # Gênero ID3 no formato "(17)Rock".
+        tags['genre'] = genre[genre.index(')') + 1:].strip() or genre
+    return tags
+
+# Lê as tags de um arquivo. Retorna um dict com os campos encontrados (ver
+# TAG_FIELDS), vazio para arquivos sem tags, corrompidos ou ilegíveis.
+def read_tags(path):
+    tags = {}
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(12)
+            f.seek(0)
+            if head[:3] == b'ID3':
+                end = _read_id3v2(f, tags)
+                # FLAC com uma tag ID3 na frente (não é padrão, mas acontece).
+                f.seek(end)
+                if f.read(4) == b'fLaC':
+                    _read_flac(f, tags)
+                elif len(tags) < len(TAG_FIELDS):
+                    _read_id3v1(f, tags)
+            elif head[:4] == b'fLaC':
+                f.seek(4)
+                _read_flac(f, tags)
+            elif head[:4] == b'OggS':
+                _read_ogg(f, tags)
+            elif head[4:8] == b'ftyp':
+                _read_mp4(f, tags, os.fstat(f.fileno()).st_size)
+            else:
+                _read_id3v1(f, tags)
+    except (OSError, ValueError, IndexError):
+        return {}
+    return _normalize(tags)
+
+# Tags dos arquivos de uma pasta de origem, indexadas pelo caminho relativo.
+# load() completa o que falta: primeiro pelo cache em disco e depois lendo os
+# arquivos, em um pool de processos quando são muitos. É seguro chamar load()
+# de várias threads (as chamadas são serializadas) e mais de uma vez.
+class TagStore:
+    SCHEMA_VERSION = 1
+    # Abaixo disso, criar os processos custa mais que ler as tags direto.
+    PROCESS_THRESHOLD = 256
+    CHUNK_SIZE = 2000
+
+    def __init__(self, folder, db_path=None, max_workers=None):
+        self.folder = os.path.abspath(folder)
+        self.db_path = db_path if db_path is not None else os.path.join(get_cache_dir(), 'tags.sqlite')
+        self.max_workers = max_workers
+        self._tags = {}
+        # (tamanho, data) de cada arquivo quando as tags foram lidas.
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tags)
+
+    def get(self, record):
+        return self._tags.get(record.rel_path)
+
+    def get_path(self, rel_path):
+        return self._tags.get(rel_path)
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        if conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS tags")
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        conn.execute("CREATE TABLE IF NOT EXISTS tags ("
+                     "path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                     "mtime REAL NOT NULL, data TEXT NOT NULL)")
+        return conn
+
+    def _load_cached(self, conn):
+        # Todas as entradas sob a pasta de origem, numa única consulta por intervalo.
+        prefix = os.path.join(self.folder, '')
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = conn.execute("SELECT path, size, mtime, data FROM tags WHERE path >= ? AND path < ?",
+                            (prefix, upper))
+        return {path: (size, mtime, data) for path, size, mtime, data in rows}
+
+    def _read_many(self, paths, pool):
+        if pool is None:
+            return list(map(read_tags, paths))
+        return list(pool.map(read_tags, paths, chunksize=64))
+
+    def _fresh_stats(self, records):
+        # O tamanho e a data vêm de um os.stat agora, não do escaneamento: uma
+        # edição de tags no lugar não muda o mtime da pasta, e o índice do
+        # escaneamento pode estar atrasado. Arquivos que sumiram ficam de fora.
+        for record in records:
+            path = os.path.join(self.folder, record.rel_path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield record, path, (st.st_size, st.st_mtime)
+
+    def load(self, records, is_running=lambda: True):
+        # Retorna quantos arquivos precisaram ser lidos do disco.
+        with self._lock:
+            pending = [(record, path, stat) for record, path, stat in self._fresh_stats(records)
+                       if self._stats.get(record.rel_path) != stat]
+            if not pending:
+                return 0
+            try:
+                conn = self._connect()
+            except (OSError, sqlite3.Error):
+                conn = None
+            with closing(conn) if conn is not None else nullcontext():
+                cached = self._load_cached(conn) if conn is not None else {}
+                missing = []
+                for record, path, stat in pending:
+                    hit = cached.get(path)
+                    if hit is not None and (hit[0], hit[1]) == stat:
+                        self._tags[record.rel_path] = json.loads(hit[2])
+                        self._stats[record.rel_path] = stat
+                    else:
+                        missing.append((record, path, stat))
+                if missing:
+                    self._read_missing(missing, conn, is_running)
+            return len(missing)
+
+    def _read_missing(self, missing, conn, is_running):
+        pool = None
+        if len(missing) >= self.PROCESS_THRESHOLD:
+            try:
+                pool = ProcessPoolExecutor(self.max_workers)
+            except (OSError, NotImplementedError, ImportError):
+                pool = None
+        try:
+            for start in range(0, len(missing), self.CHUNK_SIZE):
+                if not is_running():
+                    break
+                chunk = missing[start:start + self.CHUNK_SIZE]
+                paths = [path for _, path, _ in chunk]
+                try:
+                    results = self._read_many(paths, pool)
+                except (BrokenProcessPool, OSError):
+                    # Sem processos disponíveis (por exemplo, em apps empacotados).
+                    if pool is not None:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    pool = None
+                    results = self._read_many(paths, None)
+                rows = []
+                for (record, path, stat), tags in zip(chunk, results):
+                    self._tags[record.rel_path] = tags
+                    self._stats[record.rel_path] = stat
+                    rows.append((path, *stat, json.dumps(tags, ensure_ascii=False)))
+                if conn is not None:
+                    try:
+                        with conn:
+                            conn.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?)", rows)
+                    except sqlite3.Error:
+                        pass
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+# Worker que carrega as tags em segundo plano depois do escaneamento e avisa
+# o listener com on_tags_loaded(worker, store) (chamado na thread do worker).
+class TagWorker(threading.Thread):
+    def __init__(self, store, records, listener):
+        super().__init__(daemon=True)
+        self.store = store
+        self.records = records
+        self.listener = listener
+        self._is_running = True
+
+    def run(self):
+        try:
+            self.store.load(self.records, lambda: self._is_running)
+        except (OSError, sqlite3.Error):
+            return
+        if self._is_running:
+            self.listener.on_tags_loaded(self, self.store)
+
+    def stop(self):
+        self._is_running = False
@@ -0,0 +1,462 @@
+# Observa a pasta de origem e avisa o que mudou, para que a lista de arquivos
+# e o índice de busca sejam atualizados aos poucos (FileTable.apply_changes)
+# em vez de escanear tudo de novo. No Linux usa o inotify (via ctypes, sem
+# dependências); nos outros sistemas, ou se o inotify falhar, compara a cada
+# poucos segundos o mtime das pastas e lista de novo só as que mudaram.
+#
+# As mudanças chegam em lotes ao listener, na thread do observador:
+#   listener.on_fs_changes(watcher, changes)
+# com as tuplas descritas em FileTable.apply_changes, ou [('rescan',)] quando
+# o observador perdeu eventos e só um novo escaneamento resolve.
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from shuffletune_core import FileRecord, RenameJournal, scan_folder
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct('iIII')
+
+def _ignored(name):
+    # Arquivos do próprio ShuffleTune (diário e nomes temporários).
+    return name.startswith('.shuffletune-') or name == RenameJournal.FILE_NAME
+
+def _record(folder, rel_path):
+    try:
+        st = os.stat(os.path.join(folder, rel_path))
+    except OSError:
+        return None
+    rel_dir, name = os.path.split(rel_path)
+    stem, ext = os.path.splitext(name)
+    return FileRecord(rel_dir, stem, ext, st.st_size, st.st_mtime, st.st_ino)
+
+# Base dos observadores: uma thread que junta as mudanças por um instante
+# (DEBOUNCE) antes de entregá-las, para que uma cópia de muitos arquivos vire
+# poucos lotes. suspend()/resume() descartam as mudanças causadas pelo próprio
+# programa (a renomeação atualiza a lista pelo plano, ver plan_changes).
+class _Watcher(threading.Thread):
+    DEBOUNCE = 0.2
+
+    def __init__(self, folder, include_subfolders, listener):
+        super().__init__(daemon=True)
+        self.folder = os.path.abspath(folder)
+        self.include_subfolders = include_subfolders
+        self.listener = listener
+        self._is_running = True
+        self._suspended = False
+        self._resume_requested = False
+        self._pending = []
+
+    def suspend(self):
+        self._suspended = True
+
+    def resume(self):
+        # Os eventos da operação que terminou ainda podem estar na fila: a
+        # thread os descarta antes de voltar a entregar mudanças.
+        self._resume_requested = True
+
+    def stop(self):
+        self._is_running = False
+
+    def _emit(self, change):
+        if not self._suspended:
+            self._pending.append(change)
+
+    def _flush(self):
+        if self._pending and self._is_running:
+            changes, self._pending = self._pending, []
+            self.listener.on_fs_changes(self, changes)
+
+    def _scan_dir(self, rel_dir):
+        # Arquivos de uma pasta que acabou de aparecer (criada ou movida para dentro).
+        path = os.path.join(self.folder, rel_dir)
+        try:
+            for records in scan_folder(path, self.include_subfolders, is_running=lambda: self._is_running):
+                for record in records:
+                    if not _ignored(record.file_name):
+                        record.rel_dir = os.path.join(rel_dir, record.rel_dir) if record.rel_dir else rel_dir
+                        self._emit(('add', record))
+        except OSError:
+            pass
+
+class InotifyWatcher(_Watcher):
+    def __init__(self, folder, include_subfolders, listener):
+        super().__init__(folder, include_subfolders, listener)
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._wake_r, self._wake_w = os.pipe()
+        self._dirs = {}      # descritor da observação -> pasta relativa
+        self._moves = {}     # cookie -> (momento, pasta, nome, é pasta)
+        try:
+            self._watch_tree('')
+        except OSError:
+            self._close()
+            raise
+
+    def _watch(self, rel_dir):
+        path = os.path.join(self.folder, rel_dir) if rel_dir else self.folder
+        wd = self._add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if not rel_dir or error == errno.ENOSPC:
+                # Sem a raiz, ou sem observações livres (fs.inotify.max_user_watches).
+                raise OSError(error, os.strerror(error), path)
+            return
+        self._dirs[wd] = rel_dir
+
+    def _watch_tree(self, rel_dir):
+        self._watch(rel_dir)
+        if not self.include_subfolders:
+            return
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(os.path.join(self.folder, current) if current else self.folder) as it:
+                    subdirs = [entry.name for entry in it if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            for name in subdirs:
+                child = os.path.join(current, name) if current else name
+                self._watch(child)
+                pending.append(child)
+
+    def _forget_tree(self, rel_dir):
+        prefix = os.path.join(rel_dir, '')
+        for wd, watched in list(self._dirs.items()):
+            if watched == rel_dir or watched.startswith(prefix):
+                self._rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def _rename_tree(self, old, new):
+        prefix = os.path.join(old, '')
+        for wd, watched in self._dirs.items():
+            if watched == old:
+                self._dirs[wd] = new
+            elif watched.startswith(prefix):
+                self._dirs[wd] = os.path.join(new, watched[len(prefix):])
+
+    def stop(self):
+        super().stop()
+        os.write(self._wake_w, b'\0')
+
+    def _close(self):
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            yield wd, mask, cookie, name
+
+    def _keep_watches(self, wd, mask, name):
+        # Só as observações de pastas, sem stat nem eventos: usado enquanto as
+        # mudanças são descartadas (suspenso ou esvaziando a fila).
+        rel_dir = self._dirs.get(wd)
+        if rel_dir is None:
+            return
+        if mask & IN_IGNORED:
+            del self._dirs[wd]
+        elif (mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+                and self.include_subfolders):
+            # Observar de novo uma pasta movida só atualiza o caminho dela.
+            self._watch_tree(os.path.join(rel_dir, name) if rel_dir else name)
+
+    def _handle(self, wd, mask, cookie, name):
+        if self._suspended:
+            self._keep_watches(wd, mask, name)
+            return
+        if mask & IN_Q_OVERFLOW:
+            self._emit(('rescan',))
+            return
+        rel_dir = self._dirs.get(wd)
+        if rel_dir is None:
+            return
+        if mask & IN_IGNORED:
+            del self._dirs[wd]
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if not rel_dir:
+                # A própria pasta de origem sumiu ou mudou de lugar.
+                self._emit(('rescan',))
+            return
+        is_dir = bool(mask & IN_ISDIR)
+        if (is_dir and not self.include_subfolders) or (not is_dir and _ignored(name)):
+            return
+        rel_path = os.path.join(rel_dir, name) if rel_dir else name
+        if mask & IN_MOVED_FROM:
+            self._moves[cookie] = (time.monotonic(), rel_path, is_dir)
+        elif mask & IN_MOVED_TO:
+            source = self._moves.pop(cookie, None)
+            if is_dir:
+                if source is not None:
+                    # Pasta movida dentro da árvore: as observações continuam valendo.
+                    self._rename_tree(source[1], rel_path)
+                    self._emit(('remove_dir', source[1]))
+                self._watch_tree(rel_path)
+                self._scan_dir(rel_path)
+            else:
+                record = _record(self.folder, rel_path)
+                if record is not None:
+                    self._emit(('move', source[1], record) if source is not None else ('add', record))
+                elif source is not None:
+                    self._emit(('remove', source[1]))
+        elif mask & IN_CREATE:
+            if is_dir:
+                self._watch_tree(rel_path)
+                self._scan_dir(rel_path)
+            else:
+                record = _record(self.folder, rel_path)
+                if record is not None:
+                    self._emit(('add', record))
+        elif mask & IN_CLOSE_WRITE:
+            record = _record(self.folder, rel_path)
+            if record is not None:
+                self._emit(('add', record))
+        elif mask & IN_DELETE:
+            self._emit(('remove_dir', rel_path) if is_dir else ('remove', rel_path))
+
+    def _expire_moves(self, now):
+        # MOVED_FROM sem o MOVED_TO correspondente: o item saiu da árvore.
+        for cookie, (when, rel_path, is_dir) in list(self._moves.items()):
+            if now - when >= self.DEBOUNCE:
+                del self._moves[cookie]
+                if is_dir:
+                    self._forget_tree(rel_path)
+                    self._emit(('remove_dir', rel_path))
+                else:
+                    self._emit(('remove', rel_path))
+
+    def _drain(self):
+        while True:
+            events = list(self._read_events())
+            if not events:
+                break
+            for wd, mask, cookie, name in events:
+                self._keep_watches(wd, mask, name)
+        self._moves.clear()
+
+    def run(self):
+        try:
+            while self._is_running:
+                if self._resume_requested:
+                    self._drain()
+                    self._pending = []
+                    self._resume_requested = False
+                    self._suspended = False
+                timeout = self.DEBOUNCE if self._pending or self._moves else None
+                ready, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+                if self._fd in ready:
+                    for event in self._read_events():
+                        self._handle(*event)
+                    continue
+                if not self._is_running:
+                    break
+                if self._resume_requested:
+                    continue
+                # Nada novo durante o intervalo: entrega o lote.
+                self._expire_moves(time.monotonic())
+                self._flush()
+        finally:
+            self._close()
+
+    def resume(self):
+        super().resume()
+        os.write(self._wake_w, b'\0')
+
+# A cada verificação, só as pastas cujo mtime mudou são listadas de novo.
+# Arquivos reescritos no lugar não mudam o mtime da pasta: com check_files,
+# cada arquivo também é conferido (um stat por arquivo a cada verificação).
+class PollingWatcher(_Watcher):
+    INTERVAL = 2.0
+
+    def __init__(self, folder, include_subfolders, listener, interval=None, check_files=False):
+        super().__init__(folder, include_subfolders, listener)
+        self.interval = interval if interval is not None else self.INTERVAL
+        self.check_files = check_files
+        self._wake = threading.Event()
+        self._dirs = {}
+
+    def stop(self):
+        super().stop()
+        self._wake.set()
+
+    def resume(self):
+        super().resume()
+        self._wake.set()
+
+    def _list(self, rel_dir):
+        # (mtime da pasta, subpastas, {nome: (tamanho, mtime, inode)}) ou None.
+        path = os.path.join(self.folder, rel_dir) if rel_dir else self.folder
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            subdirs, files = [], {}
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.include_subfolders:
+                            subdirs.append(entry.name)
+                    elif entry.is_file() and not _ignored(entry.name):
+                        # No Windows, o st_ino do DirEntry.stat() é sempre 0.
+                        st = entry.stat()
+                        files[entry.name] = (st.st_size, st.st_mtime, entry.inode())
+        except OSError:
+            return None
+        return mtime_ns, subdirs, files
+
+    def _snapshot(self):
+        self._dirs = {}
+        pending = ['']
+        while pending and self._is_running:
+            rel_dir = pending.pop()
+            listing = self._list(rel_dir)
+            if listing is None:
+                continue
+            self._dirs[rel_dir] = listing
+            pending.extend(os.path.join(rel_dir, d) if rel_dir else d for d in listing[1])
+
+    def _poll(self):
+        # Removidos por inode (para reconhecer movimentos); sem inode, ficam à parte.
+        removed, unpaired, added = {}, [], []
+        for rel_dir in list(self._dirs):
+            if rel_dir not in self._dirs:
+                continue
+            old = self._dirs[rel_dir]
+            path = os.path.join(self.folder, rel_dir) if rel_dir else self.folder
+            try:
+                if os.stat(path).st_mtime_ns == old[0]:
+                    if self.check_files:
+                        self._check_files(rel_dir, old[2])
+                    continue
+            except OSError:
+                pass
+            listing = self._list(rel_dir)
+            if listing is None:
+                if not rel_dir:
+                    self._emit(('rescan',))
+                    return
+                self._drop(rel_dir)
+                self._emit(('remove_dir', rel_dir))
+                continue
+            self._dirs[rel_dir] = listing
+            for name in old[2].keys() - listing[2].keys():
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                inode = old[2][name][2]
+                if inode and inode not in removed:
+                    removed[inode] = rel_path
+                else:
+                    unpaired.append(rel_path)
+            for name, stat in listing[2].items():
+                if old[2].get(name) != stat:
+                    added.append((rel_dir, name, stat))
+            for name in set(listing[1]) - set(old[1]):
+                child = os.path.join(rel_dir, name) if rel_dir else name
+                self._adopt(child)
+            for name in set(old[1]) - set(listing[1]):
+                child = os.path.join(rel_dir, name) if rel_dir else name
+                self._drop(child)
+                self._emit(('remove_dir', child))
+        # Mesmo inode sumindo de um lugar e aparecendo em outro: foi movido.
+        for rel_dir, name, (size, mtime, inode) in added:
+            stem, ext = os.path.splitext(name)
+            record = FileRecord(rel_dir, stem, ext, size, mtime, inode)
+            source = removed.pop(inode, None) if inode else None
+            self._emit(('move', source, record) if source is not None else ('add', record))
+        for rel_path in list(removed.values()) + unpaired:
+            self._emit(('remove', rel_path))
+
+    def _check_files(self, rel_dir, files):
+        path = os.path.join(self.folder, rel_dir) if rel_dir else self.folder
+        for name, stat in list(files.items()):
+            try:
+                st = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            if (st.st_size, st.st_mtime) != stat[:2]:
+                files[name] = (st.st_size, st.st_mtime, stat[2])
+                stem, ext = os.path.splitext(name)
+                self._emit(('add', FileRecord(rel_dir, stem, ext, st.st_size, st.st_mtime, stat[2])))
+
+    def _adopt(self, rel_dir):
+        listing = self._list(rel_dir)
+        if listing is None:
+            return
+        self._dirs[rel_dir] = listing
+        for name, (size, mtime, inode) in listing[2].items():
+            stem, ext = os.path.splitext(name)
+            self._emit(('add', FileRecord(rel_dir, stem, ext, size, mtime, inode)))
+        for name in listing[1]:
+            self._adopt(os.path.join(rel_dir, name))
+
+    def _drop(self, rel_dir):
+        prefix = os.path.join(rel_dir, '')
+        for watched in [d for d in self._dirs if d == rel_dir or d.startswith(prefix)]:
+            del self._dirs[watched]
+
+    def run(self):
+        self._snapshot()
+        while self._is_running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self._is_running:
+                break
+            if self._resume_requested:
+                # Depois de uma operação do próprio programa, o estado atual
+                # do disco passa a ser a referência.
+                self._resume_requested = False
+                self._snapshot()
+                self._pending = []
+                self._suspended = False
+                continue
+            if self._suspended:
+                continue
+            self._poll()
+            self._flush()
+
+# Observador mais adequado para o sistema: inotify no Linux e, se não houver
+# (ou faltarem observações livres), a comparação periódica.
+def create_watcher(folder, include_subfolders, listener):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folder, include_subfolders, listener)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folder, include_subfolders, listener)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos ficam na raiz do repositório, sem pacote instalado: assim os
+# testes rodam tanto com `pytest` quanto com `python -m pytest`.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Índices e caches (get_cache_dir) de cada teste ficam numa pasta temporária,
+# nunca no cache do usuário.
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    path = tmp_path_factory.mktemp('cache')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(path))
+    monkeypatch.setenv('LOCALAPPDATA', str(path))
+    return path
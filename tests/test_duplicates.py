@@ -0,0 +1,32 @@
+import os
+
+from shuffletune_core import scan_folder
+from shuffletune_duplicates import DuplicateFinder
+
+def scan(folder):
+    return sorted((record for records in scan_folder(str(folder), False) for record in records),
+                  key=lambda record: record.file_name)
+
+def test_edited_file_is_hashed_again(tmp_path):
+    folder = tmp_path / 'music'
+    folder.mkdir()
+    (folder / 'a.mp3').write_bytes(b'same')
+    (folder / 'b.mp3').write_bytes(b'same')
+    finder = DuplicateFinder(str(folder), db_path=str(tmp_path / 'hashes.sqlite'))
+    files = scan(folder)
+    assert finder.find(files) == [[0, 1]]
+
+    # Editado no lugar (mesmo tamanho); os FileRecord ainda são os do escaneamento.
+    (folder / 'b.mp3').write_bytes(b'diff')
+    st = os.stat(folder / 'b.mp3')
+    os.utime(folder / 'b.mp3', ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert finder.find(files) == []
+    assert DuplicateFinder(str(folder), db_path=str(tmp_path / 'hashes.sqlite')).find(scan(folder)) == []
+
+def test_cancel_stops_hashing(tmp_path):
+    folder = tmp_path / 'music'
+    folder.mkdir()
+    for i in range(5):
+        (folder / f'{i}.mp3').write_bytes(b'same')
+    finder = DuplicateFinder(str(folder), db_path=str(tmp_path / 'hashes.sqlite'))
+    assert finder.find(scan(folder), is_running=lambda: False) == []
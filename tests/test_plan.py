@@ -0,0 +1,94 @@
+import io
+import os
+
+import pytest
+
+from shuffletune_core import RenameOp, check_plan, read_plan, write_plan
+
+def op(src, dst):
+    return RenameOp(None, str(src), str(dst))
+
+def make(folder, *names):
+    for name in names:
+        (folder / name).write_bytes(b'')
+
+def test_plan_round_trip(tmp_path):
+    ops = [op(tmp_path / 'a.mp3', tmp_path / '1 - a.mp3'), op(tmp_path / 'b,"x".mp3', tmp_path / '2.mp3')]
+    for fmt in ('csv', 'jsonl'):
+        f = io.StringIO()
+        write_plan(ops, f, fmt)
+        f.seek(0)
+        assert [(o.src, o.dst) for o in read_plan(f, fmt)] == [(o.src, o.dst) for o in ops]
+
+@pytest.mark.parametrize('fmt, text', [
+    ('csv', 'origem,destino\n/a.mp3,/b.mp3\n'),
+    ('csv', 'source,target\n/a.mp3\n'),
+    ('csv', 'source,target\n/a.mp3,\n'),
+    ('csv', 'source,target\n"/a.mp3,/b.mp3\n'),
+    ('csv', 'source,target\n/a\0.mp3,/b.mp3\n'),
+    ('jsonl', '{"source": "/a.mp3"}\n'),
+    ('jsonl', '{"source": "/a.mp3", "target": 3}\n'),
+    ('jsonl', '["/a.mp3", "/b.mp3"]\n'),
+    ('jsonl', '{"source": "/a.mp3", "target": \n'),
+])
+def test_malformed_plan_rows(fmt, text):
+    with pytest.raises(ValueError):
+        list(read_plan(io.StringIO(text), fmt))
+
+def test_blank_lines_are_ignored():
+    text = 'source,target\n\n/a.mp3,/b.mp3\n\n'
+    assert [(o.src, o.dst) for o in read_plan(io.StringIO(text), 'csv')] == [('/a.mp3', '/b.mp3')]
+
+def test_duplicate_targets(tmp_path):
+    make(tmp_path, 'a.mp3', 'b.mp3')
+    with pytest.raises(ValueError, match="Destino repetido"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'x.mp3'), op(tmp_path / 'b.mp3', tmp_path / 'x.mp3')])
+
+def test_duplicate_sources(tmp_path):
+    make(tmp_path, 'a.mp3')
+    with pytest.raises(ValueError, match="Origem repetida"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'x.mp3'), op(tmp_path / 'a.mp3', tmp_path / 'y.mp3')])
+
+def test_swap_releases_sources(tmp_path):
+    make(tmp_path, 'a.mp3', 'b.mp3')
+    check_plan([op(tmp_path / 'a.mp3', tmp_path / 'b.mp3'), op(tmp_path / 'b.mp3', tmp_path / 'a.mp3')])
+
+def test_target_collides_with_source_that_is_not_released(tmp_path):
+    make(tmp_path, 'a.mp3', 'b.mp3')
+    # Copiando, a origem continua no lugar.
+    with pytest.raises(ValueError, match="já existe"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'b.mp3'), op(tmp_path / 'b.mp3', tmp_path / 'c.mp3')],
+                   release_sources=False)
+    # Um arquivo que fica com o mesmo nome não libera o nome dele.
+    with pytest.raises(ValueError, match="já existe"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'b.mp3'), op(tmp_path / 'b.mp3', tmp_path / 'b.mp3')])
+
+def test_target_collides_with_file_outside_plan(tmp_path):
+    make(tmp_path, 'a.mp3', 'b.mp3')
+    with pytest.raises(ValueError, match="já existe"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'b.mp3')])
+
+def test_target_collides_with_source_moved_to_other_folder(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    make(tmp_path, 'a.mp3', 'b.mp3')
+    # b.mp3 sai da pasta, mas o executor só libera nomes dentro de cada pasta de destino.
+    with pytest.raises(ValueError, match="já existe"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'b.mp3'), op(tmp_path / 'b.mp3', tmp_path / 'sub' / 'b.mp3')])
+
+def test_paths_escaping_output_folder(tmp_path):
+    (tmp_path / 'out').mkdir()
+    make(tmp_path, 'a.mp3')
+    src = tmp_path / 'a.mp3'
+    with pytest.raises(ValueError, match="fora da pasta de destino"):
+        check_plan([op(src, tmp_path / 'x.mp3')], output_folder=str(tmp_path / 'out'))
+    with pytest.raises(ValueError, match="fora da pasta de destino"):
+        check_plan([op(src, tmp_path / 'outro' / 'x.mp3')], output_folder=str(tmp_path / 'out'))
+    with pytest.raises(ValueError, match="não normalizado"):
+        check_plan([op(src, f"{tmp_path}{os.sep}out{os.sep}..{os.sep}x.mp3")], output_folder=str(tmp_path / 'out'))
+    with pytest.raises(ValueError, match="relativo"):
+        check_plan([op(src, 'x.mp3')])
+    check_plan([op(src, tmp_path / 'out' / 'x.mp3')], output_folder=str(tmp_path / 'out'))
+
+def test_missing_source(tmp_path):
+    with pytest.raises(ValueError, match="não encontrado"):
+        check_plan([op(tmp_path / 'a.mp3', tmp_path / 'b.mp3')])
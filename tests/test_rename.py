@@ -0,0 +1,177 @@
+import os
+import time
+
+import pytest
+
+from shuffletune_core import JournalWorker, RenameJournal, RenameWorker, load_files
+
+class Listener:
+    def __init__(self):
+        self.success = None
+        self.message = ""
+
+    def on_rename_finished(self, success, message):
+        self.success = success
+        self.message = message
+
+def make_files(folder, contents):
+    folder.mkdir(parents=True, exist_ok=True)
+    for name, content in contents.items():
+        path = folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+def read_tree(folder):
+    result = {}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.startswith('.shuffletune-journal'):
+                continue
+            path = os.path.join(root, name)
+            with open(path) as f:
+                result[os.path.relpath(path, folder).replace(os.sep, '/')] = f.read()
+    return result
+
+def rename(folder, pattern, reverse=False, subfolders=False, worker_class=RenameWorker, **kwargs):
+    files = load_files(str(folder), subfolders)
+    if reverse:
+        files = files[::-1]
+    listener = Listener()
+    worker = worker_class(files, str(folder), pattern, False, listener, **kwargs)
+    worker.run()
+    return worker, listener
+
+# Para o worker logo depois do primeiro movimento para um nome temporário.
+class StopAfterFirstStage(RenameWorker):
+    def _execute(self, step):
+        copied = super()._execute(step)
+        if not step.final:
+            self.stop()
+        return copied
+
+def test_swap_names(tmp_path):
+    make_files(tmp_path, {'1.mp3': 'one', '2.mp3': 'two'})
+    _, listener = rename(tmp_path, '{index}', reverse=True)
+    assert listener.success
+    assert read_tree(tmp_path) == {'1.mp3': 'two', '2.mp3': 'one'}
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_cancel_during_staging_loses_nothing(tmp_path, max_workers):
+    make_files(tmp_path, {'1.mp3': 'one', '2.mp3': 'two'})
+    _, listener = rename(tmp_path, '{index}', reverse=True, worker_class=StopAfterFirstStage,
+                         max_workers=max_workers)
+    assert not listener.success
+    tree = read_tree(tmp_path)
+    assert sorted(tree.values()) == ['one', 'two']
+    assert not [name for name in tree if name.startswith('.shuffletune-')]
+
+def test_cancel_between_groups_leaves_other_folders(tmp_path):
+    make_files(tmp_path, {'a/01.mp3': 'a1', 'a/02.mp3': 'a2', 'b/01.mp3': 'b1', 'b/02.mp3': 'b2'})
+    _, listener = rename(tmp_path, '{folder_index}', reverse=True, subfolders=True,
+                         worker_class=StopAfterFirstStage)
+    assert not listener.success
+    tree = read_tree(tmp_path)
+    assert sorted(tree.values()) == ['a1', 'a2', 'b1', 'b2']
+    # A pasta que já tinha começado termina; a outra não é tocada.
+    assert tree['b/01.mp3'] == 'b2' and tree['b/02.mp3'] == 'b1'
+    assert tree['a/01.mp3'] == 'a1' and tree['a/02.mp3'] == 'a2'
+
+def test_separator_in_pattern_checks_target_folder(tmp_path):
+    make_files(tmp_path, {'a.mp3': 'NEW', 'sub/a.mp3': 'PRECIOUS'})
+    _, listener = rename(tmp_path, 'sub/{name}')
+    assert listener.success
+    assert read_tree(tmp_path) == {'sub/a.mp3': 'PRECIOUS', 'sub/a (1).mp3': 'NEW'}
+
+def test_separator_in_pattern_avoids_planned_names(tmp_path):
+    make_files(tmp_path, {'a.mp3': 'root', 'x/a.mp3': 'x', 'sub/b.mp3': 'keep'})
+    _, listener = rename(tmp_path, 'sub/{name}', subfolders=True)
+    assert listener.success
+    tree = read_tree(tmp_path)
+    assert sorted(tree.values()) == ['keep', 'root', 'x']
+    assert tree['sub/sub/b.mp3'] == 'keep'
+
+def test_pattern_outside_output_folder_is_rejected(tmp_path):
+    make_files(tmp_path / 'lib', {'a.mp3': 'a'})
+    _, listener = rename(tmp_path / 'lib', '../{name}')
+    assert not listener.success
+    assert read_tree(tmp_path) == {'lib/a.mp3': 'a'}
+
+def test_mtime_folders_keep_existing_files(tmp_path):
+    make_files(tmp_path, {'a.mp3': 'a', 'b.mp3': 'b', '2020/01/a.mp3': 'old'})
+    when = time.mktime((2020, 1, 15, 12, 0, 0, 0, 0, -1))
+    for name in ('a.mp3', 'b.mp3'):
+        os.utime(tmp_path / name, (when, when))
+    _, listener = rename(tmp_path, '{mtime:%Y/%m}/{name}')
+    assert listener.success
+    assert read_tree(tmp_path) == {'2020/01/a.mp3': 'old', '2020/01/a (1).mp3': 'a', '2020/01/b.mp3': 'b'}
+
+def test_links_need_another_output_folder(tmp_path):
+    make_files(tmp_path, {'a.mp3': 'one'})
+    with pytest.raises(ValueError):
+        rename(tmp_path, '{index}', link='hardlink')
+    with pytest.raises(ValueError):
+        rename(tmp_path, '{index}', link='hardlink', output_folder=str(tmp_path) + os.sep)
+
+def test_links_in_output_folder_keep_originals(tmp_path):
+    source, output = tmp_path / 'source', tmp_path / 'output'
+    make_files(source, {'a.mp3': 'one'})
+    _, listener = rename(source, '{index}', link='hardlink', output_folder=str(output))
+    assert listener.success
+    assert read_tree(source) == {'a.mp3': 'one'}
+    assert read_tree(output) == {'1.mp3': 'one'}
+
+# Falha de disco simulada: o passo de número `fail_at` levanta OSError,
+# antes (crash_after_transfer=False) ou depois de mover o arquivo, mas sempre
+# antes de o passo ser marcado no diário.
+class FailingWorker(RenameWorker):
+    fail_at = 1
+    crash_after_transfer = False
+
+    def _execute(self, step):
+        self.executed = getattr(self, 'executed', 0) + 1
+        if self.executed == self.fail_at:
+            if self.crash_after_transfer:
+                os.rename(step.src, step.dst)
+            raise OSError("falha simulada")
+        return super()._execute(step)
+
+def fail_rename(folder, fail_at, crash_after_transfer):
+    worker_class = type('Worker', (FailingWorker,), {'fail_at': fail_at,
+                                                       'crash_after_transfer': crash_after_transfer})
+    return rename(folder, '{index}', reverse=True, worker_class=worker_class)
+
+FILES = {'1.mp3': 'one', '2.mp3': 'two', '3.mp3': 'three', '4.mp3': 'four'}
+RENAMED = {'1.mp3': 'four', '2.mp3': 'three', '3.mp3': 'two', '4.mp3': 'one'}
+
+@pytest.mark.parametrize('crash_after_transfer', [False, True])
+@pytest.mark.parametrize('fail_at', [1, 3, 5, 8])
+def test_resume_after_failure(tmp_path, fail_at, crash_after_transfer):
+    make_files(tmp_path, FILES)
+    _, listener = fail_rename(tmp_path, fail_at, crash_after_transfer)
+    assert not listener.success
+    assert RenameJournal.is_incomplete(str(tmp_path))
+    listener = Listener()
+    JournalWorker(str(tmp_path), listener, undo=False).run()
+    assert listener.success, listener.message
+    assert read_tree(tmp_path) == RENAMED
+    assert not RenameJournal.is_incomplete(str(tmp_path))
+
+@pytest.mark.parametrize('crash_after_transfer', [False, True])
+@pytest.mark.parametrize('fail_at', [1, 3, 5, 8])
+def test_undo_after_failure(tmp_path, fail_at, crash_after_transfer):
+    make_files(tmp_path, FILES)
+    fail_rename(tmp_path, fail_at, crash_after_transfer)
+    listener = Listener()
+    JournalWorker(str(tmp_path), listener, undo=True).run()
+    assert listener.success, listener.message
+    assert read_tree(tmp_path) == FILES
+    assert not RenameJournal.exists(str(tmp_path))
+
+def test_undo_after_resume(tmp_path):
+    make_files(tmp_path, FILES)
+    fail_rename(tmp_path, 3, True)
+    JournalWorker(str(tmp_path), Listener(), undo=False).run()
+    listener = Listener()
+    JournalWorker(str(tmp_path), listener, undo=True).run()
+    assert listener.success, listener.message
+    assert read_tree(tmp_path) == FILES
@@ -0,0 +1,64 @@
+import os
+import unicodedata
+
+import pytest
+
+from shuffletune_core import NAME_SANITIZER, FileRecord, NameSanitizer, RenamePattern, RenameWorker, load_files
+
+@pytest.mark.parametrize('name, expected', [
+    ('CON', 'CON_'),
+    ('con.txt', 'con_.txt'),
+    ('Com1', 'Com1_'),
+    ('nul.tar', 'nul_.tar'),
+    ('COM10', 'COM10'),
+    ('CONSOLE', 'CONSOLE'),
+    ('aux ', 'aux_'),
+])
+def test_reserved_device_names(name, expected):
+    assert NAME_SANITIZER(name) == expected
+
+def test_reserved_names_can_be_kept():
+    assert NameSanitizer(reserved_names=False)('CON') == 'CON'
+
+@pytest.mark.parametrize('name, expected', [
+    ('song. . ', 'song'),
+    ('song...', 'song'),
+    ('  song  ', 'song'),
+    ('a.b', 'a.b'),
+    ('...', ''),
+])
+def test_trailing_dots_and_spaces(name, expected):
+    assert NAME_SANITIZER(name) == expected
+
+def test_max_length_with_multibyte_tail():
+    sanitizer = NameSanitizer(max_length=10)
+    # Decomposto (NFD): a normalização vem antes do corte, que não separa o acento.
+    name = unicodedata.normalize('NFD', 'aaaaaaaação')
+    result = sanitizer(name)
+    assert result == 'aaaaaaaaçã'
+    assert unicodedata.is_normalized('NFC', result)
+    result.encode('utf-8')
+    assert sanitizer.batch(['aaaaaaaaa ção', 'curto']) == ['aaaaaaaaa', 'curto']
+
+def test_ascii_transliteration():
+    sanitizer = NameSanitizer(ascii_only=True)
+    assert sanitizer.batch(['Björk Ærøskøbing ß', 'Café – “x”', '東京']) == [
+        'Bjork AEroskobing ss', 'Cafe - _x_', '__']
+
+def test_whitespace_collapse():
+    assert NAME_SANITIZER.batch(['a  b', 'a　b', 'a \t b', 'a\nb', 'a  b']) == ['a b'] * 5
+
+def test_invalid_characters_and_separators():
+    assert NAME_SANITIZER.batch(['x:y?z', 'a/b\\c', 'a\x00b', 'ok']) == ['x_y_z', 'a_b_c', 'a_b', 'ok']
+
+def test_empty_name_falls_back_to_index():
+    files = [FileRecord('', '...', '.mp3', 0, 0.0, 0), FileRecord('', 'b', '.mp3', 0, 0.0, 0)]
+    assert list(RenamePattern('{name}', sanitize=NAME_SANITIZER).names(files)) == ['1', 'b']
+    # Sem limpeza, '...' viraria um arquivo oculto ('....mp3').
+    assert list(RenamePattern('{name}').names(files)) == ['1', 'b']
+    assert list(RenamePattern('{name}').names(files[::-1], total=100)) == ['b', '002']
+
+def test_empty_name_plans_numbered_file(tmp_path):
+    (tmp_path / ' .mp3').write_bytes(b'')
+    worker = RenameWorker(load_files(str(tmp_path)), str(tmp_path), '{name}', False, None, sanitize_names=True)
+    assert [os.path.basename(op.dst) for op in worker.build_plan()] == ['1.mp3']
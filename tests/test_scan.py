@@ -0,0 +1,87 @@
+import os
+
+from shuffletune_core import ScanIndex, ScanWorker
+
+def scan(index, verify_files=False, extensions=frozenset({'.mp3'})):
+    return {record.file_name: record
+            for records in index.scan(True, extensions, verify_files=verify_files) for record in records}
+
+def make_tree(tmp_path):
+    folder = tmp_path / 'music'
+    (folder / 'sub').mkdir(parents=True)
+    (folder / 'a.mp3').write_bytes(b'x' * 10)
+    (folder / 'b.txt').write_bytes(b'x')
+    (folder / 'sub' / 'c.mp3').write_bytes(b'x')
+    # Pastas "antigas", para que o mtime delas entre no índice.
+    for path in (folder / 'sub', folder):
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+    return folder
+
+def test_unchanged_tree_does_not_stat_files(tmp_path, monkeypatch):
+    folder = make_tree(tmp_path)
+    db_path = str(tmp_path / 'index.sqlite')
+    index = ScanIndex(str(folder), db_path)
+    scan(index, extensions=None)
+    index.save()
+
+    stats, listings = [], []
+    real_stat, real_scandir = os.stat, os.scandir
+    monkeypatch.setattr(os, 'stat', lambda path, *args, **kwargs: stats.append(path) or real_stat(path, *args, **kwargs))
+    monkeypatch.setattr(os, 'scandir', lambda path: listings.append(path) or real_scandir(path))
+    assert sorted(scan(ScanIndex(str(folder), db_path), extensions=None)) == ['a.mp3', 'b.txt', 'c.mp3']
+    # Só as pastas: nenhum stat por arquivo e nenhuma listagem.
+    inside = [os.fspath(path) for path in stats if os.fspath(path).startswith(str(folder))]
+    assert sorted(inside) == sorted([str(folder), os.path.join(str(folder), 'sub')])
+    assert listings == []
+
+def test_verify_files_sees_file_edited_in_place(tmp_path):
+    folder = make_tree(tmp_path)
+    db_path = str(tmp_path / 'index.sqlite')
+    index = ScanIndex(str(folder), db_path)
+    assert scan(index)['a.mp3'].size == 10
+    index.save()
+
+    mtime = os.stat(folder).st_mtime_ns
+    (folder / 'a.mp3').write_bytes(b'x' * 20)
+    os.utime(folder, ns=(mtime, mtime))
+    index = ScanIndex(str(folder), db_path)
+    assert scan(index)['a.mp3'].size == 10
+    assert scan(index, verify_files=True)['a.mp3'].size == 20
+    index.save()
+    assert scan(ScanIndex(str(folder), db_path))['a.mp3'].size == 20
+
+def test_verify_files_relists_when_cached_file_is_gone(tmp_path):
+    folder = make_tree(tmp_path)
+    index = ScanIndex(str(folder), str(tmp_path / 'index.sqlite'))
+    assert sorted(scan(index)) == ['a.mp3', 'c.mp3']
+    mtime = os.stat(folder).st_mtime_ns
+    os.remove(folder / 'a.mp3')
+    os.utime(folder, ns=(mtime, mtime))
+    assert list(scan(index, verify_files=True)) == ['c.mp3']
+
+def test_old_indexes_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(ScanIndex, 'MAX_INDEXES', 3)
+    cache = tmp_path / 'cache'
+    cache.mkdir()
+    for i in range(5):
+        (cache / f'scan-{i}.sqlite').write_bytes(b'')
+        os.utime(cache / f'scan-{i}.sqlite', (1_000_000 + i, 1_000_000 + i))
+    (cache / 'hashes.sqlite').write_bytes(b'')
+    folder = make_tree(tmp_path)
+    index = ScanIndex(str(folder), str(cache / 'scan-new.sqlite'))
+    scan(index)
+    index.save()
+    assert sorted(os.listdir(cache)) == ['hashes.sqlite', 'scan-3.sqlite', 'scan-4.sqlite', 'scan-new.sqlite']
+
+class ScanListener:
+    def on_scan_batch(self, worker, batch):
+        worker.stop()
+
+    def on_scan_finished(self, worker):
+        pass
+
+def test_cancelled_scan_is_not_saved(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    folder = make_tree(tmp_path)
+    ScanWorker(str(folder), True, ScanListener(), batch_size=1).run()
+    assert not (tmp_path / 'cache').exists()
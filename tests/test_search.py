@@ -0,0 +1,75 @@
+import unicodedata
+
+from shuffletune_core import FileRecord, FileTable, SearchIndex
+
+def make_table(names):
+    table = FileTable()
+    table.extend(FileRecord('', stem, '.mp3') for stem in names)
+    return table
+
+def names(table, hits):
+    return sorted(table.file_name(i) for i in hits)
+
+def test_prefix_and_substring():
+    table = make_table(['Abbey Road', 'Road Trip', 'Broadway', 'Rhapsody'])
+    index = SearchIndex(table)
+    assert names(table, index.search('road')) == ['Abbey Road.mp3', 'Broadway.mp3', 'Road Trip.mp3']
+    assert names(table, index.search('ro')) == ['Abbey Road.mp3', 'Broadway.mp3', 'Road Trip.mp3']
+    assert names(table, index.search('rh')) == ['Rhapsody.mp3']
+    assert names(table, index.search('y r')) == ['Abbey Road.mp3']
+    assert list(index.search('zzz')) == []
+    assert len(index.search('')) == len(table)
+
+def test_refined_term_uses_cache_correctly():
+    table = make_table(['alpha', 'alps', 'album'])
+    index = SearchIndex(table)
+    assert names(table, index.search('al')) == ['album.mp3', 'alpha.mp3', 'alps.mp3']
+    assert names(table, index.search('alp')) == ['alpha.mp3', 'alps.mp3']
+    assert names(table, index.search('alph')) == ['alpha.mp3']
+    assert names(table, index.search('al')) == ['album.mp3', 'alpha.mp3', 'alps.mp3']
+
+def test_case_folding():
+    table = make_table(['CORAÇÃO', 'Straße', 'song'])
+    index = SearchIndex(table)
+    assert names(table, index.search('coração')) == ['CORAÇÃO.mp3']
+    assert names(table, index.search('CoRaÇãO')) == ['CORAÇÃO.mp3']
+    assert names(table, index.search('STRASSE')) == ['Straße.mp3']
+    assert names(table, index.search('SONG')) == ['song.mp3']
+
+def test_accents_match_in_any_normal_form():
+    # Nomes vindos do macOS costumam estar em NFD; o texto digitado, em NFC.
+    table = make_table([unicodedata.normalize('NFD', 'Canção'), 'Cancao', 'Été'])
+    index = SearchIndex(table)
+    assert names(table, index.search('canção')) == [unicodedata.normalize('NFD', 'Canção.mp3')]
+    assert names(table, index.search(unicodedata.normalize('NFD', 'ÉTÉ'))) == ['Été.mp3']
+    assert names(table, index.search('cancao')) == ['Cancao.mp3']
+
+def test_update_after_table_appends():
+    table = make_table(['one', 'two'])
+    index = SearchIndex(table)
+    assert names(table, index.search('o')) == ['one.mp3', 'two.mp3']
+    added, changed, removed = table.apply_changes([
+        ('add', FileRecord('', 'four', '.mp3')),
+        ('move', 'two.mp3', FileRecord('', 'three', '.mp3')),
+        ('remove', 'one.mp3'),
+    ])
+    index.update(added + list(changed | removed))
+    assert names(table, index.search('o')) == ['four.mp3']
+    assert names(table, index.search('thr')) == ['three.mp3']
+    assert list(index.search('one')) == []
+
+def test_update_many_appends_rebuilds_corpus():
+    table = make_table(['start'])
+    index = SearchIndex(table)
+    added, _, _ = table.apply_changes(('add', FileRecord('', f'new {n}', '.mp3')) for n in range(5000))
+    index.update(added)
+    assert len(index.search('new')) == 5000
+    assert names(table, index.search('new 4999')) == ['new 4999.mp3']
+
+def test_filter_keeps_view_order():
+    table = make_table(['b song', 'a song', 'c other'])
+    table.sort()
+    view = table.select({'.mp3'})
+    view.indices.reverse()
+    index = SearchIndex(table)
+    assert [table.file_name(i) for i in index.filter(view, 'SONG').indices] == ['b song.mp3', 'a song.mp3']
@@ -0,0 +1,72 @@
+import pytest
+
+from shuffletune_core import SHUFFLE_MODES, FileRecord, FileTable, shuffle_view
+
+def make_view(counts, artists=None):
+    # counts: arquivos por pasta; artists: artista de cada pasta (ou None).
+    table = FileTable()
+    records = [FileRecord(f'album {a}', f'{n:03}', '.mp3') for a, count in enumerate(counts) for n in range(count)]
+    table.extend(records)
+    table.sort()
+    if artists is not None:
+        table.tags = Tags({f'album {a}/{n:03}.mp3': artist for a, artist in enumerate(artists)
+                           for n in range(counts[a])})
+    return table.select({'.mp3'})
+
+class Tags:
+    def __init__(self, artists):
+        self.artists = artists
+
+    def get_path(self, rel_path):
+        artist = self.artists.get(rel_path.replace('\\', '/'))
+        return {'artist': artist} if artist else None
+
+def groups(view, key):
+    return [key(view.table[i]) for i in view.indices]
+
+@pytest.mark.parametrize('mode', list(SHUFFLE_MODES))
+def test_every_mode_returns_a_permutation(mode):
+    view = make_view([12, 7, 3, 1], artists=['A', 'B', None, 'A'])
+    shuffled, seed = shuffle_view(view, mode, 42)
+    assert seed == 42
+    assert sorted(shuffled.indices) == sorted(view.indices)
+    assert list(shuffle_view(view, mode, 42)[0].indices) == list(shuffled.indices)
+
+@pytest.mark.parametrize('mode', list(SHUFFLE_MODES))
+def test_seed_changes_the_order(mode):
+    view = make_view([10, 10, 10])
+    orders = {tuple(shuffle_view(view, mode, seed)[0].indices) for seed in range(5)}
+    assert len(orders) > 1
+
+@pytest.mark.parametrize('seed', range(20))
+def test_spread_never_repeats_a_folder_when_possible(seed):
+    view = make_view([10, 10, 8, 5, 1])
+    folders = groups(shuffle_view(view, 'spread', seed)[0], lambda r: r.rel_dir)
+    assert all(a != b for a, b in zip(folders, folders[1:]))
+
+@pytest.mark.parametrize('seed', range(20))
+def test_artist_spread_never_repeats_an_artist_when_possible(seed):
+    # Dois álbuns do mesmo artista contam como um só grupo; sem artista, vale a pasta.
+    artists = ['A', 'A', 'B', 'C', None]
+    view = make_view([5, 5, 8, 6, 4], artists)
+    by_path = {f'album {a}': artist or f'album {a}' for a, artist in enumerate(artists)}
+    order = groups(shuffle_view(view, 'artist', seed)[0], lambda r: by_path[r.rel_dir])
+    assert all(a != b for a, b in zip(order, order[1:]))
+
+def test_spread_with_dominant_folder_still_permutes():
+    view = make_view([20, 3])
+    shuffled, _ = shuffle_view(view, 'spread', 1)
+    assert sorted(shuffled.indices) == sorted(view.indices)
+    # Cada arquivo da pasta menor fica entre dois da maior.
+    folders = groups(shuffled, lambda r: r.rel_dir)
+    small = [i for i, folder in enumerate(folders) if folder == 'album 1']
+    assert all(a + 1 < b for a, b in zip(small, small[1:]))
+
+def test_weighted_gives_small_folders_a_fair_start():
+    # Com o mesmo peso total por pasta, a pasta de 1 arquivo não fica sempre no fim.
+    view = make_view([50, 1])
+    positions = []
+    for seed in range(200):
+        folders = groups(shuffle_view(view, 'weighted', seed)[0], lambda r: r.rel_dir)
+        positions.append(folders.index('album 1'))
+    assert sum(p < 10 for p in positions) > 60
@@ -0,0 +1,8 @@
+from shuffletune_core import FileRecord, FileTable
+
+def test_more_than_65536_extensions():
+    table = FileTable()
+    count = 70_000
+    table.extend(FileRecord('', 'song', f'.x{i}', 1, 0.0, 0) for i in range(count))
+    assert table[count - 1].ext == f'.x{count - 1}'
+    assert list(table.select({'.x69999'}).indices) == [count - 1]
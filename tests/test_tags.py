@@ -0,0 +1,65 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import shuffletune_tags
+from shuffletune_core import FileRecord
+from shuffletune_tags import TagStore
+
+def write_id3v1(path, artist, padding=b''):
+    tag = b'TAG' + b'Title'.ljust(30, b'\0') + artist.encode('latin-1').ljust(30, b'\0')
+    tag += b'Album'.ljust(30, b'\0') + b'2001' + b'\0' * 30 + b'\xff'
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 100 + padding + tag)
+
+def test_tags_reread_after_in_place_edit(tmp_path):
+    folder = tmp_path / 'lib'
+    folder.mkdir()
+    path = folder / 'a.mp3'
+    write_id3v1(path, 'Old')
+    st = os.stat(path)
+    # Registro como o escaneamento o deixou (antes da edição).
+    record = FileRecord('', 'a', '.mp3', st.st_size, st.st_mtime)
+    db = tmp_path / 'tags.sqlite'
+
+    store = TagStore(str(folder), db_path=str(db))
+    store.load([record])
+    assert store.get(record)['artist'] == 'Old'
+
+    write_id3v1(path, 'New', padding=b'\0' * 10)
+    os.utime(path, (st.st_atime, st.st_mtime + 5))
+    # A mesma instância e uma nova (que só tem o cache em SQLite) releem o arquivo.
+    assert store.load([record]) == 1
+    assert store.get(record)['artist'] == 'New'
+    fresh = TagStore(str(folder), db_path=str(db))
+    assert fresh.load([record]) == 0
+    assert fresh.get(record)['artist'] == 'New'
+
+class BrokenPool:
+    pools = []
+
+    def __init__(self, max_workers):
+        self.shutdowns = []
+        self.pools.append(self)
+
+    def map(self, *args, **kwargs):
+        raise BrokenProcessPool('worker died')
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns.append((wait, cancel_futures))
+
+def test_broken_pool_is_shut_down_and_tags_read_in_process(tmp_path, monkeypatch):
+    folder = tmp_path / 'lib'
+    folder.mkdir()
+    records = []
+    for n in range(3):
+        write_id3v1(folder / f'{n}.mp3', f'Artist {n}')
+        records.append(FileRecord('', str(n), '.mp3'))
+    monkeypatch.setattr(BrokenPool, 'pools', [])
+    monkeypatch.setattr(shuffletune_tags, 'ProcessPoolExecutor', BrokenPool)
+    store = TagStore(str(folder), db_path=str(tmp_path / 'tags.sqlite'))
+    store.PROCESS_THRESHOLD = 1
+    assert store.load(records) == 3
+    assert [store.get(r)['artist'] for r in records] == ['Artist 0', 'Artist 1', 'Artist 2']
+    # O pool quebrado é encerrado sem esperar, e só uma vez.
+    assert len(BrokenPool.pools) == 1
+    assert BrokenPool.pools[0].shutdowns == [(False, True)]
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+from shuffletune_watch import InotifyWatcher, PollingWatcher
+
+class Listener:
+    def on_fs_changes(self, watcher, changes):
+        pass
+
+def touch(path, data=b'x'):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def bump(folder):
+    # Garante que a pasta pareça alterada mesmo com mtime de baixa resolução.
+    st = os.stat(folder)
+    os.utime(folder, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+def test_polling_reports_every_new_file(tmp_path):
+    watcher = PollingWatcher(str(tmp_path), False, Listener())
+    watcher._snapshot()
+    for name in ('a.mp3', 'b.mp3', 'c.mp3'):
+        touch(tmp_path / name)
+    bump(tmp_path)
+    watcher._poll()
+    added = sorted(change[1].file_name for change in watcher._pending if change[0] == 'add')
+    assert added == ['a.mp3', 'b.mp3', 'c.mp3']
+
+def test_polling_pairs_moves_by_inode(tmp_path):
+    touch(tmp_path / 'a.mp3')
+    watcher = PollingWatcher(str(tmp_path), False, Listener())
+    watcher._snapshot()
+    os.rename(tmp_path / 'a.mp3', tmp_path / 'b.mp3')
+    bump(tmp_path)
+    watcher._poll()
+    assert [(kind, source, record.file_name) for kind, source, record in watcher._pending] == [
+        ('move', 'a.mp3', 'b.mp3')]
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify")
+def test_inotify_drops_events_while_suspended(tmp_path):
+    watcher = InotifyWatcher(str(tmp_path), True, Listener())
+    try:
+        watcher.suspend()
+        touch(tmp_path / 'a.mp3')
+        os.mkdir(tmp_path / 'sub')
+        for event in watcher._read_events():
+            watcher._handle(*event)
+        assert watcher._pending == [] and watcher._moves == {}
+        # A pasta criada durante a suspensão continua observada.
+        assert 'sub' in watcher._dirs.values()
+    finally:
+        watcher._close()